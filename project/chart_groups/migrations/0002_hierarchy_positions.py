@@ -0,0 +1,27 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chart_groups', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartgroup',
+            name='hierarchy_left',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chartgroup',
+            name='hierarchy_right',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chartgroup',
+            index=models.Index(fields=['game', 'hierarchy_left'], name='chartgroup_hierarchy_idx'),
+        ),
+    ]
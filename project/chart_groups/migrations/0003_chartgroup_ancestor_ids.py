@@ -0,0 +1,43 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:08
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def fill_ancestor_ids(apps, schema_editor):
+    ChartGroup = apps.get_model('chart_groups', 'ChartGroup')
+    groups = list(ChartGroup.objects.all())
+    parent_ids = {cg.id: cg.parent_group_id for cg in groups}
+
+    for cg in groups:
+        ancestor_ids = []
+        parent_id = cg.parent_group_id
+        while parent_id is not None and parent_id not in ancestor_ids:
+            ancestor_ids.insert(0, parent_id)
+            parent_id = parent_ids[parent_id]
+        if parent_id is not None:
+            # Parent cycle.
+            ancestor_ids = []
+        cg.ancestor_ids = ancestor_ids
+    ChartGroup.objects.bulk_update(groups, ['ancestor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chart_groups', '0002_hierarchy_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chartgroup',
+            name='ancestor_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='chartgroup',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ancestor_ids'], name='chartgroup_ancestor_ids_gin'),
+        ),
+        migrations.RunPython(fill_ancestor_ids, migrations.RunPython.noop),
+    ]
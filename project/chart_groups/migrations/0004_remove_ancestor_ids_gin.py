@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chart_groups', '0003_chartgroup_ancestor_ids'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chartgroup',
+            name='chartgroup_ancestor_ids_gin',
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
 from games.models import Game
@@ -22,6 +23,17 @@ class ChartGroup(models.Model):
     # for a particular course in an F-Zero game.
     show_charts_together = models.BooleanField(default=False)
 
+    # Nested-set bounds of this group in the game's hierarchy. Groups and
+    # charts are numbered in pre-order, so the group's descendants (groups
+    # and charts) are exactly those numbered between its left and right
+    # bounds. Maintained by rebuild_game_hierarchy().
+    hierarchy_left = models.IntegerField(null=True)
+    hierarchy_right = models.IntegerField(null=True)
+    # IDs of this group's ancestors, starting from the top-level group.
+    # Only read from the group's own row; descendants are found with the
+    # bounds above. Maintained by rebuild_game_hierarchy().
+    ancestor_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
@@ -35,6 +47,11 @@ class ChartGroup(models.Model):
             models.UniqueConstraint(
                 'parent_group', 'order_in_parent',
                 name='unique_chartgroup_parent_order')]
+        indexes = [
+            models.Index(
+                fields=['game', 'hierarchy_left'],
+                name='chartgroup_hierarchy_idx'),
+        ]
 
     # TODO: Enforce the rule that a chart group's children must be all chart
     # groups, or all charts, not a mix of both. Could potentially check this
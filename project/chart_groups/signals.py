@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from charts.models import Chart
+from .models import ChartGroup
+from .utils import request_hierarchy_rebuild
+
+
+# Keep games' hierarchy numbering (chart group bounds and chart positions)
+# up to date. Bulk changes can defer this with deferred_hierarchy_rebuilds().
+
+
+@receiver(post_save, sender=ChartGroup)
+@receiver(post_delete, sender=ChartGroup)
+def chart_group_changed(sender, instance, **kwargs):
+    request_hierarchy_rebuild(instance.game_id)
+
+
+@receiver(post_save, sender=Chart)
+@receiver(post_delete, sender=Chart)
+def chart_changed(sender, instance, **kwargs):
+    # The chart's group may have been deleted along with it.
+    game_id = ChartGroup.objects.filter(id=instance.chart_group_id) \
+        .values_list('game', flat=True).first()
+    if game_id is not None:
+        request_hierarchy_rebuild(game_id)
@@ -1,12 +1,22 @@
 from unittest import skip
 
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 
 from charts.models import Chart
 from chart_types.models import ChartType
+from core.tests.utils import CourseChartsMixin, QueryCountMixin
+from filter_groups.models import FilterGroup
+from filters.models import Filter
 from games.models import Game
+from records.standings import rebuild_game_standings
 from .models import ChartGroup
+from .utils import (
+    deferred_hierarchy_rebuilds, get_chart_group_ids_containing_chart,
+    get_charts_in_hierarchy)
 
 
 class IndexTest(APITestCase):
@@ -163,6 +173,11 @@ class DetailTest(APITestCase):
             chart_type=ct1)
         cls.chart_mc1c.save()
 
+    def setUp(self):
+        # Test data is rolled back between tests, and hierarchy versions
+        # along with it, so cached hierarchies can't be trusted.
+        cache.clear()
+
     def test(self):
         client = APIClient()
         response = client.get(
@@ -178,6 +193,40 @@ class DetailTest(APITestCase):
                  charts=[
                      dict(type='charts', id=str(self.chart_mc1c.id))]))
 
+    def test_conditional_get(self):
+        client = APIClient()
+        url = reverse('chart_groups:detail', args=[self.cg_kl.id])
+        response = client.get(url)
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # Adding a chart changes the group's chart list, without saving
+        # the group itself.
+        Chart(
+            name="Lap Time", order_in_group=2, chart_group=self.cg_mc1,
+            chart_type=self.chart_mc1c.chart_type).save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_hierarchy_conditional_get(self):
+        client = APIClient()
+        url = reverse('chart_groups:hierarchy', args=[self.cg_kl.id])
+        response = client.get(url)
+        etag = response.headers['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.cg_mc1.name = "Mute City"
+        self.cg_mc1.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], "Mute City")
+
     def test_nonexistent(self):
         group_id = self.cg_mc1.id
         self.cg_mc1.delete()
@@ -186,3 +235,273 @@ class DetailTest(APITestCase):
         response = client.get(reverse('chart_groups:detail', args=[group_id]))
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.data[0]['code'], 'not_found')
+
+
+class HierarchyTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="F-Zero")
+        cls.game.save()
+        cls.ct = ChartType(
+            name="CT1", game=cls.game, format_spec=[], order_ascending=True)
+        cls.ct.save()
+        # Created in a different order from the hierarchy order.
+        cls.cg_ql = ChartGroup(
+            name="Queen League", order_in_parent=2, game=cls.game)
+        cls.cg_ql.save()
+        cls.cg_kl = ChartGroup(
+            name="Knight League", order_in_parent=1, game=cls.game)
+        cls.cg_kl.save()
+        cls.cg_bb = ChartGroup(
+            name="Big Blue", order_in_parent=2, game=cls.game,
+            parent_group=cls.cg_kl)
+        cls.cg_bb.save()
+        cls.cg_mc1 = ChartGroup(
+            name="Mute City I", order_in_parent=1, game=cls.game,
+            parent_group=cls.cg_kl)
+        cls.cg_mc1.save()
+        cls.cg_sf = ChartGroup(
+            name="Sand Ocean", order_in_parent=1, game=cls.game,
+            parent_group=cls.cg_ql)
+        cls.cg_sf.save()
+
+        cls.charts = dict()
+        for key, group, order in [
+                ('bb_lap', cls.cg_bb, 2), ('mc1_course', cls.cg_mc1, 1),
+                ('so_course', cls.cg_sf, 1), ('bb_course', cls.cg_bb, 1),
+                ('mc1_lap', cls.cg_mc1, 2)]:
+            chart = Chart(
+                name=key, order_in_group=order, chart_group=group,
+                chart_type=cls.ct)
+            chart.save()
+            cls.charts[key] = chart
+
+    def setUp(self):
+        cache.clear()
+
+    def get_chart_names(self, chart_group):
+        chart_group.refresh_from_db()
+        return [
+            chart.name for chart in get_charts_in_hierarchy(chart_group)]
+
+    def test_order(self):
+        self.assertListEqual(
+            self.get_chart_names(self.cg_kl),
+            ['mc1_course', 'mc1_lap', 'bb_course', 'bb_lap'])
+        self.assertListEqual(
+            self.get_chart_names(self.cg_bb), ['bb_course', 'bb_lap'])
+
+    def test_ancestor_ids(self):
+        self.cg_mc1.refresh_from_db()
+        self.assertListEqual(self.cg_mc1.ancestor_ids, [self.cg_kl.id])
+        self.assertSetEqual(
+            set(ChartGroup.objects.filter(
+                id__in=get_chart_group_ids_containing_chart(
+                    self.charts['mc1_lap'].id))),
+            {self.cg_mc1, self.cg_kl})
+
+    def test_single_query(self):
+        self.cg_kl.refresh_from_db()
+        with self.assertNumQueries(1):
+            list(get_charts_in_hierarchy(self.cg_kl))
+
+    def test_changes(self):
+        # Move Big Blue to the Queen League.
+        self.cg_bb.parent_group = self.cg_ql
+        self.cg_bb.order_in_parent = 2
+        self.cg_bb.save()
+        self.assertListEqual(
+            self.get_chart_names(self.cg_kl), ['mc1_course', 'mc1_lap'])
+        self.assertListEqual(
+            self.get_chart_names(self.cg_ql),
+            ['so_course', 'bb_course', 'bb_lap'])
+        self.cg_bb.refresh_from_db()
+        self.assertListEqual(self.cg_bb.ancestor_ids, [self.cg_ql.id])
+
+        # Add a chart, then delete one.
+        Chart(
+            name='mc1_speed', order_in_group=3, chart_group=self.cg_mc1,
+            chart_type=self.ct).save()
+        self.charts['mc1_course'].delete()
+        self.assertListEqual(
+            self.get_chart_names(self.cg_kl), ['mc1_lap', 'mc1_speed'])
+
+    def test_deferred_rebuilds(self):
+        self.game.refresh_from_db()
+        version = self.game.hierarchy_version
+
+        with deferred_hierarchy_rebuilds():
+            cg_ww = ChartGroup(
+                name="White Land", order_in_parent=3, game=self.game,
+                parent_group=self.cg_kl)
+            cg_ww.save()
+            for order, name in enumerate(['ww_course', 'ww_lap'], 1):
+                Chart(
+                    name=name, order_in_group=order, chart_group=cg_ww,
+                    chart_type=self.ct).save()
+            # Nothing's renumbered until the block ends.
+            self.game.refresh_from_db()
+            self.assertEqual(self.game.hierarchy_version, version)
+
+        # The game is renumbered once.
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.hierarchy_version, version + 1)
+        self.assertListEqual(
+            self.get_chart_names(self.cg_kl),
+            ['mc1_course', 'mc1_lap', 'bb_course', 'bb_lap',
+             'ww_course', 'ww_lap'])
+
+    def test_charts_before_rebuild(self):
+        with deferred_hierarchy_rebuilds():
+            cg_ww = ChartGroup(
+                name="White Land", order_in_parent=3, game=self.game,
+                parent_group=self.cg_kl)
+            cg_ww.save()
+            Chart(
+                name='ww_course', order_in_group=1, chart_group=cg_ww,
+                chart_type=self.ct).save()
+            # The new group isn't numbered yet, so it's numbered on
+            # demand.
+            self.assertListEqual(
+                self.get_chart_names(cg_ww), ['ww_course'])
+
+    def test_chart_game(self):
+        self.assertSetEqual(
+            set(Chart.objects.filter(game=self.game)),
+            set(self.charts.values()))
+
+    def test_hierarchy_endpoint(self):
+        client = APIClient()
+        url = reverse('chart_groups:hierarchy', args=[self.cg_kl.id])
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(response.data, [
+            dict(name="Mute City I", chart_group_id=self.cg_mc1.id,
+                 show_charts_together=False, items=[
+                     dict(name='mc1_course',
+                          chart_id=self.charts['mc1_course'].id),
+                     dict(name='mc1_lap',
+                          chart_id=self.charts['mc1_lap'].id)]),
+            dict(name="Big Blue", chart_group_id=self.cg_bb.id,
+                 show_charts_together=False, items=[
+                     dict(name='bb_course',
+                          chart_id=self.charts['bb_course'].id),
+                     dict(name='bb_lap',
+                          chart_id=self.charts['bb_lap'].id)]),
+        ])
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        # Validators, chart group, and the game's groups and charts.
+        self.assertEqual(len(selects), 4)
+
+        # Another group of the same game is served from the cache.
+        url = reverse('chart_groups:hierarchy', args=[self.cg_ql.id])
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(
+            response.data[0]['items'],
+            [dict(name='so_course', chart_id=self.charts['so_course'].id)])
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)
+
+        # A chart change invalidates the cache.
+        self.charts['so_course'].name = 'so_course_time'
+        self.charts['so_course'].save()
+        response = client.get(url)
+        self.assertEqual(
+            response.data[0]['items'][0]['name'], 'so_course_time')
+
+
+class RankingTest(CourseChartsMixin, QueryCountMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_course_charts()
+        cls.records = cls.create_records([
+            (cls.lap, cls.p1, 30, 1), (cls.lap, cls.p1, 25, 2),
+            (cls.lap, cls.p2, 28, 3),
+            (cls.speed, cls.p1, 400, 4), (cls.speed, cls.p1, 450, 5),
+            (cls.speed, cls.p2, 500, 6)])
+        rebuild_game_standings(cls.game.id)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ranking(self, params=None):
+        client = APIClient()
+        response = client.get(
+            reverse('chart_groups:ranking', args=[self.cg.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test(self):
+        response = self.get_ranking()
+        self.assertListEqual(
+            [(c['chart_id'], c['name']) for c in response.data],
+            [(self.course.id, "Course Time"), (self.lap.id, "Lap Time"),
+             (self.speed.id, "Max Speed")])
+
+        course_records, lap_records, speed_records = [
+            c['records'] for c in response.data]
+        self.assertListEqual(course_records, [])
+        self.assertListEqual(
+            [(r['player_username'], r['value_display'], r['rank'])
+             for r in lap_records],
+            [("P1", "0.25", 1), ("P2", "0.28", 2)])
+        self.assertListEqual(
+            [(r['player_username'], r['value_display'], r['rank'])
+             for r in speed_records],
+            [("P2", "500 km/h", 1), ("P1", "450 km/h", 2)])
+
+    def test_filtered(self):
+        machine = FilterGroup(name="Machine", game=self.game, order_in_game=1)
+        machine.save()
+        self.ct_time.filter_groups.add(machine)
+        self.ct_speed.filter_groups.add(machine)
+        blue_falcon = Filter(name="Blue Falcon", filter_group=machine)
+        blue_falcon.save()
+        lap_30, _, lap_28, speed_400, _, _ = self.records
+        for record in [lap_30, lap_28, speed_400]:
+            record.filters.add(blue_falcon)
+
+        # Not a standings context, so the rankings are computed from the
+        # matching records.
+        response = self.get_ranking(dict(filters=str(blue_falcon.id)))
+        course_records, lap_records, speed_records = [
+            c['records'] for c in response.data]
+        self.assertListEqual(course_records, [])
+        self.assertListEqual(
+            [(r['id'], r['player_username'], r['value_display'], r['rank'])
+             for r in lap_records],
+            [(lap_28.id, "P2", "0.28", 1), (lap_30.id, "P1", "0.30", 2)])
+        self.assertListEqual(
+            [(r['id'], r['player_username'], r['value_display'], r['rank'])
+             for r in speed_records],
+            [(speed_400.id, "P1", "400 km/h", 1)])
+        self.assertListEqual(
+            [f['name'] for f in speed_records[0]['filters']],
+            ["Blue Falcon"])
+
+    def test_not_shown_together(self):
+        self.cg.show_charts_together = False
+        self.cg.save()
+        client = APIClient()
+        with self.assertRaises(ValueError):
+            client.get(reverse('chart_groups:ranking', args=[self.cg.id]))
+
+    def test_query_count_independent_of_chart_count(self):
+        def add_chart():
+            Chart(
+                name="Lap 1 Time", order_in_group=4, chart_group=self.cg,
+                chart_type=self.ct_time).save()
+
+        response = self.assertQueryCountIndependentOfChartCount(
+            self.get_ranking, add_chart)
+        self.assertEqual(len(response.data), 4)
@@ -1,45 +1,239 @@
 from collections import defaultdict
-from operator import attrgetter
+from contextlib import contextmanager
 
-from django.db.models import Case, QuerySet, Value, When
+from django.contrib.postgres.fields import ArrayField
+from django.core.cache import cache
+from django.db.models import F, Func, IntegerField, QuerySet
+from django.db.models.functions import Cast
 
 from charts.models import Chart
+from games.models import Game
+from games.utils import bump_hierarchy_version
 from .models import ChartGroup
 
 
+def number_hierarchy(
+        groups: list[tuple[int, int | None, int]],
+        charts: list[tuple[int, int, int]],
+) -> tuple[
+        dict[int, tuple[int, int]], dict[int, list[int]], dict[int, int]]:
+    """
+    Number a game's chart groups and charts in pre-order.
+    :param groups: (ID, parent group ID, order in parent) of each group.
+    :param charts: (ID, chart group ID, order in group) of each chart.
+    :return: Each group's nested-set (left, right) bounds, each group's
+        ancestor IDs (top-level group first), and each chart's position,
+        keyed by ID.
+    """
+    # Each group's children, as (is chart, ID) in order.
+    children = defaultdict(list)
+    for group_id, parent_id, order in groups:
+        children[parent_id].append((order, False, group_id))
+    for chart_id, group_id, order in charts:
+        children[group_id].append((order, True, chart_id))
+    for parent_id, child_list in children.items():
+        children[parent_id] = [
+            (is_chart, child_id) for _, is_chart, child_id
+            in sorted(child_list)]
+
+    group_bounds = dict()
+    group_ancestor_ids = {group_id: [] for _, group_id in children[None]}
+    chart_positions = dict()
+    number = 0
+    # Iterative depth-first walk, starting from the top-level groups. A
+    # group's ID is pushed again as a closing marker, so that its right
+    # bound is numbered after all its descendants.
+    stack = [(False, group_id, False)
+             for _, group_id in reversed(children[None])]
+    while stack:
+        is_chart, item_id, closing = stack.pop()
+        number += 1
+        if is_chart:
+            chart_positions[item_id] = number
+        elif closing:
+            group_bounds[item_id] = (group_bounds[item_id][0], number)
+        else:
+            group_bounds[item_id] = (number, None)
+            stack.append((False, item_id, True))
+            for child_is_chart, child_id in reversed(children[item_id]):
+                stack.append((child_is_chart, child_id, False))
+                if not child_is_chart:
+                    group_ancestor_ids[child_id] = \
+                        group_ancestor_ids[item_id] + [item_id]
+    return group_bounds, group_ancestor_ids, chart_positions
+
+
+def rebuild_game_hierarchy(game_id: int):
+    """
+    Recompute the game's chart group bounds and ancestor IDs, and chart
+    positions. Call this after chart groups or charts are added, removed,
+    or reordered.
+    """
+    groups = list(ChartGroup.objects.filter(game=game_id))
+    charts = list(Chart.objects.filter(chart_group__game=game_id))
+    group_bounds, group_ancestor_ids, chart_positions = number_hierarchy(
+        [(cg.id, cg.parent_group_id, cg.order_in_parent) for cg in groups],
+        [(c.id, c.chart_group_id, c.order_in_group) for c in charts])
+
+    changed_groups = []
+    for cg in groups:
+        left, right = group_bounds.get(cg.id, (None, None))
+        # Groups in a parent cycle aren't reachable, so they get no
+        # numbering or ancestors.
+        ancestor_ids = group_ancestor_ids.get(cg.id, [])
+        if (cg.hierarchy_left, cg.hierarchy_right, cg.ancestor_ids) \
+                != (left, right, ancestor_ids):
+            cg.hierarchy_left, cg.hierarchy_right = left, right
+            cg.ancestor_ids = ancestor_ids
+            changed_groups.append(cg)
+    ChartGroup.objects.bulk_update(
+        changed_groups, ['hierarchy_left', 'hierarchy_right', 'ancestor_ids'])
+
+    changed_charts = []
+    for c in charts:
+        position = chart_positions.get(c.id)
+        if (c.position_in_game, c.game_id) != (position, game_id):
+            c.position_in_game, c.game_id = position, game_id
+            changed_charts.append(c)
+    Chart.objects.bulk_update(changed_charts, ['position_in_game', 'game'])
+
+    bump_hierarchy_version(Game.objects.filter(id=game_id))
+
+
+# Games whose hierarchy rebuilds are deferred to the end of a
+# deferred_hierarchy_rebuilds() block. None when not in such a block.
+_deferred_rebuild_game_ids: set[int] | None = None
+
+
+def request_hierarchy_rebuild(game_id: int):
+    """
+    Rebuild the game's hierarchy numbering, or, within a
+    deferred_hierarchy_rebuilds() block, at the end of that block.
+    """
+    if _deferred_rebuild_game_ids is not None:
+        _deferred_rebuild_game_ids.add(game_id)
+    else:
+        rebuild_game_hierarchy(game_id)
+
+
+@contextmanager
+def deferred_hierarchy_rebuilds():
+    """
+    Within this block, chart group and chart changes don't renumber their
+    game's hierarchy right away. Instead, each affected game is renumbered
+    once at the end. Use this for bulk changes such as imports, where
+    renumbering after every save would take quadratic time.
+    """
+    global _deferred_rebuild_game_ids
+    if _deferred_rebuild_game_ids is not None:
+        # Already deferring; the outer block rebuilds.
+        yield
+        return
+
+    _deferred_rebuild_game_ids = set()
+    try:
+        yield
+        game_ids = _deferred_rebuild_game_ids
+    finally:
+        _deferred_rebuild_game_ids = None
+    for game_id in sorted(game_ids):
+        rebuild_game_hierarchy(game_id)
+
+
+def get_chart_group_ids_containing_chart(chart_id: int) -> QuerySet:
+    """
+    IDs of the chart groups which contain the chart, directly or through
+    descendant groups, as a queryset usable in an `__in` filter. Used as a
+    subquery, this makes containment tests part of a single query.
+    """
+    return ChartGroup.objects.filter(charts=chart_id) \
+        .annotate(containing_group_id=Func(
+            Func(
+                F('ancestor_ids'), Cast('id', IntegerField()),
+                function='array_append',
+                output_field=ArrayField(IntegerField())),
+            function='unnest', output_field=IntegerField())) \
+        .values('containing_group_id')
+
+
 def get_charts_in_hierarchy(chart_group: ChartGroup) -> QuerySet:
-    game = chart_group.game
-    cg_lookup = defaultdict(list)
-    for cg in game.chartgroup_set.all():
-        cg_lookup[cg.parent_group_id].append(cg)
-    for chart in Chart.objects.filter(chart_group__game=game):
-        cg_lookup[chart.chart_group_id].append(chart)
-
-    def visit_chart_group(current_cg):
-        lookup_entry = cg_lookup[current_cg.id]
-        if isinstance(lookup_entry[0], Chart):
-            # Order charts and return them
-            return sorted(lookup_entry, key=attrgetter('order_in_group'))
+    """
+    Charts in the chart group and its descendant groups, in hierarchy
+    order.
+    """
+    if chart_group.hierarchy_left is None:
+        # Not numbered yet, as with a group created within a
+        # deferred_hierarchy_rebuilds() block. Number it now.
+        rebuild_game_hierarchy(chart_group.game_id)
+        chart_group.refresh_from_db(
+            fields=['hierarchy_left', 'hierarchy_right'])
+        if chart_group.hierarchy_left is None:
+            # The group is in a parent cycle, so it's not reachable from
+            # the game's top level.
+            return Chart.objects.none()
+    return Chart.objects.filter(
+        game=chart_group.game_id,
+        position_in_game__gt=chart_group.hierarchy_left,
+        position_in_game__lt=chart_group.hierarchy_right,
+    ).order_by('position_in_game')
+
+
+def get_game_hierarchy(game_id: int) -> dict[int, list[dict]]:
+    """
+    The game's chart hierarchy, assembled from one query for the chart
+    groups and one for the charts. Returns each chart group's items: its
+    child groups (each with their own items) if it has any, or else its
+    charts.
+    """
+    groups = ChartGroup.objects.filter(game=game_id) \
+        .order_by('order_in_parent') \
+        .values('id', 'name', 'parent_group_id', 'show_charts_together')
+    charts = Chart.objects.filter(chart_group__game=game_id) \
+        .order_by('order_in_group') \
+        .values('id', 'name', 'chart_group_id')
+
+    child_groups = defaultdict(list)
+    for cg in groups:
+        child_groups[cg['parent_group_id']].append(cg)
+    group_charts = defaultdict(list)
+    for chart in charts:
+        group_charts[chart['chart_group_id']].append(
+            dict(name=chart['name'], chart_id=chart['id']))
+
+    hierarchy = dict()
+    # Children are assembled before their parents, so that each group's
+    # item list can be shared with its parent's entry for it.
+    to_visit = list(child_groups[None])
+    visit_order = []
+    while to_visit:
+        cg = to_visit.pop()
+        visit_order.append(cg)
+        to_visit.extend(child_groups[cg['id']])
+    for cg in reversed(visit_order):
+        if child_groups[cg['id']]:
+            hierarchy[cg['id']] = [
+                dict(
+                    name=child['name'],
+                    chart_group_id=child['id'],
+                    show_charts_together=child['show_charts_together'],
+                    items=hierarchy[child['id']],
+                )
+                for child in child_groups[cg['id']]]
         else:
-            # Order chart groups and return their combined visit results
-            charts = []
-            for child_group in sorted(
-                    lookup_entry, key=attrgetter('order_in_parent')):
-                charts.extend(visit_chart_group(child_group))
-            return charts
-
-    chart_list = visit_chart_group(chart_group)
-
-    # The charts are in an order which aren't defined by a particular field.
-    # We use Case-When to maintain this ordering in a QuerySet.
-    # https://stackoverflow.com/a/69333396
-    chart_ids = [c.id for c in chart_list]
-    queryset = Chart.objects.filter(id__in=chart_ids)
-    return queryset.order_by(
-        'id',
-        Case(
-            *[When(id=chart_id, then=Value(i))
-              for i, chart_id in enumerate(chart_ids)],
-            default=None
-        ).asc()
-    )
+            hierarchy[cg['id']] = group_charts[cg['id']]
+    return hierarchy
+
+
+def get_cached_game_hierarchy(game: Game) -> dict[int, list[dict]]:
+    """
+    Get the game's chart hierarchy from the cache, assembling it if needed.
+    The cache key includes the game's hierarchy version, which is bumped
+    whenever chart groups or charts change.
+    """
+    cache_key = ':'.join([
+        'chart_hierarchy', str(game.id), str(game.hierarchy_version)])
+    hierarchy = cache.get(cache_key)
+    if hierarchy is None:
+        hierarchy = get_game_hierarchy(game.id)
+        cache.set(cache_key, hierarchy, timeout=None)
+    return hierarchy
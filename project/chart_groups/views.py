@@ -1,10 +1,24 @@
+from collections import defaultdict
+
+from django.db.models import F
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from core.utils import filter_queryset_by_param
+from core.utils import conditional_get, filter_queryset_by_param
+from filters.utils import FilterSpec
+from games.utils import get_object_validators_func
+from ladders.utils import get_ladder_records
+from records.standings import (
+    get_standings_rankings, rename_standing_record_ids)
+from records.utils import (
+    add_record_displays,
+    add_record_filters,
+    rank_best_records_per_chart,
+)
 from .models import ChartGroup
 from .serializers import ChartGroupSerializer
+from .utils import get_cached_game_hierarchy
 
 
 class ChartGroupIndex(ListAPIView):
@@ -31,6 +45,11 @@ class ChartGroupIndex(ListAPIView):
             .prefetch_related('charts')
 
 
+get_chart_group_validators = get_object_validators_func(
+    ChartGroup, 'group_id', 'game')
+
+
+@conditional_get(get_chart_group_validators)
 class ChartGroupDetail(RetrieveAPIView):
 
     def get_queryset(self):
@@ -39,28 +58,75 @@ class ChartGroupDetail(RetrieveAPIView):
     lookup_url_kwarg = 'group_id'
 
 
+@conditional_get(get_chart_group_validators)
 class ChartGroupHierarchy(APIView):
 
-    @classmethod
-    def visit_child_group(cls, cg):
-        hierarchy = []
-        if cg.child_groups.exists():
-            for child_group in cg.child_groups.order_by('order_in_parent'):
-                hierarchy.append(dict(
-                    name=child_group.name,
-                    chart_group_id=child_group.id,
-                    show_charts_together=child_group.show_charts_together,
-                    items=cls.visit_child_group(child_group),
-                ))
-        else:
-            for chart in cg.charts.order_by('order_in_group'):
-                hierarchy.append(dict(
-                    name=chart.name,
-                    chart_id=chart.id,
-                ))
-        return hierarchy
+    def get(self, request, group_id):
+        chart_group = ChartGroup.objects.select_related('game') \
+            .get(id=group_id)
+        hierarchy = get_cached_game_hierarchy(chart_group.game)
+        # A group in a parent cycle isn't reachable from the top level.
+        return Response(hierarchy.get(chart_group.id, []))
+
 
+@conditional_get(get_chart_group_validators)
+class ChartGroupRanking(APIView):
+    """
+    Rankings of all the charts in a chart group where show_charts_together
+    is true, such as course time, lap time, and max speed of a course.
+    This is the combination of each chart's ChartRanking, but with the
+    filter spec resolved once, and all the charts' records fetched in one
+    query.
+    """
     def get(self, request, group_id):
         chart_group = ChartGroup.objects.get(id=group_id)
-        hierarchy = self.visit_child_group(chart_group)
-        return Response(hierarchy)
+        if not chart_group.show_charts_together:
+            raise ValueError(
+                "This endpoint only applies to chart groups where"
+                " show_charts_together is true.")
+
+        charts = list(
+            chart_group.charts.order_by('order_in_group')
+            .select_related('chart_type'))
+
+        filter_spec = FilterSpec.from_query_params(self.request.query_params)
+
+        if self.request.query_params.get('filters', '') == '':
+            # Unfiltered, or filtered only by a ladder. Chart standings
+            # are maintained for these filter contexts.
+            records = list(get_standings_rankings(
+                [chart.id for chart in charts], filter_spec.spec_str))
+        else:
+            records = self.get_rankings_from_records(charts, filter_spec)
+
+        rename_standing_record_ids(records)
+        charts_records = defaultdict(list)
+        for record in records:
+            charts_records[record.pop('chart_id')].append(record)
+
+        add_record_filters(records)
+        rankings = []
+        for chart in charts:
+            chart_records = charts_records[chart.id]
+            add_record_displays(chart_records, chart.chart_type)
+            rankings.append(dict(
+                chart_id=chart.id,
+                name=chart.name,
+                records=chart_records,
+            ))
+
+        return Response(rankings)
+
+    @staticmethod
+    def get_rankings_from_records(charts, filter_spec):
+        # Best record per player per chart, ranked and sorted best-first.
+        queryset = rank_best_records_per_chart(
+            get_ladder_records(charts, filter_spec))
+
+        # Fetch more fields.
+        queryset = queryset.annotate(
+            player_username=F('player__username'))
+
+        return list(queryset.values(
+            'id', 'value', 'date_achieved', 'player_id', 'player_username',
+            'rank', 'filter_ids', 'chart_id'))
@@ -0,0 +1,103 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from chart_types.models import ChartType
+from chart_types.utils import FormatSpecRenderer
+
+
+def interpret_format_spec(format_spec: list[dict], value: int) -> str:
+    """
+    The original way of formatting a value: interpret the format spec
+    item by item on every call. Kept here as the baseline to compare
+    against.
+    """
+    total_multiplier = 1
+    for spec_item in reversed(format_spec):
+        total_multiplier = total_multiplier * spec_item.get(
+            'multiplier', 1)
+        spec_item['total_multiplier'] = total_multiplier
+
+    remaining_value = value
+    value_display = ""
+
+    for spec_item in format_spec:
+        item_value = remaining_value / spec_item['total_multiplier']
+        remaining_value = remaining_value % spec_item['total_multiplier']
+
+        number_format = '%'
+        if 'digits' in spec_item:
+            number_format += '0' + str(spec_item['digits'])
+        number_format += 'd'
+
+        value_display += \
+            (number_format % item_value) + spec_item.get('suffix', '')
+
+    return value_display
+
+
+class Command(BaseCommand):
+    help = """
+    Compare formatting a ranking's worth of values the original way, one
+    at a time with the format spec interpreted on every call, against a
+    single compiled FormatSpecRenderer batch call.
+
+    Example usage:
+    python manage.py benchmark_format_spec
+    python manage.py benchmark_format_spec --count 5000 --chart-type 3
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=5000,
+            help="Number of values to format per run.")
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=20,
+            help="Number of runs to time.")
+        parser.add_argument(
+            '--chart-type',
+            type=int,
+            help="ID of the chart type whose format spec to use."
+                 " Default is a minutes/seconds/milliseconds time format.")
+
+    def handle(self, *args, **options):
+        if options['chart_type']:
+            format_spec = ChartType.objects.get(
+                id=options['chart_type']).format_spec
+        else:
+            format_spec = [
+                dict(multiplier=60, suffix="'"),
+                dict(multiplier=1000, suffix='"', digits=2),
+                dict(digits=3),
+            ]
+
+        values = [
+            random.randint(0, 10 * 60 * 1000)
+            for _ in range(options['count'])]
+
+        def per_value():
+            # The original code wrote into the spec, so give it a copy.
+            spec_copy = [dict(spec_item) for spec_item in format_spec]
+            return [interpret_format_spec(spec_copy, v) for v in values]
+
+        def batch():
+            return FormatSpecRenderer(format_spec).render_many(values)
+
+        if per_value() != batch():
+            raise ValueError("Renderers disagree on the output.")
+
+        runs = options['runs']
+        per_value_time = timeit.timeit(per_value, number=runs) / runs
+        batch_time = timeit.timeit(batch, number=runs) / runs
+
+        self.stdout.write(f"""
+            Values per run: {len(values)}
+            Per-value, interpreted spec: {per_value_time * 1000:.2f} ms
+            Compiled renderer, batch: {batch_time * 1000:.2f} ms
+            Speedup: {per_value_time / batch_time:.1f}x
+            """)
@@ -1,9 +1,11 @@
+from django.test import SimpleTestCase
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from filter_groups.models import FilterGroup
 from games.models import Game
 from ..models import ChartType
+from ..utils import FormatSpecRenderer, get_format_spec_renderer
 from .utils import link_ct_and_fg
 
 
@@ -29,3 +31,53 @@ class ChartTypePatchTest(APITestCase):
         self.assertListEqual(
             list(self.ct1.filter_groups.all().values_list('id', flat=True)),
             [self.fg1.id])
+
+
+class FormatSpecRendererTest(SimpleTestCase):
+
+    def test_render(self):
+        format_spec = [
+            dict(multiplier=60, suffix="'"),
+            dict(multiplier=1000, suffix='"', digits=2),
+            dict(digits=3),
+        ]
+        renderer = FormatSpecRenderer(format_spec)
+        self.assertEqual(renderer.render(83456), "1'23\"456")
+        self.assertListEqual(
+            renderer.render_many([5007, 600000]),
+            ["0'05\"007", "10'00\"000"])
+        # The spec isn't modified.
+        self.assertNotIn('total_multiplier', format_spec[0])
+
+    def test_large_and_negative_values(self):
+        renderer = FormatSpecRenderer([
+            dict(multiplier=1000, suffix='.'), dict(digits=3)])
+        # Too large to divide exactly as a float.
+        self.assertEqual(
+            renderer.render(2 ** 62 - 1), "4611686018427387.903")
+        self.assertEqual(renderer.render(-5), "-0.005")
+        self.assertEqual(renderer.render(-1500), "-1.500")
+        self.assertListEqual(
+            renderer.render_many([2 ** 62 - 1, -5, 1500]),
+            ["4611686018427387.903", "-0.005", "1.500"])
+
+    def test_percent_suffix(self):
+        renderer = FormatSpecRenderer([dict(suffix="%")])
+        self.assertEqual(renderer.render(95), "95%")
+
+
+class FormatSpecRendererCacheTest(APITestCase):
+
+    def test_recompiled_after_edit(self):
+        game = Game(name="G")
+        game.save()
+        ct = ChartType(
+            game=game, name="CT1", format_spec=[dict(suffix=" pts")],
+            order_ascending=False)
+        ct.save()
+        renderer = get_format_spec_renderer(ct)
+        self.assertIs(get_format_spec_renderer(ct), renderer)
+
+        ct.format_spec = [dict(suffix=" km/h")]
+        ct.save()
+        self.assertEqual(get_format_spec_renderer(ct).render(500), "500 km/h")
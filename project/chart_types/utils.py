@@ -1,28 +1,80 @@
+from .models import ChartType
 
-def apply_format_spec(format_spec: list[dict], value: int) -> str:
 
-    # Order of the hashes determines both rank (importance of this
-    # number relative to the others) AND position-order in the string.
-    # Can't think of any examples where those would need to be different.
-    total_multiplier = 1
-    for spec_item in reversed(format_spec):
-        total_multiplier = total_multiplier * spec_item.get(
-            'multiplier', 1)
-        spec_item['total_multiplier'] = total_multiplier
+class FormatSpecRenderer:
+    """
+    A format spec compiled into per-item divisors and a format string,
+    so that formatting a value doesn't re-interpret the spec.
+    """
+
+    def __init__(self, format_spec: list[dict]):
+        # Order of the hashes determines both rank (importance of this
+        # number relative to the others) AND position-order in the string.
+        # Can't think of any examples where those would need to be
+        # different.
+        total_multipliers = []
+        total_multiplier = 1
+        for spec_item in reversed(format_spec):
+            total_multiplier = total_multiplier * spec_item.get(
+                'multiplier', 1)
+            total_multipliers.insert(0, total_multiplier)
+        self.total_multipliers = total_multipliers
+
+        # Each item's number and suffix, like '%02d"', combined into one
+        # format string for the whole value. The value's sign goes first.
+        value_format = '%s'
+        for spec_item in format_spec:
+            number_format = '%'
+            if 'digits' in spec_item:
+                number_format += '0' + str(spec_item['digits'])
+            number_format += 'd'
+            value_format += \
+                number_format + spec_item.get('suffix', '').replace('%', '%%')
+        self.value_format = value_format
+
+    def render(self, value: int) -> str:
+        # Integer division throughout, since float division loses
+        # precision on large values.
+        sign = '-' if value < 0 else ''
+        remaining_value = abs(value)
+        item_values = [sign]
+        for total_multiplier in self.total_multipliers:
+            item_value, remaining_value = divmod(
+                remaining_value, total_multiplier)
+            item_values.append(item_value)
+        return self.value_format % tuple(item_values)
 
-    remaining_value = value
-    value_display = ""
+    def render_many(self, values: list[int]) -> list[str]:
+        """
+        Same as render() on each value, but does each division step for
+        all of the values at once.
+        """
+        signs = ['-' if value < 0 else '' for value in values]
+        remaining_values = [abs(value) for value in values]
+        columns = [signs]
+        for total_multiplier in self.total_multipliers:
+            quotients_remainders = [
+                divmod(value, total_multiplier) for value in remaining_values]
+            columns.append([q for q, _ in quotients_remainders])
+            remaining_values = [r for _, r in quotients_remainders]
+        value_format = self.value_format
+        return [value_format % item_values for item_values in zip(*columns)]
 
-    for spec_item in format_spec:
-        item_value = remaining_value / spec_item['total_multiplier']
-        remaining_value = remaining_value % spec_item['total_multiplier']
 
-        number_format = '%'
-        if 'digits' in spec_item:
-            number_format += '0' + str(spec_item['digits'])
-        number_format += 'd'
+# Compiled renderers by chart type ID. Each is stored along with the chart
+# type's date_modified, so that an edited format spec gets recompiled.
+_renderer_cache: dict[int, tuple] = dict()
 
-        value_display += \
-            (number_format % item_value) + spec_item.get('suffix', '')
 
-    return value_display
+def get_format_spec_renderer(chart_type: ChartType) -> FormatSpecRenderer:
+    cached = _renderer_cache.get(chart_type.id)
+    if cached is None or cached[0] != chart_type.date_modified:
+        cached = (
+            chart_type.date_modified,
+            FormatSpecRenderer(chart_type.format_spec))
+        _renderer_cache[chart_type.id] = cached
+    return cached[1]
+
+
+def apply_format_spec(format_spec: list[dict], value: int) -> str:
+    return FormatSpecRenderer(format_spec).render(value)
@@ -1,7 +1,8 @@
 from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView)
 
-from core.utils import filter_queryset_by_param
+from core.utils import conditional_get, filter_queryset_by_param
+from games.utils import get_object_validators_func
 from .models import ChartType
 from .serializers import ChartTypeSerializer
 
@@ -23,6 +24,11 @@ class ChartTypeIndex(ListCreateAPIView):
         return queryset
 
 
+get_chart_type_validators = get_object_validators_func(
+    ChartType, 'chart_type_id', 'game')
+
+
+@conditional_get(get_chart_type_validators)
 class ChartTypeDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = ChartTypeSerializer
     lookup_url_kwarg = 'chart_type_id'
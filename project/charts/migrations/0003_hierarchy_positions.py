@@ -0,0 +1,67 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:05
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def number_hierarchies(apps, schema_editor):
+    ChartGroup = apps.get_model('chart_groups', 'ChartGroup')
+    Chart = apps.get_model('charts', 'Chart')
+
+    children = defaultdict(list)
+    for cg in ChartGroup.objects.all():
+        children[cg.parent_group_id].append((cg.order_in_parent, False, cg))
+    for chart in Chart.objects.all():
+        children[chart.chart_group_id].append(
+            (chart.order_in_group, True, chart))
+
+    def visit(item, is_chart, number):
+        number += 1
+        if is_chart:
+            item.position_in_game = number
+            return number
+        item.hierarchy_left = number
+        for _, child_is_chart, child in sorted(
+                children[item.id], key=lambda c: (c[0], c[1], c[2].id)):
+            number = visit(child, child_is_chart, number)
+        number += 1
+        item.hierarchy_right = number
+        return number
+
+    # Numbering restarts for each game.
+    numbers = defaultdict(int)
+    for order, _, cg in sorted(
+            children[None], key=lambda c: (c[0], c[2].id)):
+        numbers[cg.game_id] = visit(cg, False, numbers[cg.game_id])
+
+    ChartGroup.objects.bulk_update(
+        [cg for child_list in children.values()
+         for _, is_chart, cg in child_list if not is_chart],
+        ['hierarchy_left', 'hierarchy_right'])
+    Chart.objects.bulk_update(
+        [c for child_list in children.values()
+         for _, is_chart, c in child_list if is_chart],
+        ['position_in_game'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chart_groups', '0002_hierarchy_positions'),
+        ('charts', '0002_chart_chart_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chart',
+            name='position_in_game',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chart',
+            index=models.Index(fields=['position_in_game'], name='chart_position_idx'),
+        ),
+        migrations.RunPython(
+            number_hierarchies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Subquery
+
+
+def copy_chart_games(apps, schema_editor):
+    Chart = apps.get_model('charts', 'Chart')
+    ChartGroup = apps.get_model('chart_groups', 'ChartGroup')
+    Chart.objects.update(game=Subquery(
+        ChartGroup.objects.filter(id=OuterRef('chart_group'))
+        .values('game')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_game_hierarchy_version'),
+        ('charts', '0003_hierarchy_positions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chart',
+            name='chart_position_idx',
+        ),
+        migrations.AddField(
+            model_name='chart',
+            name='game',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='games.game'),
+        ),
+        migrations.AddIndex(
+            model_name='chart',
+            index=models.Index(fields=['game', 'position_in_game'], name='chart_game_position_idx'),
+        ),
+        migrations.RunPython(
+            copy_chart_games, migrations.RunPython.noop),
+    ]
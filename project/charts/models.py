@@ -2,6 +2,7 @@ from django.db import models
 
 from chart_groups.models import ChartGroup
 from chart_types.models import ChartType
+from games.models import Game
 
 
 class Chart(models.Model):
@@ -15,6 +16,16 @@ class Chart(models.Model):
 
     chart_type = models.ForeignKey(ChartType, on_delete=models.RESTRICT)
 
+    # Pre-order position of this chart in its game's hierarchy, numbered
+    # together with the chart groups' nested-set bounds. Ordering by this
+    # gives the charts in hierarchy order. Maintained by
+    # rebuild_game_hierarchy().
+    position_in_game = models.IntegerField(null=True)
+    # The chart group's game, copied here so that hierarchy range queries
+    # can use the (game, position_in_game) index. Maintained by
+    # rebuild_game_hierarchy().
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True)
+
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
@@ -25,3 +36,8 @@ class Chart(models.Model):
             models.UniqueConstraint(
                 'chart_group', 'order_in_group',
                 name='unique_chart_group_order')]
+        indexes = [
+            models.Index(
+                fields=['game', 'position_in_game'],
+                name='chart_game_position_idx'),
+        ]
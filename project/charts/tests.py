@@ -1,9 +1,16 @@
+import datetime
+import json
+
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 
 from chart_groups.models import ChartGroup
 from chart_types.models import ChartType
+from core.tests.utils import CourseChartsMixin, QueryCountMixin
 from games.models import Game
+from players.models import Player
+from records.improvements import rebuild_game_improvements
+from records.models import Record
 from .models import Chart
 
 
@@ -101,3 +108,128 @@ class DetailTest(APITestCase):
         response = client.get(reverse('charts:detail', args=[chart_id]))
         self.assertEqual(response.status_code, 404)
         self.assertEqual(response.data[0]['code'], 'not_found')
+
+
+class RecordHistoryTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero")
+        game.save()
+        ct = ChartType(
+            name="Time", game=game, order_ascending=True,
+            format_spec=[dict(multiplier=100, suffix="."), dict(digits=2)])
+        ct.save()
+        cg = ChartGroup(name="Mute City I", order_in_parent=1, game=game)
+        cg.save()
+        cls.chart = Chart(
+            name="Course Time", order_in_group=1, chart_group=cg,
+            chart_type=ct)
+        cls.chart.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+
+        for player, value, day in [
+                (cls.p1, 120, 1), (cls.p2, 110, 2), (cls.p1, 115, 3),
+                (cls.p2, 110, 4), (cls.p1, 100, 5)]:
+            Record(
+                chart=cls.chart, player=player, value=value,
+                date_achieved=datetime.datetime(
+                    2022, 1, day, tzinfo=datetime.timezone.utc)).save()
+        rebuild_game_improvements(game.id)
+
+    def get_history(self, params):
+        client = APIClient()
+        response = client.get(
+            reverse('charts:record_history', args=[self.chart.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_flag_improvements(self):
+        response = self.get_history(dict())
+        self.assertListEqual(
+            [(r['value_display'], r['is_improvement'])
+             for r in response.data],
+            [("1.00", True), ("1.10", False), ("1.15", False),
+             ("1.10", True), ("1.20", True)])
+
+    def test_flag_player_improvements(self):
+        response = self.get_history(dict(player_id=self.p2.id))
+        self.assertListEqual(
+            [(r['value_display'], r['is_improvement'])
+             for r in response.data],
+            [("1.10", False), ("1.10", True)])
+
+    def test_flag_all_players_improvements(self):
+        response = self.get_history(dict(progression='player'))
+        self.assertListEqual(
+            [(r['player_username'], r['value_display'], r['is_improvement'])
+             for r in response.data],
+            [("P1", "1.00", True), ("P2", "1.10", False),
+             ("P1", "1.15", True), ("P2", "1.10", True),
+             ("P1", "1.20", True)])
+
+    def test_filter_improvements(self):
+        response = self.get_history(
+            dict(improvements='filter', player_id=self.p1.id))
+        self.assertListEqual(
+            [r['value'] for r in response.data], [100, 115, 120])
+        self.assertNotIn('is_improvement', response.data[0])
+
+    def test_stream(self):
+        for params in [dict(), dict(improvements='filter')]:
+            response = self.get_history(params)
+            streamed_response = self.get_history(dict(params, stream='true'))
+            self.assertTrue(streamed_response.streaming)
+            self.assertEqual(
+                json.loads(b''.join(streamed_response.streaming_content)),
+                json.loads(response.content))
+
+
+class OtherRecordsTest(CourseChartsMixin, QueryCountMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_course_charts()
+        cls.create_records([
+            (cls.lap, cls.p1, 30, 1), (cls.lap, cls.p1, 25, 2),
+            (cls.lap, cls.p2, 28, 3),
+            (cls.speed, cls.p1, 400, 4), (cls.speed, cls.p1, 450, 5),
+            (cls.speed, cls.p2, 500, 6), (cls.course, cls.p1, 90, 7)])
+
+    def get_other_records(self):
+        client = APIClient()
+        response = client.get(
+            reverse('charts:other_records', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test(self):
+        response = self.get_other_records()
+        self.assertListEqual(
+            list(response.data.keys()), [self.lap.id, self.speed.id])
+
+        lap_records = response.data[self.lap.id]
+        self.assertListEqual(
+            [(player_id, r['value_display'], r['rank'])
+             for player_id, r in lap_records.items()],
+            [(self.p1.id, "0.25", 1), (self.p2.id, "0.28", 2)])
+        speed_records = response.data[self.speed.id]
+        self.assertListEqual(
+            [(player_id, r['value_display'], r['rank'])
+             for player_id, r in speed_records.items()],
+            [(self.p2.id, "500 km/h", 1), (self.p1.id, "450 km/h", 2)])
+
+    def test_query_count_independent_of_chart_count(self):
+        def add_chart():
+            Chart(
+                name="Lap 1 Time", order_in_group=4, chart_group=self.cg,
+                chart_type=self.ct_time).save()
+
+        response = self.assertQueryCountIndependentOfChartCount(
+            self.get_other_records, add_chart)
+        self.assertEqual(len(response.data), 3)
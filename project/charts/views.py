@@ -1,19 +1,30 @@
-from django.db.models import F
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.utils.decorators import method_decorator
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_json_api.pagination import JsonApiPageNumberPagination
 
 from chart_groups.utils import get_charts_in_hierarchy
-from core.utils import filter_queryset_by_param
+from core.utils import (
+    conditional_get,
+    filter_queryset_by_param,
+    make_list_response,
+)
 from filters.utils import apply_filter_spec, FilterSpec
+from games.utils import get_object_validators_func
 from ladders.models import Ladder
-from records.models import Record
+from ladders.utils import get_ladder_records
+from records.models import ChartImprovement, Record
+from records.standings import (
+    get_standings_rankings, rename_standing_record_ids)
 from records.utils import (
     add_record_filters,
     add_record_displays,
-    make_record_ranking,
-    sort_records_by_value,
+    annotate_improvements,
+    rank_best_records,
+    rank_best_records_per_chart,
 )
 from .models import Chart
 from .serializers import ChartSerializer
@@ -57,6 +68,11 @@ class ChartIndex(ListAPIView):
             .prefetch_related('chart_tags')
 
 
+get_chart_validators = get_object_validators_func(
+    Chart, 'chart_id', 'chart_group__game')
+
+
+@conditional_get(get_chart_validators)
 class ChartDetail(RetrieveAPIView):
     serializer_class = ChartSerializer
     lookup_url_kwarg = 'chart_id'
@@ -65,42 +81,60 @@ class ChartDetail(RetrieveAPIView):
         return Chart.objects.all()
 
 
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+@conditional_get(get_chart_validators)
 class ChartRanking(APIView):
 
     def get(self, request, chart_id):
-        chart = Chart.objects.get(id=chart_id)
-
-        queryset = Record.objects.filter(chart=chart_id)
+        chart = Chart.objects.select_related('chart_type').get(id=chart_id)
 
         filter_spec = FilterSpec.from_query_params(self.request.query_params)
+
+        if self.request.query_params.get('filters', '') == '':
+            # Unfiltered, or filtered only by a ladder. Chart standings
+            # are maintained for these filter contexts, so we can read the
+            # ranking as-is.
+            records = get_standings_rankings(
+                [chart.id], filter_spec.spec_str)
+        else:
+            records = self.get_ranking_from_records(chart, filter_spec)
+
+        def add_details(records_chunk):
+            rename_standing_record_ids(records_chunk)
+            add_record_filters(records_chunk)
+            add_record_displays(records_chunk, chart.chart_type)
+            return records_chunk
+
+        return make_list_response(request, records, add_details)
+
+    @staticmethod
+    def get_ranking_from_records(chart, filter_spec):
+        queryset = Record.objects.filter(chart=chart.id)
+
         queryset = apply_filter_spec(
             queryset, filter_spec, chart.chart_type)
 
-        # Sort records best-first.
-        queryset = sort_records_by_value(queryset, chart_id)
+        # Best record per player, ranked and sorted best-first.
+        queryset = rank_best_records(
+            queryset, chart.chart_type.order_ascending)
 
         # Fetch more fields.
         queryset = queryset.annotate(
             player_username=F('player__username'))
 
-        records = queryset.values(
-            'id', 'value', 'date_achieved', 'player_id', 'player_username')
-
-        records = make_record_ranking(records)
-
-        add_record_filters(records)
-        add_record_displays(records, chart.chart_type.format_spec)
-
-        return Response(records)
+        return queryset.values(
+            'id', 'value', 'date_achieved', 'player_id', 'player_username',
+            'rank', 'filter_ids', 'chart_id')
 
 
+@conditional_get(get_chart_validators)
 class ChartOtherRecords(APIView):
     """
     Given a chart, get players' records for the
     other charts in the same chart group.
     """
     def get(self, request, chart_id):
-        chart = Chart.objects.get(id=chart_id)
+        chart = Chart.objects.select_related('chart_group').get(id=chart_id)
         chart_group = chart.chart_group
         if not chart_group.show_charts_together:
             raise ValueError(
@@ -110,40 +144,38 @@ class ChartOtherRecords(APIView):
         # Charts in the group other than the specified chart
         other_charts = list(
             chart_group.charts.order_by('order_in_group')
-                .exclude(id=chart.id))
-
-        other_charts_records = dict()
-
-        for chart in other_charts:
-            queryset = Record.objects.filter(chart=chart)
-
-            filter_spec = FilterSpec.from_query_params(
-                self.request.query_params)
-            queryset = apply_filter_spec(
-                queryset, filter_spec, chart.chart_type)
+            .exclude(id=chart.id).select_related('chart_type'))
 
-            # Sort records best-first.
-            queryset = sort_records_by_value(queryset, chart.id)
-
-            records = queryset.values(
-                'id', 'value', 'player_id')
+        filter_spec = FilterSpec.from_query_params(self.request.query_params)
 
-            # Probably won't really need the ranks, but we do need to
-            # limit to one record per player.
-            records = make_record_ranking(records)
+        # Best record per player per chart, ranked, for all the charts in
+        # one query. Probably won't really need the ranks, but we do need
+        # to limit to one record per player.
+        records = rank_best_records_per_chart(
+            get_ladder_records(other_charts, filter_spec))
 
-            add_record_displays(records, chart.chart_type.format_spec)
+        other_charts_records = {chart.id: dict() for chart in other_charts}
+        charts_record_lists = {chart.id: [] for chart in other_charts}
+        for record in records.values(
+                'id', 'value', 'player_id', 'rank', 'chart_id'):
+            chart_id = record.pop('chart_id')
+            other_charts_records[chart_id][record['player_id']] = record
+            charts_record_lists[chart_id].append(record)
 
-            other_charts_records[chart.id] = \
-                {r['player_id']: r for r in records}
+        for chart in other_charts:
+            add_record_displays(
+                charts_record_lists[chart.id], chart.chart_type)
 
         return Response(other_charts_records)
 
 
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+@conditional_get(get_chart_validators)
 class ChartRecordHistory(APIView):
 
     def get(self, request, chart_id):
-        chart = Chart.objects.get(id=chart_id)
+        chart = Chart.objects.select_related('chart_type').get(id=chart_id)
+        chart_type = chart.chart_type
 
         # Latest date first. The secondary ordering by record ID makes the
         # result order repeatable.
@@ -157,77 +189,82 @@ class ChartRecordHistory(APIView):
         filter_spec = FilterSpec.from_query_params(
             self.request.query_params)
         queryset = apply_filter_spec(
-            queryset, filter_spec, chart.chart_type)
-
-        # Fetch more fields.
-        queryset = queryset.annotate(
-            player_username=F('player__username'))
-
-        records = queryset.values(
-            'id', 'value', 'date_achieved', 'player_id', 'player_username')
+            queryset, filter_spec, chart_type)
 
         # What to do with improvements among the set of records over time:
         # flag which ones are improvements or not, or filter out the
         # non-improvements.
         improvements_option = self.request.query_params.get(
             'improvements', 'flag')
-        if improvements_option == 'flag':
-            # Flag each record as an improvement over previous records or not.
-            self.flag_improvements(records, chart.chart_type)
-        elif improvements_option == 'filter':
-            # Filter out non-improvements. So, strictly a PB/WR history.
-            records = self.filter_to_improvements_only(
-                records, chart.chart_type)
-        else:
+        if improvements_option not in ['flag', 'filter']:
             raise ValueError(
                 f"Unrecognized improvements option: {improvements_option}")
 
-        add_record_filters(records)
-        add_record_displays(records, chart.chart_type.format_spec)
-
-        return Response(records)
-
-    @classmethod
-    def flag_improvements(cls, records, chart_type):
-        """
-        At this point we know the records are sorted from latest date first.
-        Iterate in reverse, from earliest date first, and figure out which
-        records are improvements over all previous records.
-        Flag each record as an improvement or not.
-        """
-        best_so_far = None
-        for record in reversed(records):
-            if cls.record_is_improvement(
-                    record['value'], best_so_far, chart_type):
-                best_so_far = record['value']
-                record['is_improvement'] = True
-            else:
-                record['is_improvement'] = False
-
-    @classmethod
-    def filter_to_improvements_only(cls, records, chart_type):
-        improvements_only = []
-        best_so_far = None
-        # While looking for improvements, iterate from earliest date first.
-        for record in reversed(records):
-            if cls.record_is_improvement(
-                    record['value'], best_so_far, chart_type):
-                best_so_far = record['value']
-                # Add to start of list, to construct a list which starts from
-                # latest date first.
-                improvements_only.insert(0, record)
-        return improvements_only
-
-    @staticmethod
-    def record_is_improvement(value, best_so_far, chart_type):
-        """
-        If value is a better record than best_so_far, return true. If worse
-        or tied, return false. "better"/"worse" is determined by the chart_type.
-        """
-        if best_so_far is None:
-            return True
-        elif chart_type.order_ascending:
-            return value < best_so_far
+        # Which earlier records each record is compared against to check
+        # for an improvement: all of the chart's records in the result
+        # (a WR history), or just the same player's records (PB
+        # histories). Filtering by player_id gives a PB history either way.
+        progression = self.request.query_params.get('progression', 'chart')
+        if progression not in ['chart', 'player']:
+            raise ValueError(f"Unrecognized progression: {progression}")
+        per_player = progression == 'player' or player_id is not None
+
+        # Improvements are maintained for the filter contexts which
+        # standings are maintained for: the WR progression under each
+        # context, and each player's unfiltered PB progression. Those can
+        # be read as-is. Otherwise, compute them as a window over the
+        # records.
+        context_is_maintained = \
+            self.request.query_params.get('filters', '') == ''
+        if context_is_maintained and not per_player \
+                and improvements_option == 'filter':
+            # The WR progression itself, read in the order of its index.
+            queryset = Record.objects \
+                .filter(
+                    improvements__chart=chart_id,
+                    improvements__filter_spec=filter_spec.spec_str) \
+                .order_by(
+                    '-improvements__date_achieved', '-improvements__record') \
+                .annotate(improved=Value(True))
+            improvement_field = 'improved'
+        elif context_is_maintained and not per_player:
+            queryset = queryset.annotate(improved=Exists(
+                ChartImprovement.objects.filter(
+                    record=OuterRef('pk'),
+                    filter_spec=filter_spec.spec_str)))
+            improvement_field = 'improved'
+        elif context_is_maintained and filter_spec.is_empty():
+            improvement_field = 'is_improvement'
         else:
-            # Descending
-            return value > best_so_far
+            queryset = annotate_improvements(
+                queryset, chart_type.order_ascending, per_player)
+            improvement_field = 'improved'
+
+        if improvements_option == 'filter' \
+                and improvement_field == 'is_improvement':
+            # Index-backed. WR progressions only have improvements to
+            # begin with. Window results can't be filtered on in the query
+            # itself, so those are filtered below instead.
+            queryset = queryset.filter(is_improvement=True)
+
+        # Fetch more fields.
+        queryset = queryset.annotate(player_username=F('player__username'))
+
+        records = queryset.values(
+            'id', 'value', 'date_achieved', 'player_id', 'player_username',
+            'filter_ids', improvement_field)
+
+        def add_details(records_chunk):
+            for record in records_chunk:
+                record['is_improvement'] = record.pop(improvement_field)
+            if improvements_option == 'filter':
+                # Filter out non-improvements. So, strictly a PB/WR
+                # history.
+                records_chunk = [
+                    record for record in records_chunk
+                    if record.pop('is_improvement')]
+            add_record_filters(records_chunk)
+            add_record_displays(records_chunk, chart_type)
+            return records_chunk
+
+        return make_list_response(request, records, add_details)
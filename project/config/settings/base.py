@@ -93,6 +93,21 @@ DATABASES = {
 }
 
 
+# https://docs.djangoproject.com/en/dev/topics/cache/
+# Local-memory caching by default, which needs no extra services but is
+# per-process. To share the cache between server processes, set e.g.
+# django.core.cache.backends.filebased.FileBasedCache as the backend and
+# a directory as the location.
+CACHES = {
+    'default': {
+        'BACKEND': env(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default=''),
+    }
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/dev/topics/i18n/
 
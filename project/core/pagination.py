@@ -0,0 +1,202 @@
+import base64
+import binascii
+from collections import OrderedDict
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_json_api.pagination import JsonApiPageNumberPagination
+
+
+class KeysetPagination(JsonApiPageNumberPagination):
+    """
+    Page number pagination, plus keyset (cursor) pagination when the
+    request has a page[cursor] param.
+
+    Page number pagination needs a COUNT plus an OFFSET, which gets slower
+    the deeper the page. Keyset pagination instead filters on the
+    queryset's sort keys, continuing after the last row of the previous
+    page, so any page costs about the same as the first.
+    The cursors are opaque strings from the response's next/prev links.
+    Pass an empty page[cursor] to get the first page.
+    Pass page[count]=false to skip counting the total number of results.
+
+    The queryset must be ordered by field names (not expressions). The
+    primary key is added as a final sort key if it's not already there,
+    so that the order is unambiguous.
+    """
+    cursor_query_param = 'page[cursor]'
+    count_query_param = 'page[count]'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        self.keys = self.get_sort_keys(queryset)
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+
+        if request.query_params.get(self.count_query_param) == 'false':
+            self.count = None
+        else:
+            self.count = queryset.count()
+
+        page_queryset = queryset
+        going_back = False
+        if cursor is not None:
+            going_back = cursor['back']
+            keys = self.keys
+            if going_back:
+                # Walk the order backward from the cursor, then flip the
+                # page back around afterward.
+                keys = [self.reverse_key(key) for key in keys]
+                page_queryset = page_queryset.order_by(*keys)
+            page_queryset = page_queryset.filter(
+                self.get_after_cursor_q(keys, cursor['values']))
+
+        # One extra row tells us whether there's more in this direction.
+        rows = list(page_queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if going_back:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self.next_cursor = None
+        self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(rows[-1], back=False)
+        if rows and has_previous:
+            self.previous_cursor = self.encode_cursor(rows[0], back=True)
+
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        pagination = OrderedDict()
+        if self.count is not None:
+            pagination['count'] = self.count
+
+        return Response(
+            {
+                "results": data,
+                "meta": {"pagination": pagination},
+                "links": OrderedDict(
+                    [
+                        ("first", self.build_cursor_link('')),
+                        ("next", self.build_cursor_link(self.next_cursor)),
+                        ("prev", self.build_cursor_link(
+                            self.previous_cursor)),
+                    ]
+                ),
+            }
+        )
+
+    def build_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        # Cursor pages don't have numbers.
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    # SORT KEYS
+
+    @staticmethod
+    def get_sort_keys(queryset: QuerySet) -> list[str]:
+        keys = list(queryset.query.order_by)
+        for key in keys:
+            if not isinstance(key, str) or key.lstrip('-') == '?':
+                raise ValueError(
+                    "Cursor pagination requires ordering by field names.")
+        pk_names = ['pk', 'id', queryset.model._meta.pk.name]
+        if not [key for key in keys if key.lstrip('-') in pk_names]:
+            # Break ties by primary key, in the same direction as the last
+            # key.
+            descending = keys and keys[-1].startswith('-')
+            keys.append('-pk' if descending else 'pk')
+        return keys
+
+    @staticmethod
+    def reverse_key(key: str) -> str:
+        return key[1:] if key.startswith('-') else '-' + key
+
+    @staticmethod
+    def get_after_cursor_q(keys: list[str], values: list) -> Q:
+        """
+        Rows coming after the cursor row in the order given by `keys`.
+        That's rows which tie the cursor on the first N keys, and come
+        after it on the next key, for any N.
+        Null handling matches PostgreSQL's defaults: nulls come last in
+        ascending order, and first in descending order.
+        """
+        after_q = Q(pk__in=[])
+        ties_q = Q()
+        for key, value in zip(keys, values):
+            name = key.lstrip('-')
+            descending = key.startswith('-')
+
+            if value is None:
+                key_after_q = \
+                    Q(**{f'{name}__isnull': False}) if descending \
+                    else Q(pk__in=[])
+                key_tie_q = Q(**{f'{name}__isnull': True})
+            else:
+                if descending:
+                    key_after_q = Q(**{f'{name}__lt': value})
+                else:
+                    key_after_q = Q(**{f'{name}__gt': value}) \
+                        | Q(**{f'{name}__isnull': True})
+                key_tie_q = Q(**{name: value})
+
+            after_q |= ties_q & key_after_q
+            ties_q &= key_tie_q
+        return after_q
+
+    # CURSORS
+
+    def get_row_values(self, row) -> list:
+        values = []
+        for key in self.keys:
+            name = key.lstrip('-')
+            if name == 'pk':
+                values.append(row.pk)
+                continue
+            try:
+                # Foreign keys sort by the related object's ID.
+                name = row._meta.get_field(name).attname
+            except FieldDoesNotExist:
+                # Annotation.
+                pass
+            values.append(getattr(row, name))
+        return values
+
+    def encode_cursor(self, row, back: bool) -> str:
+        cursor_json = json.dumps(
+            dict(values=self.get_row_values(row), back=back),
+            default=lambda value: value.isoformat())
+        return base64.urlsafe_b64encode(cursor_json.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor_str: str) -> dict | None:
+        if cursor_str == '':
+            return None
+        try:
+            cursor = json.loads(
+                base64.urlsafe_b64decode(cursor_str.encode()))
+            if not isinstance(cursor['values'], list):
+                raise ValueError
+            cursor['back'] = bool(cursor['back'])
+        except (binascii.Error, KeyError, TypeError, ValueError):
+            raise NotFound("Invalid cursor.")
+        return cursor
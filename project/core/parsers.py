@@ -0,0 +1,12 @@
+from rest_framework.parsers import JSONParser
+
+
+class ResourceIdentifiersParser(JSONParser):
+    """
+    Parses a JSON:API document whose primary data is a list of resource
+    identifiers, like {"data": [{"type": "ladders", "id": "3"}, ...]}.
+    The JSON:API parser only accepts a single resource object for
+    non-relationship views, so this passes the document through as plain
+    JSON instead.
+    """
+    media_type = 'application/vnd.api+json'
@@ -0,0 +1,37 @@
+from rest_framework_json_api import serializers
+
+from .utils import get_order_positions
+
+
+class OrderPositionField(serializers.IntegerField):
+    """
+    Order field of a model whose objs store order keys (see
+    ORDER_KEY_GAP). It's read as the obj's position in its group: 1 for
+    first, 2 for second, and so on. Writes should already have been turned
+    into order keys by insert_ordered_obj_prep() or reorder_obj_prep().
+    When serializing many objs, their positions are numbered in one query.
+    """
+
+    def __init__(self, group_field_names: list[str], **kwargs):
+        self.group_field_names = group_field_names
+        kwargs.setdefault('required', False)
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return instance
+
+    def to_representation(self, instance):
+        # Positions are cached on the root serializer, which holds all of
+        # the objs being serialized.
+        root = self.root
+        cache_name = f'_{self.source}_positions'
+        positions = getattr(root, cache_name, None)
+        if positions is None or instance.id not in positions:
+            objs = root.instance
+            if not isinstance(objs, (list, tuple)) \
+                    or instance not in objs:
+                objs = [instance]
+            positions = get_order_positions(
+                list(objs), self.source, self.group_field_names)
+            setattr(root, cache_name, positions)
+        return positions[instance.id]
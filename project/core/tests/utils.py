@@ -0,0 +1,95 @@
+import datetime
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from charts.models import Chart
+from chart_groups.models import ChartGroup
+from chart_types.models import ChartType
+from games.models import Game
+from players.models import Player
+from records.models import Record
+
+
+class CourseChartsMixin:
+    """
+    Test fixture of a course's chart group, shown together: course time,
+    lap time, and max speed charts. Plus two players to add records.
+    """
+
+    @classmethod
+    def create_course_charts(cls):
+        cls.game = Game(name="F-Zero")
+        cls.game.save()
+        cls.ct_time = ChartType(
+            name="Time", game=cls.game, order_ascending=True,
+            format_spec=[dict(multiplier=100, suffix="."), dict(digits=2)])
+        cls.ct_time.save()
+        cls.ct_speed = ChartType(
+            name="Speed", game=cls.game, order_ascending=False,
+            format_spec=[dict(suffix=" km/h")])
+        cls.ct_speed.save()
+        cls.cg = ChartGroup(
+            name="Mute City I", order_in_parent=1, game=cls.game,
+            show_charts_together=True)
+        cls.cg.save()
+        cls.course = Chart(
+            name="Course Time", order_in_group=1, chart_group=cls.cg,
+            chart_type=cls.ct_time)
+        cls.course.save()
+        cls.lap = Chart(
+            name="Lap Time", order_in_group=2, chart_group=cls.cg,
+            chart_type=cls.ct_time)
+        cls.lap.save()
+        cls.speed = Chart(
+            name="Max Speed", order_in_group=3, chart_group=cls.cg,
+            chart_type=cls.ct_speed)
+        cls.speed.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+
+    @staticmethod
+    def create_records(records):
+        """
+        Create records from (chart, player, value, day of January 2022)
+        tuples. Returns the created records.
+        """
+        created = []
+        for chart, player, value, day in records:
+            record = Record(
+                chart=chart, player=player, value=value,
+                date_achieved=datetime.datetime(
+                    2022, 1, day, tzinfo=datetime.timezone.utc))
+            record.save()
+            created.append(record)
+        return created
+
+
+class QueryCountMixin:
+
+    def assertQueryCountIndependentOfChartCount(
+            self, get_response, add_chart, warm_cache=False):
+        """
+        Check that get_response() makes as many queries after add_chart()
+        as before. With warm_cache, each measured call is preceded by an
+        unmeasured one, so that cached results are counted as cached;
+        otherwise the cache is cleared before each measured call.
+        Returns the last response.
+        """
+        def count_queries():
+            if warm_cache:
+                get_response()
+            else:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = get_response()
+            return len(context.captured_queries), response
+
+        query_count, _ = count_queries()
+        add_chart()
+        new_query_count, response = count_queries()
+        self.assertEqual(new_query_count, query_count)
+        return response
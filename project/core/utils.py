@@ -1,6 +1,17 @@
-from django.db.models import F, QuerySet
+import json
+from typing import Callable, Iterable, Iterator
 
+from django.db import transaction
+from django.db.models import Case, F, Q, QuerySet, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 
 # QUERY PARAMETER RELATED
@@ -33,75 +44,205 @@ def require_one_of_params(request: Request, *param_names: str):
 
 # RELATED TO MODELS WITH ORDERINGS
 
+# Ordered model objects (like a game's ladders of one kind) store order
+# keys, which are spaced out by ORDER_KEY_GAP, rather than positions 1, 2,
+# 3, .... That way, inserting or moving an obj only writes that obj: it
+# gets a key between its new neighbors' keys. Only when there's no key left
+# between those neighbors is the group renumbered. The API reads and
+# writes positions, which are computed from the keys.
+ORDER_KEY_GAP = 1024
 
-def insert_ordered_obj_prep(request, order_field_name, existing_objs):
+
+def update_order(objs: QuerySet, order_field_name: str, order_value):
+    """
+    Set the order field of the given objs, in a single UPDATE. Also touch
+    their date_modified, if the model has one, since the update bypasses
+    save() and HTTP validators are derived from date_modified.
+    """
+    updates = {order_field_name: order_value}
+    if 'date_modified' in [f.name for f in objs.model._meta.fields]:
+        updates['date_modified'] = timezone.now()
+    objs.update(**updates)
+
+
+def renumber_order_keys(
+        order_field_name: str, all_objs: QuerySet, ordered_ids: list[int]):
+    """
+    Give a group of ordered model objects evenly spaced order keys, in the
+    order of `ordered_ids`, in a single UPDATE. Only objs whose key changes
+    are updated. The group's uniqueness constraint on the order field (if
+    any) should be deferred, since keys may be swapped within the one
+    statement.
+    """
+    current_keys = dict(all_objs.values_list('id', order_field_name))
+    new_keys = {
+        obj_id: position * ORDER_KEY_GAP
+        for position, obj_id in enumerate(ordered_ids, 1)
+        if current_keys[obj_id] != position * ORDER_KEY_GAP}
+    if not new_keys:
+        return
+
+    update_order(
+        all_objs.filter(id__in=new_keys.keys()), order_field_name,
+        Case(*[When(id=obj_id, then=Value(key))
+               for obj_id, key in new_keys.items()]))
+
+
+def get_order_key_for_position(
+        order_field_name: str, other_objs: QuerySet, position) -> int:
     """
-    Prepare to insert an object in a group of ordered model objects.
-    The model can be any model with an integer order field starting with 1.
+    Order key which places an obj at `position` (1 for first) among
+    `other_objs`, the rest of its group. Out-of-range positions are
+    restricted to the accepted range, and the default is the end. Only the
+    keys of the new neighbors are read, unless the group has to be
+    renumbered to make room.
     """
-    order = request.data.get(order_field_name)
+    count = other_objs.count()
+    if position is None:
+        position = count + 1
+    position = max(1, min(position, count + 1))
+
+    ordered_objs = other_objs.order_by(order_field_name, 'id')
+    for renumbered in [False, True]:
+        # Keys of the objs before and after the position.
+        neighbor_keys = list(
+            ordered_objs.values_list(order_field_name, flat=True)
+            [max(position - 2, 0):position])
+        if position == 1:
+            neighbor_keys.insert(0, 0)
+        if len(neighbor_keys) == 1:
+            # At the end.
+            return neighbor_keys[0] + ORDER_KEY_GAP
 
-    if order is None:
-        # By default, order at the end, after all existing objs.
-        order = existing_objs.count() + 1
-    elif order < 1:
-        # Restrict the order to the accepted range.
-        order = 1
-    elif order > existing_objs.count() + 1:
-        # Restrict the order to the accepted range.
-        order = existing_objs.count() + 1
+        previous_key, next_key = neighbor_keys
+        if next_key - previous_key >= 2:
+            return (previous_key + next_key) // 2
+        if renumbered:
+            raise ValueError("No order key available after renumbering.")
+        renumber_order_keys(
+            order_field_name, other_objs,
+            list(ordered_objs.values_list('id', flat=True)))
 
-    # Change other objs' order as needed to accommodate the new obj. We
-    # need to +1 the order of objs coming after this one.
-    later_objs = existing_objs.filter(
-        **{order_field_name+'__gte': order})
-    later_objs.update(**{order_field_name: F(order_field_name)+1})
 
-    request.data[order_field_name] = order
+def insert_ordered_obj_prep(request, order_field_name, existing_objs):
+    """
+    Prepare to insert an object in a group of ordered model objects: turn
+    the requested position into an order key. The model can be any model
+    with an integer order key field.
+    """
+    request.data[order_field_name] = get_order_key_for_position(
+        order_field_name, existing_objs,
+        request.data.get(order_field_name))
     return request
 
 
 def reorder_obj_prep(request, order_field_name, obj, all_objs):
-    new_order = request.data.get(order_field_name)
+    """
+    Prepare to move an object within its group of ordered model objects:
+    turn the requested position into an order key.
+    """
+    new_position = request.data.get(order_field_name)
 
-    if new_order is None:
+    if new_position is None:
         return request
 
-    old_order = getattr(obj, order_field_name)
-
-    # Restrict the order to the accepted range.
-    if new_order < 1:
-        new_order = 1
-    elif new_order > all_objs.count():
-        new_order = all_objs.count()
-
-    # Inc/dec the order of objs between this obj's old and new order,
-    # then set this obj to the desired order.
-    if old_order < new_order:
-        # e.g. ABCDEF -> ABDEFC (moved C)
-        # Objs in between the old and new positions move backward.
-        affected_objs = all_objs.filter(**{
-            order_field_name+'__gt': old_order,
-            order_field_name+'__lte': new_order})
-        affected_objs.update(**{order_field_name: F(order_field_name)-1})
-    elif new_order < old_order:
-        # e.g. ABCDEF -> ABFCDE (moved F)
-        # Objs in between the old and new positions move forward.
-        affected_objs = all_objs.filter(**{
-            order_field_name+'__lt': old_order,
-            order_field_name+'__gte': new_order})
-        affected_objs.update(**{order_field_name: F(order_field_name)+1})
-
-    request.data[order_field_name] = new_order
+    request.data[order_field_name] = get_order_key_for_position(
+        order_field_name, all_objs.exclude(id=obj.id), new_position)
     return request
 
 
-def delete_ordered_obj_prep(order_field_name, obj, all_objs):
-    # Decrement the order of objs coming after this obj.
-    obj_order = getattr(obj, order_field_name)
-    affected_objs = all_objs.filter(
-        **{order_field_name+'__gt': obj_order})
-    affected_objs.update(**{order_field_name: F(order_field_name)-1})
+def get_order_positions(
+        objs: list, order_field_name: str,
+        group_field_names: list[str]) -> dict[int, int]:
+    """
+    Positions (1 for first) of ordered model objects within their groups,
+    keyed by obj ID. The positions of all of the objs are numbered in one
+    query, with ROW_NUMBER over the objs' groups.
+    """
+    if not objs:
+        return dict()
+    model = type(objs[0])
+    group_attnames = [
+        model._meta.get_field(name).attname for name in group_field_names]
+
+    groups = set(
+        tuple(getattr(obj, attname) for attname in group_attnames)
+        for obj in objs)
+    groups_predicate = Q()
+    for group in groups:
+        groups_predicate |= Q(**dict(zip(group_attnames, group)))
+
+    return dict(
+        model.objects.filter(groups_predicate)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=[F(attname) for attname in group_attnames],
+            order_by=[F(order_field_name).asc(), F('id').asc()]))
+        .values_list('id', 'position'))
+
+
+def get_ordered_resource_ids(request: Request, resource_type: str) -> list:
+    """
+    Read a new ordering from the request body, which should be like
+    {"data": [{"type": "ladders", "id": "3"}, ...]}, that is, a list of
+    JSON:API resource identifiers in the desired order.
+    """
+    data = request.data.get('data') if isinstance(request.data, dict) \
+        else None
+    if not isinstance(data, list) or not data:
+        raise ValidationError(
+            "Expected a non-empty list of resource identifiers as data.")
+    ids = []
+    for identifier in data:
+        if not isinstance(identifier, dict) \
+                or identifier.get('type') != resource_type:
+            raise ValidationError(
+                f"Expected resource identifiers of type {resource_type}.")
+        try:
+            ids.append(int(identifier['id']))
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(f"Invalid resource identifier: {identifier}")
+    return ids
+
+
+def apply_ordering(order_field_name, all_objs, ordered_ids):
+    """
+    Set the order of a whole group of ordered model objects at once, in a
+    single UPDATE. `ordered_ids` must have the ID of each obj in the group
+    exactly once.
+    """
+    if len(ordered_ids) != len(set(ordered_ids)) \
+            or set(ordered_ids) != set(all_objs.values_list('id', flat=True)):
+        raise ValidationError(
+            "The new ordering must include each member of the group"
+            " exactly once.")
+
+    renumber_order_keys(order_field_name, all_objs, ordered_ids)
+
+
+# TRANSACTIONS
+
+
+def on_commit_once(func: Callable, *args) -> None:
+    """
+    Call func(*args) once the current transaction commits, like
+    transaction.on_commit(), unless the same call is already waiting for
+    the commit. That way, many changes in one transaction (like an import)
+    lead to one expensive follow-up, rather than one per change.
+    Outside of a transaction, the call runs immediately.
+    """
+    key = (func, args)
+    connection = transaction.get_connection()
+    for _, queued_func, *_ in connection.run_on_commit:
+        if getattr(queued_func, 'on_commit_key', None) == key:
+            return
+
+    def call():
+        # Once running, later changes need another call.
+        call.on_commit_key = None
+        func(*args)
+    call.on_commit_key = key
+    transaction.on_commit(call)
 
 
 # RANKINGS
@@ -124,3 +265,105 @@ def add_ranks(entries: list[dict], key: str) -> None:
 
         previous_entry_count += 1
         previous_value = entry[key]
+
+
+# RESPONSES
+
+
+def iterate_in_chunks(
+        items: Iterable[dict], chunk_size: int,
+        process_chunk: Callable[[list[dict]], list[dict]] = None,
+) -> Iterator[dict]:
+    """
+    Yield the items, passing each chunk of `chunk_size` items through
+    `process_chunk` first. This allows batch operations (like adding
+    record filters) without holding all the items in memory.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield from (process_chunk(chunk) if process_chunk else chunk)
+            chunk = []
+    if chunk:
+        yield from (process_chunk(chunk) if process_chunk else chunk)
+
+
+def stream_json_data(items: Iterable[dict]) -> StreamingHttpResponse:
+    """
+    Stream the items as the JSON body {"data": [...]}, which is what the
+    JSON:API renderer produces for a plain list. Each item is encoded
+    just before it's sent.
+    """
+    def generate():
+        yield '{"data":['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(
+                item, cls=JSONEncoder, ensure_ascii=False,
+                allow_nan=False, separators=(',', ':'))
+            separator = ','
+        yield ']}'
+
+    return StreamingHttpResponse(
+        generate(), content_type='application/vnd.api+json')
+
+
+def make_list_response(
+        request: Request, items: QuerySet | list[dict],
+        process_chunk: Callable[[list[dict]], list[dict]] = None,
+        chunk_size: int = 2000) -> Response | StreamingHttpResponse:
+    """
+    Respond with a list of dicts. If the request has the param stream=true,
+    the response is streamed: a queryset is read with a server-side
+    cursor and processed chunk by chunk, so memory use doesn't grow with
+    the list's length. Otherwise, the list is processed and rendered in
+    one go.
+    `process_chunk` takes a list of items, and returns the items to
+    include in the response, for example with more fields added.
+    Views using stream mode should be non_atomic_requests, since the
+    response is produced after the view returns.
+    """
+    if request.query_params.get('stream') == 'true':
+        if isinstance(items, QuerySet):
+            items = items.iterator(chunk_size=chunk_size)
+        return stream_json_data(
+            iterate_in_chunks(items, chunk_size, process_chunk))
+
+    items = list(items)
+    if process_chunk:
+        items = process_chunk(items)
+    return Response(items)
+
+
+def conditional_get(get_validators: Callable) -> Callable:
+    """
+    Class decorator adding conditional GET support to an API view: the
+    response gets ETag and Last-Modified headers, and a request whose
+    If-None-Match or If-Modified-Since still matches gets a 304 without
+    the view running at all.
+    `get_validators(request, **url_kwargs)` returns a tuple of (ETag
+    parts, last modified datetime), either of which can be None. It's
+    called once per request, and should be much cheaper than the view,
+    typically reading version numbers or modification times.
+    """
+    def get_request_validators(request, *args, **kwargs):
+        # Django's condition() asks for the ETag and the last modified
+        # time separately; compute both once.
+        if not hasattr(request, '_conditional_validators'):
+            request._conditional_validators = \
+                get_validators(request, *args, **kwargs)
+        return request._conditional_validators
+
+    def etag_func(request, *args, **kwargs):
+        etag_parts = get_request_validators(request, *args, **kwargs)[0]
+        if etag_parts is None:
+            return None
+        return ':'.join(str(part) for part in etag_parts)
+
+    def last_modified_func(request, *args, **kwargs):
+        return get_request_validators(request, *args, **kwargs)[1]
+
+    return method_decorator(
+        condition(etag_func=etag_func, last_modified_func=last_modified_func),
+        name='get')
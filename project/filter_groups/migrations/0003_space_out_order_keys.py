@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 16:02
+
+from django.db import migrations
+
+# core.utils.ORDER_KEY_GAP at the time of this migration.
+ORDER_KEY_GAP = 1024
+
+
+def renumber_order_keys(apps, gap):
+    FilterGroup = apps.get_model('filter_groups', 'FilterGroup')
+    filter_groups = list(FilterGroup.objects.order_by(
+        'game_id', 'order_in_game', 'id'))
+    game_id, position = None, 0
+    for filter_group in filter_groups:
+        if filter_group.game_id != game_id:
+            game_id, position = filter_group.game_id, 0
+        position += 1
+        filter_group.order_in_game = position * gap
+    FilterGroup.objects.bulk_update(filter_groups, ['order_in_game'])
+
+
+def space_out_order_keys(apps, schema_editor):
+    renumber_order_keys(apps, ORDER_KEY_GAP)
+
+
+def pack_order_keys(apps, schema_editor):
+    renumber_order_keys(apps, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filter_groups', '0002_filtergroup_game_filtergroup_order_in_game_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(space_out_order_keys, pack_order_keys),
+    ]
@@ -21,8 +21,9 @@ class FilterGroup(models.Model):
     # a game. However, for organizational purposes, it makes sense to link
     # filter groups to a game.
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
-    # Positive integer specifying order of this filter group relative to
-    # others for this game.
+    # Order key of this filter group relative to others for this game.
+    # Keys are spaced out (see core.utils.ORDER_KEY_GAP); the API shows
+    # positions instead.
     order_in_game = models.IntegerField()
 
     date_created = models.DateTimeField(auto_now_add=True)
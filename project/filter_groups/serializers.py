@@ -1,10 +1,13 @@
 from rest_framework_json_api import serializers
 
+from core.serializers import OrderPositionField
 from games.serializers import GameSerializer
 from .models import FilterGroup
 
 
 class FilterGroupSerializer(serializers.ModelSerializer):
+    order_in_game = OrderPositionField(group_field_names=['game'])
+
     # These related resources are available for inclusion with the
     # `include` query parameter.
     included_serializers = {
@@ -1,3 +1,6 @@
+import json
+from types import SimpleNamespace
+
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
@@ -83,6 +86,11 @@ class FilterGroupCreateTest(APITestCase):
         cls.game = Game(name="G")
         cls.game.save()
 
+    def get_names(self):
+        return list(
+            self.game.filtergroup_set.order_by('order_in_game')
+            .values_list('name', flat=True))
+
     def test_insert_only_fg(self):
         response = create_fg(self.game, "FG1")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -95,9 +103,9 @@ class FilterGroupCreateTest(APITestCase):
 
         response = create_fg(self.game, "FG2", order=1)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['order_in_game'], 1)
 
-        fg1.refresh_from_db()
-        self.assertEqual(fg1.order_in_game, 2)
+        self.assertListEqual(self.get_names(), ["FG2", "FG1"])
 
     def test_insert_fg_beyond_minimum_order(self):
         response = create_fg(self.game, "FG1", order=0)
@@ -111,9 +119,9 @@ class FilterGroupCreateTest(APITestCase):
 
         response = create_fg(self.game, "FG2", order=2)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['order_in_game'], 2)
 
-        fg1.refresh_from_db()
-        self.assertEqual(fg1.order_in_game, 1)
+        self.assertListEqual(self.get_names(), ["FG1", "FG2"])
 
     def test_insert_fg_beyond_maximum_order(self):
         fg1 = FilterGroup(
@@ -137,12 +145,8 @@ class FilterGroupCreateTest(APITestCase):
 
         create_fg(self.game, "FG4", order=2)
 
-        fg1.refresh_from_db()
-        self.assertEqual(fg1.order_in_game, 1)
-        fg2.refresh_from_db()
-        self.assertEqual(fg2.order_in_game, 3)
-        fg3.refresh_from_db()
-        self.assertEqual(fg3.order_in_game, 4)
+        self.assertListEqual(
+            self.get_names(), ["FG1", "FG4", "FG2", "FG3"])
 
 
 class FilterGroupPatchAndDeleteTest(APITestCase):
@@ -234,3 +238,59 @@ class FilterGroupPatchAndDeleteTest(APITestCase):
     def test_delete_last(self):
         self.delete_fg(self.fg5)
         self.assert_full_ordering(1, 2, 3, 4)
+
+
+class FilterGroupReorderTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="G")
+        cls.game.save()
+        cls.fgs = []
+        for order in [1, 2, 3]:
+            fg = FilterGroup(
+                game=cls.game, name=f"FG{order}", description="Test",
+                order_in_game=order)
+            fg.save()
+            cls.fgs.append(fg)
+
+    @staticmethod
+    def reorder(fg_ids, resource_type='filter-groups'):
+        client = APIClient()
+        # There's no user model yet; any authenticated user may write.
+        client.force_authenticate(user=SimpleNamespace(is_authenticated=True))
+        return client.post(
+            reverse('filter_groups:reorder'),
+            json.dumps({'data': [
+                {'type': resource_type, 'id': str(fg_id)}
+                for fg_id in fg_ids]}),
+            content_type='application/vnd.api+json')
+
+    def get_names(self):
+        return list(
+            self.game.filtergroup_set.order_by('order_in_game')
+            .values_list('name', flat=True))
+
+    def test_reorder(self):
+        fg1, fg2, fg3 = self.fgs
+        response = self.reorder([fg3.id, fg1.id, fg2.id])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertListEqual(self.get_names(), ["FG3", "FG1", "FG2"])
+
+    def test_incomplete_ordering(self):
+        fg1, fg2, fg3 = self.fgs
+        response = self.reorder([fg3.id, fg1.id])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertListEqual(self.get_names(), ["FG1", "FG2", "FG3"])
+
+    def test_unknown_id(self):
+        fg1, fg2, fg3 = self.fgs
+        response = self.reorder([fg3.id + 1, fg1.id, fg2.id])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertListEqual(self.get_names(), ["FG1", "FG2", "FG3"])
+
+    def test_wrong_resource_type(self):
+        response = self.reorder(
+            [fg.id for fg in self.fgs], resource_type='ladders')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -6,5 +6,6 @@ app_name = 'filter_groups'
 
 urlpatterns = [
     path('', views.FilterGroupIndex.as_view(), name="index"),
+    path('reorder/', views.FilterGroupReorder.as_view(), name="reorder"),
     path('<int:group_id>/', views.FilterGroupDetail.as_view(), name="detail"),
 ]
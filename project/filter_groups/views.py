@@ -1,13 +1,21 @@
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView)
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from charts.models import Chart
+from core.parsers import ResourceIdentifiersParser
 from core.utils import (
-    delete_ordered_obj_prep,
+    apply_ordering,
+    conditional_get,
     filter_queryset_by_param,
+    get_ordered_resource_ids,
     insert_ordered_obj_prep,
     reorder_obj_prep,
 )
+from games.utils import get_object_validators_func
 from .models import FilterGroup
 from .serializers import FilterGroupSerializer
 
@@ -45,6 +53,30 @@ class FilterGroupIndex(ListCreateAPIView):
         return super().create(request, *args, **kwargs)
 
 
+class FilterGroupReorder(APIView):
+    """
+    Apply a full new ordering to a game's filter groups. The request body
+    lists all of the game's filter groups in the desired order, as
+    resource identifiers: {"data": [{"type": "filter-groups", "id": "3"},
+    ...]}
+    """
+    parser_classes = [ResourceIdentifiersParser]
+
+    def post(self, request):
+        fg_ids = get_ordered_resource_ids(request, 'filter-groups')
+        first_fg = FilterGroup.objects.filter(id=fg_ids[0]).first()
+        if first_fg is None:
+            raise ValidationError(f"No filter group has ID {fg_ids[0]}.")
+        game_fgs = FilterGroup.objects.filter(game=first_fg.game_id)
+        apply_ordering('order_in_game', game_fgs, fg_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+get_filter_group_validators = get_object_validators_func(
+    FilterGroup, 'group_id', 'game')
+
+
+@conditional_get(get_filter_group_validators)
 class FilterGroupDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = FilterGroupSerializer
     lookup_url_kwarg = 'group_id'
@@ -60,11 +92,3 @@ class FilterGroupDetail(RetrieveUpdateDestroyAPIView):
             request, 'order_in_game', fg, game_fgs)
         # Edit FG.
         return super().patch(request, *args, **kwargs)
-
-    def delete(self, request, *args, **kwargs):
-        fg = self.get_object()
-        game_fgs = FilterGroup.objects.filter(game=fg.game)
-        # Prep before delete.
-        delete_ordered_obj_prep('order_in_game', fg, game_fgs)
-        # Delete FG.
-        return super().delete(request, *args, **kwargs)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class FiltersConfig(AppConfig):
     name = 'filters'
+
+    def ready(self):
+        # Register signal receivers.
+        from . import signals  # noqa: F401
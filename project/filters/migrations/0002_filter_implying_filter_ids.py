@@ -0,0 +1,44 @@
+# Generated by Django 4.0.10 on 2026-10-18 13:52
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+def fill_implying_filter_ids(apps, schema_editor):
+    Filter = apps.get_model('filters', 'Filter')
+    ThroughModel = Filter.outgoing_filter_implications.through
+
+    direct_implying_ids = dict()
+    for from_id, to_id in ThroughModel.objects.values_list(
+            'from_filter_id', 'to_filter_id'):
+        direct_implying_ids.setdefault(to_id, set()).add(from_id)
+
+    changed_filters = []
+    for f in Filter.objects.filter(id__in=direct_implying_ids.keys()):
+        implying_ids = set()
+        to_visit = [f.id]
+        while to_visit:
+            for implying_id in direct_implying_ids.get(to_visit.pop(), []):
+                if implying_id not in implying_ids:
+                    implying_ids.add(implying_id)
+                    to_visit.append(implying_id)
+        f.implying_filter_ids = sorted(implying_ids)
+        changed_filters.append(f)
+    Filter.objects.bulk_update(changed_filters, ['implying_filter_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filters', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='filter',
+            name='implying_filter_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(
+            fill_implying_filter_ids, migrations.RunPython.noop),
+    ]
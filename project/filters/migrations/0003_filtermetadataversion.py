@@ -0,0 +1,26 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    FilterMetadataVersion = apps.get_model('filters', 'FilterMetadataVersion')
+    FilterMetadataVersion.objects.create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('filters', '0002_filter_implying_filter_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilterMetadataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
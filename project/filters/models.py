@@ -1,3 +1,4 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
 from filter_groups.models import FilterGroup
@@ -18,6 +19,21 @@ class Filter(models.Model):
     outgoing_filter_implications = models.ManyToManyField(
         'self', symmetrical=False,
         related_name='incoming_filter_implications')
+    # IDs of all filters which imply this filter, directly or indirectly.
+    # This is derived from the implications, and is kept up to date by
+    # rebuild_filter_implication_index().
+    implying_filter_ids = ArrayField(
+        models.IntegerField(), default=list, blank=True)
 
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
+
+
+class FilterMetadataVersion(models.Model):
+    """
+    Single-row counter, incremented whenever filters, filter groups,
+    implications, or chart types' filter groups change. Each server
+    process checks it to know when its in-process filter metadata caches
+    are outdated.
+    """
+    version = models.IntegerField(default=0)
@@ -7,4 +7,5 @@ class FilterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Filter
         exclude = [
-            'outgoing_filter_implications', 'date_created', 'date_modified']
+            'outgoing_filter_implications', 'implying_filter_ids',
+            'date_created', 'date_modified']
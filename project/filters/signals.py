@@ -0,0 +1,54 @@
+from django.core.signals import request_started
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from chart_types.models import ChartType
+from filter_groups.models import FilterGroup
+from .models import Filter
+from .utils import (
+    clear_filter_metadata_cache,
+    expire_metadata_version_check,
+    rebuild_filter_implication_index,
+)
+
+
+@receiver(request_started)
+def request_started_handler(sender, **kwargs):
+    # Notice filter changes made by other processes since the last request.
+    expire_metadata_version_check()
+
+
+# Keep the filter metadata cache coherent with the database. Any change
+# to filters, filter groups, implications, or which filter groups a chart
+# type has may change how filter specs resolve.
+
+
+@receiver(post_save, sender=Filter)
+@receiver(post_save, sender=FilterGroup)
+@receiver(post_delete, sender=FilterGroup)
+def filter_metadata_changed(sender, **kwargs):
+    clear_filter_metadata_cache()
+
+
+@receiver(post_delete, sender=Filter)
+def filter_deleted(sender, instance, **kwargs):
+    # The filter's implications are gone, so filters it implied may have
+    # lost indirect implications too.
+    game_ids = Filter.objects \
+        .filter(implying_filter_ids__contains=[instance.id]) \
+        .values_list('filter_group__game', flat=True).distinct()
+    for game_id in game_ids:
+        rebuild_filter_implication_index(game_id)
+    clear_filter_metadata_cache()
+
+
+@receiver(m2m_changed, sender=Filter.outgoing_filter_implications.through)
+def filter_implications_changed(sender, instance, action, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        rebuild_filter_implication_index(instance.filter_group.game_id)
+
+
+@receiver(m2m_changed, sender=ChartType.filter_groups.through)
+def chart_type_filter_groups_changed(sender, action, **kwargs):
+    if action in ['post_add', 'post_remove', 'post_clear']:
+        clear_filter_metadata_cache()
@@ -1,3 +1,247 @@
-from django.test import TestCase
+import datetime
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from charts.models import Chart
+from chart_groups.models import ChartGroup
+from chart_types.models import ChartType
+from filter_groups.models import FilterGroup
+from games.models import Game
+from players.models import Player
+from records.models import Record
+from .models import Filter, FilterMetadataVersion
+from .utils import (
+    _LRUCache,
+    apply_filter_spec,
+    clear_filter_metadata_cache,
+    expire_metadata_version_check,
+    FilterSpec,
+    get_filters_metadata,
+    METADATA_VERSION_CHECK_INTERVAL_SECONDS,
+    project_filter_spec,
+)
+
+
+class ApplyFilterSpecTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero GX", short_code='gx')
+        game.save()
+        cls.ct = ChartType(
+            name="Time", game=game, format_spec=[], order_ascending=True)
+        cls.ct.save()
+        cls.ct_2 = ChartType(
+            name="Time 2", game=game, format_spec=[], order_ascending=True)
+        cls.ct_2.save()
+        cg = ChartGroup(name="Mute City", order_in_parent=1, game=game)
+        cg.save()
+        chart = Chart(
+            name="Course", order_in_group=1, chart_group=cg,
+            chart_type=cls.ct)
+        chart.save()
+        player = Player(username="P1")
+        player.save()
+
+        cls.fg_machine = FilterGroup(
+            name="Machine", game=game, order_in_game=1)
+        cls.fg_machine.save()
+        cls.fg_setting = FilterGroup(
+            name="Setting", game=game, order_in_game=2,
+            kind=FilterGroup.Kinds.NUMERIC)
+        cls.fg_setting.save()
+        cls.ct.filter_groups.add(cls.fg_machine, cls.fg_setting)
+        cls.ct_2.filter_groups.add(cls.fg_setting)
+
+        cls.f_bf = Filter(name="Blue Falcon", filter_group=cls.fg_machine)
+        cls.f_bf.save()
+        cls.f_gf = Filter(name="Golden Fox", filter_group=cls.fg_machine)
+        cls.f_gf.save()
+        cls.f_custom = Filter(
+            name="Custom", filter_group=cls.fg_machine,
+            usage_type=Filter.UsageTypes.IMPLIED)
+        cls.f_custom.save()
+        cls.f_custom_part = Filter(
+            name="Custom part", filter_group=cls.fg_machine)
+        cls.f_custom_part.save()
+        cls.f_custom_part.outgoing_filter_implications.add(cls.f_custom)
+        cls.settings = dict()
+        for value in [0, 50, 100]:
+            cls.settings[value] = Filter(
+                name=f"{value}%", filter_group=cls.fg_setting,
+                numeric_value=value)
+            cls.settings[value].save()
+
+        cls.records = dict()
+        for name, machine, setting in [
+                ('bf_100', cls.f_bf, 100), ('gf_50', cls.f_gf, 50),
+                ('custom_0', cls.f_custom_part, 0)]:
+            record = Record(
+                chart=chart, player=player, value=100,
+                date_achieved=datetime.datetime(
+                    2022, 1, 1, tzinfo=datetime.timezone.utc))
+            record.save()
+            record.filters.add(machine, cls.settings[setting])
+            cls.records[name] = record
+
+    def setUp(self):
+        # Test data is rolled back between tests, but the filter metadata
+        # cache isn't.
+        clear_filter_metadata_cache()
+
+    def assertFilterSpecMatches(self, spec_str, record_names, chart_type=None):
+        records = apply_filter_spec(
+            Record.objects.all(), FilterSpec(spec_str), chart_type)
+        self.assertSetEqual(
+            set(records.values_list('id', flat=True)),
+            set([self.records[name].id for name in record_names]))
+
+    def test_modifiers(self):
+        self.assertFilterSpecMatches(
+            f'{self.f_bf.id}', ['bf_100'])
+        self.assertFilterSpecMatches(
+            f'{self.f_bf.id}n', ['gf_50', 'custom_0'])
+        self.assertFilterSpecMatches(
+            f'{self.f_custom.id}', ['custom_0'])
+        self.assertFilterSpecMatches(
+            f'{self.f_custom.id}n', ['bf_100', 'gf_50'])
+        self.assertFilterSpecMatches(
+            f'{self.settings[50].id}ge', ['bf_100', 'gf_50'])
+        self.assertFilterSpecMatches(
+            f'{self.settings[50].id}le', ['gf_50', 'custom_0'])
+        self.assertFilterSpecMatches(
+            f'{self.f_bf.id}n-{self.settings[50].id}ge', ['gf_50'])
+
+    def test_chart_type_excludes_other_filter_groups(self):
+        spec = FilterSpec(f'{self.f_gf.id}-{self.settings[50].id}le')
+        # Machine doesn't apply to this chart type.
+        records = apply_filter_spec(Record.objects.all(), spec, self.ct_2)
+        self.assertSetEqual(
+            set(records.values_list('id', flat=True)),
+            set([self.records['gf_50'].id, self.records['custom_0'].id]))
+        # The passed spec isn't modified.
+        self.assertEqual(len(spec.items), 2)
+        self.assertFilterSpecMatches(str(spec), ['gf_50'], self.ct)
+
+    def test_metadata_is_cached(self):
+        spec_str = f'{self.f_custom.id}n-{self.settings[50].id}ge'
+        apply_filter_spec(Record.objects.all(), FilterSpec(spec_str), self.ct)
+
+        # Building the queryset again doesn't need any queries.
+        with CaptureQueriesContext(connection) as context:
+            apply_filter_spec(
+                Record.objects.all(), FilterSpec(spec_str), self.ct)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_projection_is_cached(self):
+        spec = FilterSpec(f'{self.f_gf.id}-{self.settings[50].id}le')
+        reduced_spec, predicate = project_filter_spec(spec, self.ct_2)
+        self.assertEqual(str(reduced_spec), f'{self.settings[50].id}le')
+
+        with CaptureQueriesContext(connection) as context:
+            projection = project_filter_spec(
+                FilterSpec(str(spec)), self.ct_2)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertIs(projection[1], predicate)
+
+    def test_cache_invalidated_by_implication_change(self):
+        self.assertFilterSpecMatches(f'{self.f_custom.id}', ['custom_0'])
+        self.f_gf.outgoing_filter_implications.add(self.f_custom)
+        self.assertFilterSpecMatches(
+            f'{self.f_custom.id}', ['gf_50', 'custom_0'])
+
+    def test_cache_invalidated_by_other_process(self):
+        self.assertEqual(
+            get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+            "Blue Falcon")
+
+        # Another process renames the filter and bumps the version. Signals
+        # don't run here, so only the version tells us about the change.
+        Filter.objects.filter(id=self.f_bf.id).update(name="Blue Falcon II")
+        FilterMetadataVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(
+            get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+            "Blue Falcon")
+        # Checked on the next request.
+        expire_metadata_version_check()
+        self.assertEqual(
+            get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+            "Blue Falcon II")
+
+    def test_cache_rechecked_after_interval(self):
+        # Outside of requests, such as in a management command, nothing
+        # expires the check, so it expires with time.
+        expire_metadata_version_check()
+        get_filters_metadata([self.f_bf.id])
+        Filter.objects.filter(id=self.f_bf.id).update(name="Blue Falcon II")
+        FilterMetadataVersion.objects.update(version=F('version') + 1)
+        self.assertEqual(
+            get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+            "Blue Falcon")
+        later = time.monotonic() + METADATA_VERSION_CHECK_INTERVAL_SECONDS
+        with mock.patch('filters.utils.time.monotonic', return_value=later):
+            self.assertEqual(
+                get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+                "Blue Falcon II")
+
+    def test_check_expired_per_thread(self):
+        get_filters_metadata([self.f_bf.id])
+        # Another thread starting a request doesn't expire this thread's
+        # check, which may be partway through a request.
+        thread = threading.Thread(target=expire_metadata_version_check)
+        thread.start()
+        thread.join()
+        with CaptureQueriesContext(connection) as context:
+            get_filters_metadata([self.f_bf.id])
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_version_not_bumped_before_commit(self):
+        # Otherwise, another process could cache the data from before the
+        # change under the new version.
+        version = FilterMetadataVersion.objects.get().version
+        self.f_bf.name = "Blue Falcon II"
+        self.f_bf.save()
+        self.assertEqual(FilterMetadataVersion.objects.get().version, version)
+        # This process sees the change right away.
+        self.assertEqual(
+            get_filters_metadata([self.f_bf.id])[self.f_bf.id]['name'],
+            "Blue Falcon II")
+
+    def test_indirect_implications(self):
+        # Golden Fox implies Custom part, which implies Custom.
+        self.f_gf.outgoing_filter_implications.add(self.f_custom_part)
+        self.f_custom.refresh_from_db()
+        self.assertListEqual(
+            self.f_custom.implying_filter_ids,
+            sorted([self.f_gf.id, self.f_custom_part.id]))
+        self.assertFilterSpecMatches(
+            f'{self.f_custom.id}', ['gf_50', 'custom_0'])
+
+        # Deleting the filter in the middle breaks the chain.
+        self.f_custom_part.delete()
+        self.f_custom.refresh_from_db()
+        self.assertListEqual(self.f_custom.implying_filter_ids, [])
+
+    def test_nonexistent_filter(self):
+        with self.assertRaises(Filter.DoesNotExist):
+            apply_filter_spec(Record.objects.all(), FilterSpec('999999'))
+
+
+class LRUCacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru_cache = _LRUCache(2)
+        lru_cache['a'] = 1
+        lru_cache['b'] = 2
+        # Using 'a' makes 'b' the least recently used.
+        self.assertEqual(lru_cache['a'], 1)
+        lru_cache['c'] = 3
+        self.assertListEqual(sorted(lru_cache.keys()), ['a', 'c'])
@@ -1,13 +1,201 @@
-import copy
+from collections import defaultdict, OrderedDict
 import re
+import threading
+import time
 
-from django.db.models import Case, QuerySet, TextChoices, When
+from django.db.models import Case, F, Q, QuerySet, TextChoices, When
 from django.conf import settings
 
 from chart_types.models import ChartType
-from filter_groups.models import FilterGroup
+from core.utils import on_commit_once
 from ladders.models import Ladder
-from .models import Filter
+from .models import Filter, FilterMetadataVersion
+
+
+class _LRUCache(OrderedDict):
+    """
+    Dict which holds at most `max_size` items, evicting the least recently
+    used item when full.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max_size
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+# In-process caches of filter metadata. Filters, filter groups, and
+# implications rarely change, and are looked up constantly when applying
+# filter specs, so we keep them in memory.
+# These are cleared by signal receivers whenever the underlying data
+# changes. To also notice changes made by other server processes, each
+# change bumps a version number in the database once committed. Each
+# request checks that version (once) before using the in-process caches.
+# Code running outside of requests, such as management commands, checks
+# it again once the last check is old enough.
+# Caches keyed by filter spec strings, which come from clients, are
+# bounded in size.
+_filter_cache: dict[int, dict] = dict()
+_resolved_spec_cache: dict[str, list[dict]] = _LRUCache(1000)
+_filter_group_filters_cache: dict[int, list[dict]] = dict()
+_chart_type_filter_groups_cache: dict[int, frozenset[int]] = dict()
+_projection_cache: dict[tuple[str, int | None], tuple['FilterSpec', Q]] = \
+    _LRUCache(1000)
+_local_metadata_version = None
+# Each thread serves its own requests, so each tracks when it last
+# checked the version.
+_metadata_version_check = threading.local()
+METADATA_VERSION_CHECK_INTERVAL_SECONDS = 5
+
+
+def _clear_local_metadata_caches():
+    _filter_cache.clear()
+    _resolved_spec_cache.clear()
+    _filter_group_filters_cache.clear()
+    _chart_type_filter_groups_cache.clear()
+    _projection_cache.clear()
+
+
+def _check_metadata_version():
+    global _local_metadata_version
+    checked_at = getattr(_metadata_version_check, 'checked_at', None)
+    if checked_at is not None and (
+            time.monotonic() - checked_at
+            < METADATA_VERSION_CHECK_INTERVAL_SECONDS):
+        return
+    version = FilterMetadataVersion.objects \
+        .values_list('version', flat=True).first()
+    if version != _local_metadata_version:
+        _clear_local_metadata_caches()
+        _local_metadata_version = version
+    _metadata_version_check.checked_at = time.monotonic()
+
+
+def expire_metadata_version_check():
+    """
+    Have this thread's next use of the filter metadata caches check the
+    database's metadata version again. Called at the start of each
+    request.
+    """
+    _metadata_version_check.checked_at = None
+
+
+def _bump_metadata_version():
+    FilterMetadataVersion.objects.update(version=F('version') + 1)
+    # Data cached during the transaction may be from before the change.
+    _clear_local_metadata_caches()
+    expire_metadata_version_check()
+
+
+def clear_filter_metadata_cache():
+    """
+    Call this when filters, filter groups, implications, or chart types'
+    filter groups change. This process's caches are cleared right away.
+    Other processes' caches are cleared once the change is committed, so
+    that they don't re-cache the data from before the change.
+    """
+    _clear_local_metadata_caches()
+    on_commit_once(_bump_metadata_version)
+
+
+def get_filters_metadata(filter_ids: list[int]) -> dict[int, dict]:
+    """
+    Get metadata of the given filters, as dicts keyed by filter ID.
+    Filters which aren't cached yet are fetched in a single query.
+    """
+    _check_metadata_version()
+
+    missing_ids = [
+        filter_id for filter_id in set(filter_ids)
+        if filter_id not in _filter_cache]
+    if missing_ids:
+        filters = Filter.objects.filter(id__in=missing_ids).values(
+            'id', 'name', 'filter_group_id', 'usage_type', 'numeric_value',
+            'implying_filter_ids')
+        for f in filters:
+            _filter_cache[f['id']] = f
+
+    return {
+        filter_id: _filter_cache[filter_id] for filter_id in filter_ids
+        if filter_id in _filter_cache}
+
+
+def get_filter_group_filters(filter_group_id: int) -> list[dict]:
+    """
+    IDs and numeric values of all the filters in a filter group.
+    """
+    _check_metadata_version()
+
+    if filter_group_id not in _filter_group_filters_cache:
+        _filter_group_filters_cache[filter_group_id] = list(
+            Filter.objects.filter(filter_group=filter_group_id)
+            .values('id', 'numeric_value'))
+    return _filter_group_filters_cache[filter_group_id]
+
+
+def get_chart_type_filter_group_ids(chart_type: ChartType) -> frozenset[int]:
+    _check_metadata_version()
+
+    if chart_type.id not in _chart_type_filter_groups_cache:
+        _chart_type_filter_groups_cache[chart_type.id] = frozenset(
+            chart_type.filter_groups.values_list('id', flat=True))
+    return _chart_type_filter_groups_cache[chart_type.id]
+
+
+def get_implication_closure(
+        implications: list[tuple[int, int]]) -> dict[int, set[int]]:
+    """
+    Given direct implications as (implying filter ID, implied filter ID)
+    pairs, get the IDs of all filters implying each implied filter,
+    directly or indirectly.
+    """
+    direct_implying_ids = defaultdict(set)
+    for from_id, to_id in implications:
+        direct_implying_ids[to_id].add(from_id)
+
+    closure = dict()
+    for filter_id in direct_implying_ids:
+        implying_ids = set()
+        to_visit = [filter_id]
+        while to_visit:
+            for implying_id in direct_implying_ids.get(to_visit.pop(), []):
+                if implying_id not in implying_ids:
+                    implying_ids.add(implying_id)
+                    to_visit.append(implying_id)
+        closure[filter_id] = implying_ids
+    return closure
+
+
+def rebuild_filter_implication_index(game_id: int):
+    """
+    Recompute implying_filter_ids of all the game's filters from their
+    implications. Call this after implications are changed.
+    """
+    ThroughModel = Filter.outgoing_filter_implications.through
+    implications = ThroughModel.objects \
+        .filter(to_filter__filter_group__game=game_id) \
+        .values_list('from_filter_id', 'to_filter_id')
+    closure = get_implication_closure(implications)
+
+    changed_filters = []
+    for f in Filter.objects.filter(filter_group__game=game_id):
+        implying_ids = sorted(closure.get(f.id, []))
+        if f.implying_filter_ids != implying_ids:
+            f.implying_filter_ids = implying_ids
+            changed_filters.append(f)
+    Filter.objects.bulk_update(changed_filters, ['implying_filter_ids'])
+
+    clear_filter_metadata_cache()
 
 
 class FilterSpec:
@@ -43,7 +231,7 @@ class FilterSpec:
                     f"Could not parse filter spec: {spec_str}")
             filter_id, modifier_code = regex_match.groups()
             self.items.append(dict(
-                filter_id=filter_id,
+                filter_id=int(filter_id),
                 modifier=self.Modifiers(modifier_code),
             ))
 
@@ -75,20 +263,44 @@ class FilterSpec:
         return FilterSpec(spec_str)
 
     @property
-    def filter_groups(self) -> list[FilterGroup]:
+    def resolved_items(self) -> list[dict]:
+        """
+        The spec's items, each with a `filter` key holding the filter's
+        metadata: group, usage type, numeric value, and the IDs of filters
+        implying it. Resolved specs are memoized, so this doesn't query
+        the database after the first time a spec is seen.
+        """
+        _check_metadata_version()
+
+        if self.spec_str not in _resolved_spec_cache:
+            filters = get_filters_metadata(
+                [item['filter_id'] for item in self.items])
+            resolved_items = []
+            for item in self.items:
+                if item['filter_id'] not in filters:
+                    raise Filter.DoesNotExist(
+                        f"Filter {item['filter_id']} does not exist.")
+                resolved_items.append(dict(
+                    item, filter=filters[item['filter_id']]))
+            _resolved_spec_cache[self.spec_str] = resolved_items
+        return _resolved_spec_cache[self.spec_str]
+
+    @property
+    def filter_group_ids(self) -> list[int]:
         return [
-            Filter.objects.get(id=item['filter_id']).filter_group
-            for item in self.items
-        ]
+            item['filter']['filter_group_id']
+            for item in self.resolved_items]
 
-    def remove_filter_group(self, filter_group: FilterGroup):
+    def only_filter_groups(self, filter_group_ids: set[int]) -> 'FilterSpec':
         """
-        Remove the item of the given filter group, if such an item exists.
+        Return a copy of this spec, keeping only the items of the given
+        filter groups.
         """
-        filter_groups = self.filter_groups
-        if filter_group in filter_groups:
-            index = filter_groups.index(filter_group)
-            self.items.pop(index)
+        item_strs = [
+            f"{item['filter_id']}{item['modifier'].value}"
+            for item in self.resolved_items
+            if item['filter']['filter_group_id'] in filter_group_ids]
+        return FilterSpec('-'.join(item_strs))
 
     def is_empty(self):
         return len(self.items) == 0
@@ -97,63 +309,95 @@ class FilterSpec:
         return self.spec_str
 
 
+def _get_item_predicate(item: dict) -> Q:
+    """
+    Predicate on records for one resolved filter spec item.
+    Each condition is a containment or overlap test on the records'
+    filter_ids arrays, which a GIN index can serve, rather than a join on
+    the record-filter relation. Predicates for several items (and chart
+    types) can be freely combined in a single filter() call.
+    """
+    f = item['filter']
+    modifier = item['modifier']
+
+    if modifier == FilterSpec.Modifiers.IS:
+        # Basic filter matching.
+        if f['usage_type'] == Filter.UsageTypes.CHOOSABLE.value:
+            # The record uses this filter.
+            return Q(filter_ids__contains=[f['id']])
+        elif f['usage_type'] == Filter.UsageTypes.IMPLIED.value:
+            # The record has a filter that implies this filter.
+            return Q(filter_ids__overlap=f['implying_filter_ids'])
+    elif modifier == FilterSpec.Modifiers.IS_NOT:
+        # Negation.
+        group_filter_ids = [
+            group_f['id'] for group_f
+            in get_filter_group_filters(f['filter_group_id'])]
+        has_filter_in_group = Q(filter_ids__overlap=group_filter_ids)
+        if f['usage_type'] == Filter.UsageTypes.CHOOSABLE.value:
+            # The record has a filter in this group that doesn't
+            # match the specified filter.
+            return has_filter_in_group & ~Q(filter_ids__contains=[f['id']])
+        elif f['usage_type'] == Filter.UsageTypes.IMPLIED.value:
+            # The record has a filter in this group that doesn't
+            # imply the specified filter.
+            return has_filter_in_group \
+                & ~Q(filter_ids__overlap=f['implying_filter_ids'])
+    elif modifier == FilterSpec.Modifiers.LESS_OR_EQUAL:
+        # Less than or equal to, for numeric filters.
+        return Q(filter_ids__overlap=[
+            group_f['id'] for group_f
+            in get_filter_group_filters(f['filter_group_id'])
+            if group_f['numeric_value'] is not None
+            and group_f['numeric_value'] <= f['numeric_value']])
+    elif modifier == FilterSpec.Modifiers.GREATER_OR_EQUAL:
+        # Greater than or equal to, for numeric filters.
+        return Q(filter_ids__overlap=[
+            group_f['id'] for group_f
+            in get_filter_group_filters(f['filter_group_id'])
+            if group_f['numeric_value'] is not None
+            and group_f['numeric_value'] >= f['numeric_value']])
+    return Q()
+
+
+def project_filter_spec(
+        filter_spec: FilterSpec,
+        chart_type: ChartType = None) -> tuple[FilterSpec, Q]:
+    """
+    Reduce `filter_spec` to the filter groups that apply to `chart_type`
+    (if passed), and build the reduced spec's predicate on records.
+    The result is cached per (spec, chart type) pair, so this is
+    a dictionary lookup after the first call.
+    """
+    _check_metadata_version()
+
+    cache_key = (
+        filter_spec.spec_str, chart_type.id if chart_type else None)
+    if cache_key not in _projection_cache:
+        reduced_spec = filter_spec
+        if chart_type:
+            applicable_fg_ids = get_chart_type_filter_group_ids(chart_type)
+            if not set(filter_spec.filter_group_ids) <= applicable_fg_ids:
+                reduced_spec = filter_spec.only_filter_groups(
+                    applicable_fg_ids)
+
+        predicate = Q()
+        for item in reduced_spec.resolved_items:
+            predicate &= _get_item_predicate(item)
+
+        _projection_cache[cache_key] = (reduced_spec, predicate)
+    return _projection_cache[cache_key]
+
+
 def apply_filter_spec(
-        records: QuerySet, filter_spec_in: FilterSpec,
+        records: QuerySet, filter_spec: FilterSpec,
         chart_type: ChartType = None) -> QuerySet:
     """
-    Filter `records` based on `filter_spec_in`. If `chart_type` is passed,
+    Filter `records` based on `filter_spec`. If `chart_type` is passed,
     any filter spec parts that don't apply to the chart type are excluded.
     """
-    filter_spec = filter_spec_in
-    if chart_type:
-        non_applicable_fgs = \
-            set(filter_spec_in.filter_groups) \
-            - set(chart_type.filter_groups.all())
-        if non_applicable_fgs:
-            filter_spec = copy.copy(filter_spec_in)
-            for fg in non_applicable_fgs:
-                filter_spec.remove_filter_group(fg)
-
-    for item in filter_spec.items:
-        filter_id = item['filter_id']
-        f = Filter.objects.get(id=filter_id)
-        modifier = item['modifier']
-
-        if modifier == FilterSpec.Modifiers.IS:
-            # Basic filter matching.
-            if f.usage_type == Filter.UsageTypes.CHOOSABLE.value:
-                # The record uses this filter.
-                records = records.filter(filters=filter_id)
-            elif f.usage_type == Filter.UsageTypes.IMPLIED.value:
-                # The record has a filter that implies this filter.
-                records = records.filter(
-                    filters__in=f.incoming_filter_implications.all())
-        elif modifier == FilterSpec.Modifiers.IS_NOT:
-            # Negation.
-            if f.usage_type == Filter.UsageTypes.CHOOSABLE.value:
-                # The record has a filter in this group that doesn't
-                # match the specified filter.
-                records = records \
-                    .filter(filters__filter_group=f.filter_group) \
-                    .exclude(filters=filter_id)
-            elif f.usage_type == Filter.UsageTypes.IMPLIED.value:
-                # The record has a filter in this group that doesn't
-                # imply the specified filter.
-                records = records \
-                    .filter(filters__filter_group=f.filter_group) \
-                    .exclude(filters__in=f.incoming_filter_implications.all())
-        elif modifier == FilterSpec.Modifiers.LESS_OR_EQUAL:
-            # Less than or equal to, for numeric filters.
-            records = records.filter(
-                filters__filter_group=f.filter_group,
-                filters__numeric_value__lte=f.numeric_value)
-        elif modifier == FilterSpec.Modifiers.GREATER_OR_EQUAL:
-            # Greater than or equal to, for numeric filters.
-            records = records.filter(
-                filters__filter_group=f.filter_group,
-                filters__numeric_value__gte=f.numeric_value)
-
-    return records
+    _, predicate = project_filter_spec(filter_spec, chart_type)
+    return records.filter(predicate)
 
 
 def apply_name_search(
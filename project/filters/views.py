@@ -2,7 +2,8 @@ from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView)
 from rest_framework_json_api.views import RelationshipView
 
-from core.utils import filter_queryset_by_param
+from core.utils import conditional_get, filter_queryset_by_param
+from games.utils import get_object_validators_func
 from ladders.models import Ladder
 from .models import Filter
 from .serializers import FilterSerializer
@@ -50,6 +51,11 @@ class FilterIndex(ListCreateAPIView):
         return queryset
 
 
+get_filter_validators = get_object_validators_func(
+    Filter, 'filter_id', 'filter_group__game')
+
+
+@conditional_get(get_filter_validators)
 class FilterDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = FilterSerializer
     lookup_url_kwarg = 'filter_id'
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from forum_old.posts.utils import render_post_texts
+
+
+class Command(BaseCommand):
+    help = """
+    Build old-forum posts' rendered text, expanding {pi=N} includes.
+    The old-forum import does this already; this is for when posts have
+    been changed some other way.
+
+    Example usage:
+    python manage.py render_post_texts
+    """
+
+    def handle(self, *args, **options):
+        cycle_post_ids = render_post_texts()
+        if cycle_post_ids:
+            self.stdout.write(
+                "Posts with circular includes (left unexpanded): "
+                + ", ".join(
+                    str(post_id) for post_id in sorted(cycle_post_ids)))
+        self.stdout.write("Rendered post texts")
@@ -0,0 +1,26 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum_old_posts', '0003_post_edit_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='rendered_text',
+            field=models.TextField(null=True),
+        ),
+        # Posts without includes render to their raw text. Posts with
+        # includes are left for the render_post_texts command.
+        migrations.RunSQL(
+            """
+            UPDATE forum_old_posts_post SET rendered_text = raw_text
+            WHERE raw_text NOT LIKE '%%{pi=%%'
+            """,
+            migrations.RunSQL.noop),
+    ]
@@ -26,17 +26,20 @@ class Post(models.Model):
     # code. Basically a way of including a post within another post.
     post_include_regex = re.compile(r'{pi=(\d+)}')
 
+    # raw_text with includes expanded. This is built ahead of time by
+    # render_post_texts(), since the archive is read-only. Null if not
+    # built yet.
+    rendered_text = models.TextField(null=True)
+
     @property
     def text(self):
         """
         Pre-process raw_text from the database, and output text for the API.
         """
-        text = self.raw_text
-
-        for match in self.post_include_regex.finditer(text):
-            post_id = match.groups()[0]
-            pi_text = match.string[match.start():match.end()]
-            included_post_text = Post.objects.get(id=post_id).text
-            text = text.replace(pi_text, included_post_text)
+        if self.rendered_text is not None:
+            return self.rendered_text
 
-        return text
+        # Not built yet, so expand includes now.
+        # Imported here to avoid a circular import.
+        from .utils import expand_post_includes
+        return expand_post_includes({self.id: self.raw_text})[0][self.id]
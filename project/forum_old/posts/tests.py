@@ -1,3 +1,122 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from ..categories.models import Category
+from ..forums.models import Forum
+from ..topics.models import Topic
+from .models import Post
+from .utils import render_post_texts
+
+
+class PostTextTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category(title="General", order=1)
+        category.save()
+        forum = Forum(
+            name="Off-topic", description="", order=1, category=category)
+        forum.save()
+        cls.topic = Topic(title="Topic", forum=forum)
+        cls.topic.save()
+
+    def make_post(self, raw_text):
+        post = Post(
+            subject="", raw_text=raw_text, username="", topic=self.topic,
+            time=datetime.datetime(2005, 1, 1, tzinfo=datetime.timezone.utc))
+        post.save()
+        return post
+
+    def set_raw_text(self, post, raw_text):
+        post.raw_text = raw_text
+        post.save()
+
+    def test_nested_includes(self):
+        p1 = self.make_post("A")
+        p2 = self.make_post(f"B{{pi={p1.id}}}")
+        p3 = self.make_post(f"C{{pi={p2.id}}}{{pi={p1.id}}}")
+
+        # Not rendered yet; expanded on the fly, with one query per
+        # level of nesting. p2 and p1 are both fetched in the first level.
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(Post.objects.get(id=p3.id).text, "CBAA")
+        self.assertEqual(len(context.captured_queries), 2)
+
+        p4 = self.make_post(f"D{{pi={p3.id}}}")
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(Post.objects.get(id=p4.id).text, "DCBAA")
+        self.assertEqual(len(context.captured_queries), 3)
+
+        self.assertSetEqual(render_post_texts(), set())
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(Post.objects.get(id=p3.id).text, "CBAA")
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(Post.objects.get(id=p2.id).text, "BA")
+        self.assertEqual(Post.objects.get(id=p1.id).text, "A")
+
+    def test_cycle(self):
+        p1 = self.make_post("A")
+        p2 = self.make_post(f"B{{pi={p1.id}}}")
+        self.set_raw_text(p1, f"A{{pi={p2.id}}}")
+        p3 = self.make_post("C")
+        self.set_raw_text(p3, f"C{{pi={p3.id}}}")
+
+        cycle_post_ids = render_post_texts()
+        self.assertSetEqual(cycle_post_ids, {p1.id, p2.id, p3.id})
+        # The include closing the cycle is left as is, but all the posts
+        # are still rendered.
+        texts = [
+            Post.objects.get(id=p.id).text for p in [p1, p2, p3]]
+        self.assertIn(texts[:2], [
+            [f"AB{{pi={p1.id}}}", f"B{{pi={p1.id}}}"],
+            [f"A{{pi={p2.id}}}", f"BA{{pi={p2.id}}}"],
+        ])
+        self.assertEqual(texts[2], f"C{{pi={p3.id}}}")
+
+    def test_missing_post(self):
+        p1 = self.make_post("A{pi=999999}")
+        self.assertEqual(Post.objects.get(id=p1.id).text, "A{pi=999999}")
+        render_post_texts()
+        self.assertEqual(Post.objects.get(id=p1.id).text, "A{pi=999999}")
+
+    def test_api(self):
+        p1 = self.make_post("A")
+        p2 = self.make_post(f"B{{pi={p1.id}}}")
+        render_post_texts()
+        client = APIClient()
+        response = client.get(reverse('forum_old_posts:detail', args=[p2.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['attributes']['text'], "BA")
+
+    def get_index_with_query_count(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                reverse('forum_old_posts:index'),
+                {'topic_id': self.topic.id, 'page[size]': 100})
+        self.assertEqual(response.status_code, 200)
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        return response, len(selects)
+
+    def test_api_unrendered_page(self):
+        p1 = self.make_post("A")
+        self.make_post(f"B{{pi={p1.id}}}")
+        response, query_count = self.get_index_with_query_count()
+        self.assertListEqual(
+            [post['attributes']['text'] for post in response.json()['data']],
+            ["A", "BA"])
+
+        # Unrendered posts are expanded together, not one at a time.
+        for _ in range(3):
+            self.make_post(f"C{{pi={p1.id}}}")
+        response, more_posts_query_count = \
+            self.get_index_with_query_count()
+        self.assertEqual(len(response.json()['data']), 5)
+        self.assertEqual(more_posts_query_count, query_count)
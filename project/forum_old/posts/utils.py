@@ -0,0 +1,143 @@
+from django.db.models import F, QuerySet
+
+from .models import Post
+
+
+def get_included_post_ids(text: str) -> list[int]:
+    return [
+        int(match.groups()[0])
+        for match in Post.post_include_regex.finditer(text)]
+
+
+def expand_post_includes(
+        texts: dict[int, str]) -> tuple[dict[int, str], set[int]]:
+    """
+    Expand the {pi=N} includes in the given posts' texts (keyed by post ID).
+
+    Included posts are fetched in one query per level of include nesting,
+    rather than one query per include. Included posts which already have
+    rendered text are used as-is.
+    Posts are expanded in topological order, so each included post is
+    expanded before the posts including it. An include which would form
+    a cycle, or which refers to a nonexistent post, is left unexpanded.
+
+    Returns the expanded texts of all the posts involved (the given posts
+    and the posts they include), and the IDs of posts found to be in
+    include cycles.
+    """
+    texts = dict(texts)
+    # Posts whose text is final, with no includes to follow.
+    done_ids = set()
+
+    # Fetch included posts, level by level.
+    requested_ids = set(texts.keys())
+    to_fetch_ids = set()
+    for text in texts.values():
+        to_fetch_ids.update(get_included_post_ids(text))
+    to_fetch_ids -= requested_ids
+    while to_fetch_ids:
+        requested_ids |= to_fetch_ids
+        fetched = Post.objects.filter(id__in=to_fetch_ids) \
+            .values_list('id', 'raw_text', 'rendered_text')
+        to_fetch_ids = set()
+        for post_id, raw_text, rendered_text in fetched:
+            if rendered_text is not None:
+                texts[post_id] = rendered_text
+                done_ids.add(post_id)
+            else:
+                texts[post_id] = raw_text
+                to_fetch_ids.update(get_included_post_ids(raw_text))
+        to_fetch_ids -= requested_ids
+
+    # Expand in topological order with a depth-first search. A post which
+    # is reached again while it's still being expanded (i.e. it's on the
+    # stack) closes a cycle.
+    in_progress_ids = set()
+    cycle_post_ids = set()
+
+    def get_dependency_ids(post_id):
+        if post_id in done_ids:
+            return iter([])
+        return iter([
+            included_id for included_id
+            in get_included_post_ids(texts[post_id])
+            if included_id in texts])
+
+    for root_id in list(texts.keys()):
+        if root_id in done_ids:
+            continue
+        in_progress_ids.add(root_id)
+        stack = [(root_id, get_dependency_ids(root_id))]
+
+        while stack:
+            post_id, dependency_ids = stack[-1]
+
+            for dependency_id in dependency_ids:
+                if dependency_id in in_progress_ids:
+                    cycle_post_ids.update([post_id, dependency_id])
+                elif dependency_id not in done_ids:
+                    in_progress_ids.add(dependency_id)
+                    stack.append(
+                        (dependency_id, get_dependency_ids(dependency_id)))
+                    break
+            else:
+                # All dependencies are expanded (or can't be).
+                stack.pop()
+                in_progress_ids.remove(post_id)
+                text = texts[post_id]
+                for match in Post.post_include_regex.finditer(text):
+                    included_id = int(match.groups()[0])
+                    if included_id in done_ids:
+                        text = text.replace(match.group(), texts[included_id])
+                texts[post_id] = text
+                done_ids.add(post_id)
+
+    return texts, cycle_post_ids
+
+
+def fill_in_post_texts(posts: list[Post]):
+    """
+    Set the rendered_text of any of `posts` which don't have it built yet,
+    without saving it. Their raw texts are fetched in one query, and their
+    includes expanded together, so posts which are about to be serialized
+    don't each fall back to expanding their own includes.
+    """
+    unrendered_posts = [post for post in posts if post.rendered_text is None]
+    if not unrendered_posts:
+        return
+
+    raw_texts = dict(
+        Post.objects.filter(id__in=[post.id for post in unrendered_posts])
+        .values_list('id', 'raw_text'))
+    texts, _ = expand_post_includes(raw_texts)
+    for post in unrendered_posts:
+        post.rendered_text = texts[post.id]
+
+
+def render_post_texts(posts: QuerySet = None) -> set[int]:
+    """
+    Build rendered_text of `posts` (default all posts). Returns the IDs of
+    posts found to be in include cycles.
+    """
+    if posts is None:
+        posts = Post.objects.all()
+
+    # Most posts have no includes, so their rendered text is just the
+    # raw text.
+    posts.exclude(raw_text__contains='{pi=') \
+        .update(rendered_text=F('raw_text'))
+
+    # For the rest, expand includes.
+    posts_with_includes = dict(
+        posts.filter(raw_text__contains='{pi=')
+        .values_list('id', 'raw_text'))
+    texts, cycle_post_ids = expand_post_includes(posts_with_includes)
+
+    Post.objects.bulk_update(
+        [
+            Post(id=post_id, rendered_text=texts[post_id])
+            for post_id in posts_with_includes
+        ],
+        ['rendered_text'], batch_size=1000)
+
+    return cycle_post_ids
@@ -1,12 +1,13 @@
 from rest_framework.generics import ListAPIView, RetrieveAPIView
-from rest_framework_json_api.pagination import JsonApiPageNumberPagination
 
+from core.pagination import KeysetPagination
 from core.utils import filter_queryset_by_param
 from .models import Post
 from .serializers import PostSerializer
+from .utils import fill_in_post_texts
 
 
-class PostPagination(JsonApiPageNumberPagination):
+class PostPagination(KeysetPagination):
     # Default page size
     page_size = 20
 
@@ -16,7 +17,8 @@ class PostIndex(ListAPIView):
     pagination_class = PostPagination
 
     def get_queryset(self):
-        queryset = Post.objects.all()
+        # Serializers output the pre-rendered text, not the raw text.
+        queryset = Post.objects.defer('raw_text')
 
         queryset = filter_queryset_by_param(
             self.request, 'topic_id', queryset, 'topic')
@@ -27,10 +29,20 @@ class PostIndex(ListAPIView):
         queryset = queryset.order_by('id')
         return queryset
 
+    def paginate_queryset(self, queryset):
+        posts = super().paginate_queryset(queryset)
+        fill_in_post_texts(posts)
+        return posts
+
 
 class PostDetail(RetrieveAPIView):
     serializer_class = PostSerializer
     lookup_url_kwarg = 'post_id'
 
     def get_queryset(self):
-        return Post.objects.all()
+        return Post.objects.defer('raw_text')
+
+    def get_object(self):
+        post = super().get_object()
+        fill_in_post_texts([post])
+        return post
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from forum_old.topics.utils import rebuild_topic_stats
+
+
+class Command(BaseCommand):
+    help = """
+    Recompute old-forum topics' post statistics (first/last/latest post
+    and post count). The old-forum import does this already; this is for
+    when posts have been changed some other way.
+
+    Example usage:
+    python manage.py rebuild_topic_stats
+    """
+
+    def handle(self, *args, **options):
+        rebuild_topic_stats()
+        self.stdout.write("Rebuilt topic stats")
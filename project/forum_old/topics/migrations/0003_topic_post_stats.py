@@ -0,0 +1,57 @@
+# Generated by Django 4.0.10 on 2026-10-18 13:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum_old_posts', '0003_post_edit_time'),
+        ('forum_old_topics', '0002_topic_has_poll_topic_importance_topic_is_news_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='first_post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum_old_posts.post'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum_old_posts.post'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='latest_post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum_old_posts.post'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.IntegerField(default=0),
+        ),
+        # Fill in existing topics' stats.
+        migrations.RunSQL(
+            """
+            UPDATE forum_old_topics_topic AS t SET
+                first_post_id = (
+                    SELECT id FROM forum_old_posts_post WHERE topic_id = t.id
+                    ORDER BY time, id LIMIT 1),
+                last_post_id = (
+                    SELECT id FROM forum_old_posts_post WHERE topic_id = t.id
+                    ORDER BY time DESC, id DESC LIMIT 1),
+                latest_post_id = (
+                    SELECT MAX(id) FROM forum_old_posts_post
+                    WHERE topic_id = t.id),
+                post_count = (
+                    SELECT COUNT(*) FROM forum_old_posts_post
+                    WHERE topic_id = t.id)
+            """,
+            migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['forum', 'importance', 'latest_post'], name='topic_list_idx'),
+        ),
+    ]
@@ -24,17 +24,28 @@ class Topic(models.Model):
 
     forum = models.ForeignKey(Forum, on_delete=models.RESTRICT)
 
+    # Statistics of the topic's posts, precomputed by rebuild_topic_stats()
+    # since the archive is read-only. This way, listing topics doesn't
+    # have to look at the posts.
+    # Earliest and latest post by time.
+    first_post = models.ForeignKey(
+        'forum_old_posts.Post', on_delete=models.SET_NULL, null=True,
+        related_name='+')
+    last_post = models.ForeignKey(
+        'forum_old_posts.Post', on_delete=models.SET_NULL, null=True,
+        related_name='+')
+    # Post with the highest ID, for sorting topics by latest activity.
+    latest_post = models.ForeignKey(
+        'forum_old_posts.Post', on_delete=models.SET_NULL, null=True,
+        related_name='+')
+    post_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Listing a forum's topics in order.
+            models.Index(
+                fields=['forum', 'importance', 'latest_post'],
+                name='topic_list_idx')]
+
     class JSONAPIMeta:
         resource_name = 'old_forum_topics'
-
-    @property
-    def first_post(self):
-        return self.post_set.order_by('time').first()
-
-    @property
-    def last_post(self):
-        return self.post_set.order_by('time').last()
-
-    @property
-    def post_count(self):
-        return self.post_set.count()
@@ -1,3 +1,91 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from ..categories.models import Category
+from ..forums.models import Forum
+from ..posts.models import Post
+from .models import Topic
+from .utils import rebuild_topic_stats
+
+
+def make_time(hour):
+    return datetime.datetime(
+        2005, 1, 1, hour, tzinfo=datetime.timezone.utc)
+
+
+class TopicIndexTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        category = Category(title="General", order=1)
+        category.save()
+        cls.forum = Forum(
+            name="Off-topic", description="", order=1, category=category)
+        cls.forum.save()
+
+        cls.topics = []
+        for index in range(5):
+            topic = Topic(title=f"Topic {index}", forum=cls.forum)
+            topic.save()
+            cls.topics.append(topic)
+        cls.topics[3].importance = Topic.ImportanceLevels.STICKY
+        cls.topics[3].save()
+
+        # Posts in an order that differs from topic order. In topic 0,
+        # the highest post ID doesn't have the latest time.
+        cls.posts = []
+        for topic_index, hour in [
+                (0, 5), (1, 1), (2, 2), (0, 3), (4, 4), (1, 6), (3, 7)]:
+            post = Post(
+                subject="", raw_text="", time=make_time(hour), username="",
+                topic=cls.topics[topic_index])
+            post.save()
+            cls.posts.append(post)
+
+        rebuild_topic_stats()
+
+    def test_stats(self):
+        topic = Topic.objects.get(id=self.topics[0].id)
+        self.assertEqual(topic.post_count, 2)
+        self.assertEqual(topic.first_post_id, self.posts[3].id)
+        self.assertEqual(topic.last_post_id, self.posts[0].id)
+        self.assertEqual(topic.latest_post_id, self.posts[3].id)
+
+    def get_topic_ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [int(t['id']) for t in response.json()['data']]
+
+    def test_order(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                reverse('forum_old_topics:index'),
+                dict(forum_id=self.forum.id))
+        # Count and page, no matter how many topics.
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)
+
+        self.assertListEqual(
+            self.get_topic_ids(response),
+            [self.topics[i].id for i in [3, 1, 4, 0, 2]])
+
+    def test_cursor_pages(self):
+        client = APIClient()
+        response = client.get(
+            reverse('forum_old_topics:index'),
+            {'forum_id': self.forum.id, 'page[size]': 2,
+             'page[cursor]': '', 'page[count]': 'false'})
+        topic_ids = self.get_topic_ids(response)
+        while response.json()['links']['next']:
+            response = client.get(response.json()['links']['next'])
+            topic_ids.extend(self.get_topic_ids(response))
+
+        self.assertListEqual(
+            topic_ids, [self.topics[i].id for i in [3, 1, 4, 0, 2]])
@@ -0,0 +1,29 @@
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from ..posts.models import Post
+from .models import Topic
+
+
+def rebuild_topic_stats(topics: QuerySet = None):
+    """
+    Recompute the post statistics of `topics` (default all topics) in
+    a single UPDATE. Call this after importing posts.
+    """
+    if topics is None:
+        topics = Topic.objects.all()
+
+    posts = Post.objects.filter(topic=OuterRef('pk'))
+    topics.update(
+        first_post=Subquery(
+            posts.order_by('time', 'id').values('id')[:1]),
+        last_post=Subquery(
+            posts.order_by('-time', '-id').values('id')[:1]),
+        latest_post=Subquery(
+            posts.order_by('-id').values('id')[:1]),
+        post_count=Coalesce(
+            Subquery(
+                posts.order_by().values('topic')
+                .annotate(count=Count('id')).values('count')),
+            0),
+    )
@@ -1,13 +1,12 @@
-from django.db.models import Max
 from rest_framework.generics import ListAPIView, RetrieveAPIView
-from rest_framework_json_api.pagination import JsonApiPageNumberPagination
 
+from core.pagination import KeysetPagination
 from core.utils import filter_queryset_by_param
 from .models import Topic
 from .serializers import TopicSerializer
 
 
-class TopicPagination(JsonApiPageNumberPagination):
+class TopicPagination(KeysetPagination):
     # Default page size
     page_size = 50
 
@@ -17,7 +16,8 @@ class TopicIndex(ListAPIView):
     pagination_class = TopicPagination
 
     def get_queryset(self):
-        queryset = Topic.objects.all()
+        # Polls are serialized with each topic.
+        queryset = Topic.objects.select_related('poll')
 
         queryset = filter_queryset_by_param(
             self.request, 'forum_id', queryset, 'forum')
@@ -34,10 +34,8 @@ class TopicIndex(ListAPIView):
 
         # Order criteria:
         # 1. announcements first, then sticky, then others
-        # 2. latest post ID
-        queryset = queryset \
-            .annotate(latest_post=Max('post')) \
-            .order_by('-importance', '-latest_post')
+        # 2. latest post ID (precomputed, see rebuild_topic_stats())
+        queryset = queryset.order_by('-importance', '-latest_post')
         return queryset
 
 
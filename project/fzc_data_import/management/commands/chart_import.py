@@ -3,6 +3,7 @@ import yaml
 
 from charts.models import Chart
 from chart_groups.models import ChartGroup
+from chart_groups.utils import deferred_hierarchy_rebuilds
 from chart_tags.models import ChartTag
 from chart_types.models import ChartType
 from games.models import Game
@@ -115,11 +116,14 @@ class Command(BaseCommand):
         with open('fzc_data_import/data/charts.yaml', 'r') as yaml_file:
             charts_data = yaml.full_load(yaml_file)
 
-        # Add chart groups and charts as necessary
-        for game_name, game_top_level_groups in charts_data.items():
-            game = Game.objects.get(name=game_name)
-            for order, group_spec in enumerate(game_top_level_groups, 1):
-                self.visit_chart_group(group_spec, game, None, order, dict())
+        # Add chart groups and charts as necessary. Each game's hierarchy
+        # is numbered once at the end, rather than after every save.
+        with deferred_hierarchy_rebuilds():
+            for game_name, game_top_level_groups in charts_data.items():
+                game = Game.objects.get(name=game_name)
+                for order, group_spec in enumerate(game_top_level_groups, 1):
+                    self.visit_chart_group(
+                        group_spec, game, None, order, dict())
 
         # Check object counts
 
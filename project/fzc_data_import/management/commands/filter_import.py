@@ -4,6 +4,7 @@ from django.core.management.base import BaseCommand
 from django.db.models import Count
 
 from filters.models import Filter
+from filters.utils import rebuild_filter_implication_index
 from games.models import Game
 
 
@@ -129,6 +130,9 @@ class Command(BaseCommand):
                 ))
         # Bulk-create implications.
         ThroughModel.objects.bulk_create(implications)
+        # Bulk operations skip signals, so update the implication index
+        # explicitly.
+        rebuild_filter_implication_index(game.id)
 
         # Print counts as sanity checks.
 
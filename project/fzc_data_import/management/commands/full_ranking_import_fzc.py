@@ -36,3 +36,5 @@ class Command(BaseCommand):
             'record_player_import_fzc',
             *[options[arg_name] for arg_name in
               ['mysql_host', 'mysql_port', 'mysql_dbname', 'mysql_user']])
+        call_command('rebuild_chart_standings')
+        call_command('rebuild_record_improvements')
@@ -9,7 +9,9 @@ from forum_old.forums.models import Forum
 from forum_old.polls.models import Poll
 from forum_old.poll_options.models import PollOption
 from forum_old.posts.models import Post
+from forum_old.posts.utils import render_post_texts
 from forum_old.topics.models import Topic
+from forum_old.topics.utils import rebuild_topic_stats
 from forum_old.users.models import User
 from ...utils import convert_media_urls, convert_text
 
@@ -194,6 +196,16 @@ class Command(BaseCommand):
 
         Post.objects.bulk_create(posts)
 
+        # Precompute topics' post statistics, now that the posts exist.
+        rebuild_topic_stats()
+        # Expand post includes ahead of time.
+        cycle_post_ids = render_post_texts()
+        if cycle_post_ids:
+            self.stdout.write(
+                "Posts with circular includes (left unexpanded): "
+                + ", ".join(
+                    str(post_id) for post_id in sorted(cycle_post_ids)))
+
         # Get Votes (polls) from phpBB and create in Django.
 
         mysql_cur.execute(
@@ -262,6 +262,9 @@ class Command(BaseCommand):
                     # Don't know how to fix this machine name.
                     unrecognized_ships.add(php_record['ship'])
 
+            # Bulk-creating the record-filter associations won't fill
+            # this in, so do it here.
+            record.filter_ids = sorted(filter_ids)
             record_lookup[record_key] = dict(
                 record=record, filter_ids=filter_ids)
 
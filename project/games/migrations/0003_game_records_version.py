@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0002_game_short_code_alter_game_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='records_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
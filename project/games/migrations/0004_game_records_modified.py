@@ -0,0 +1,19 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_game_records_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='records_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
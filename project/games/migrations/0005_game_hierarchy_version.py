@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_game_records_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='hierarchy_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,9 +1,21 @@
 from django.db import models
+from django.utils import timezone
 
 
 class Game(models.Model):
     name = models.CharField(max_length=200, unique=True)
     short_code = models.CharField(max_length=20, unique=True)
 
+    # Incremented whenever the game's records change. Cached data derived
+    # from records, such as ladder rankings, is keyed on this.
+    records_version = models.IntegerField(default=0)
+    # When records_version was last incremented. Used as the
+    # Last-Modified time of API responses derived from the game's data.
+    records_modified = models.DateTimeField(default=timezone.now)
+
+    # Incremented whenever the game's chart groups or charts change.
+    # The cached chart hierarchy is keyed on this.
+    hierarchy_version = models.IntegerField(default=0)
+
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
@@ -8,4 +8,6 @@ from .models import Game
 class GameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Game
-        exclude = ['date_created', 'date_modified']
+        exclude = [
+            'date_created', 'date_modified',
+            'records_version', 'records_modified', 'hierarchy_version']
@@ -0,0 +1,58 @@
+from typing import Callable
+
+from django.db.models import F, Model
+from django.utils import timezone
+
+
+def bump_records_version(games):
+    """
+    Increment the records version of the given games (a Game queryset), so
+    that cached data derived from their records is no longer used.
+    """
+    games.update(
+        records_version=F('records_version') + 1,
+        records_modified=timezone.now())
+
+
+def bump_hierarchy_version(games):
+    """
+    Increment the hierarchy version of the given games (a Game queryset),
+    so that their cached chart hierarchies are no longer used.
+    """
+    games.update(hierarchy_version=F('hierarchy_version') + 1)
+
+
+def get_object_validators_func(
+        model: type[Model], lookup_url_kwarg: str,
+        game_path: str = None) -> Callable:
+    """
+    Make a function getting conditional GET validators (see
+    core.utils.conditional_get) for a view of a single object, with one
+    small query.
+    The validators are based on the object's date_modified. If game_path
+    is given (the lookup path from the model to its game, like
+    'chart_group__game'), the game's records version is used as well.
+    That version is bumped when the game's records, charts, filters, and
+    so on change, so it covers related data which doesn't update the
+    object's own date_modified.
+    """
+    fields = ['date_modified']
+    if game_path:
+        fields += [
+            f'{game_path}__records_version', f'{game_path}__records_modified']
+
+    def get_validators(request, **kwargs):
+        row = model.objects.filter(pk=kwargs[lookup_url_kwarg]) \
+            .values_list(*fields).first()
+        if row is None:
+            # Let the view respond with a 404.
+            return None, None
+        if game_path:
+            date_modified, records_version, records_modified = row
+            return (
+                [records_version, date_modified.timestamp()],
+                max(date_modified, records_modified))
+        date_modified, = row
+        return [date_modified.timestamp()], date_modified
+
+    return get_validators
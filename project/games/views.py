@@ -1,8 +1,9 @@
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 
-from core.utils import filter_queryset_by_param
+from core.utils import conditional_get, filter_queryset_by_param
 from .models import Game
 from .serializers import GameSerializer
+from .utils import get_object_validators_func
 
 
 class GameIndex(ListAPIView):
@@ -19,6 +20,10 @@ class GameIndex(ListAPIView):
         return queryset
 
 
+get_game_validators = get_object_validators_func(Game, 'game_id')
+
+
+@conditional_get(get_game_validators)
 class GameDetail(RetrieveAPIView):
 
     def get_queryset(self):
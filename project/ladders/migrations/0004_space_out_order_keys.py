@@ -0,0 +1,38 @@
+# Generated by Django 4.0.10 on 2026-10-18 16:02
+
+from django.db import migrations
+
+# core.utils.ORDER_KEY_GAP at the time of this migration.
+ORDER_KEY_GAP = 1024
+
+
+def renumber_order_keys(apps, gap):
+    Ladder = apps.get_model('ladders', 'Ladder')
+    ladders = list(Ladder.objects.order_by(
+        'game_id', 'kind', 'order_in_game_and_kind', 'id'))
+    group, position = None, 0
+    for ladder in ladders:
+        if (ladder.game_id, ladder.kind) != group:
+            group, position = (ladder.game_id, ladder.kind), 0
+        position += 1
+        ladder.order_in_game_and_kind = position * gap
+    Ladder.objects.bulk_update(ladders, ['order_in_game_and_kind'])
+
+
+def space_out_order_keys(apps, schema_editor):
+    renumber_order_keys(apps, ORDER_KEY_GAP)
+
+
+def pack_order_keys(apps, schema_editor):
+    renumber_order_keys(apps, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ladders', '0003_alter_laddercharttag_chart_tag_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(space_out_order_keys, pack_order_keys),
+    ]
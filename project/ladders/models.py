@@ -22,8 +22,9 @@ class Ladder(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     # Charts that are available under this ladder.
     chart_group = models.ForeignKey(ChartGroup, on_delete=models.CASCADE)
-    # Positive integer specifying order of this ladder relative to
-    # others with the same game and kind.
+    # Order key of this ladder relative to others with the same game and
+    # kind. Keys are spaced out (see core.utils.ORDER_KEY_GAP); the API
+    # shows positions instead.
     order_in_game_and_kind = models.IntegerField()
 
     date_created = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,178 @@
+from decimal import Decimal
+
+import numpy as np
+
+
+def _to_scaled_ints(decimals: list[Decimal]) -> tuple[np.ndarray, int]:
+    """
+    Convert decimals to integers scaled by a common power of 10, so that
+    arithmetic on them is exact. For example, [1, 0.5, 0.125] becomes
+    [1000, 500, 125] with a scale of 1000.
+    """
+    decimal_places = max(
+        [-d.as_tuple().exponent for d in decimals] + [0])
+    scale = 10 ** decimal_places
+    return np.array([int(d * scale) for d in decimals], dtype=np.int64), scale
+
+
+def _divide_decimal(numerator: int, denominator: int) -> Decimal:
+    return Decimal(int(numerator)) / Decimal(int(denominator))
+
+
+# Elementwise version of _divide_decimal() for integer arrays, giving an
+# object array of Decimals.
+_divide_decimals = np.frompyfunc(_divide_decimal, 2, 1)
+
+
+class LadderScoringEngine:
+    """
+    Computes ladder scores (AF, SRPR, and chart tag totals) for all of a
+    ladder's players at once.
+
+    Players' records are held in dense players x charts arrays, with a mask
+    of which cells actually have a record. Each score is then a whole-array
+    operation rather than a loop over players and charts.
+    """
+
+    def __init__(self, player_ids: list[int], charts: list[dict]):
+        """
+        :param player_ids: The ladder's players. Each gets an array row.
+        :param charts: The ladder's charts, in order. Each gets an array
+            column. Each chart is a dict with the following keys:
+            weight - Relative weight of the chart in AF and SRPR.
+            order_ascending - Whether lower values are better.
+            tag_ids - IDs of chart tags which have totals for this ladder.
+        """
+        self.player_ids = list(player_ids)
+        self.player_indices = {
+            player_id: index for index, player_id
+            in enumerate(self.player_ids)}
+
+        shape = (len(self.player_ids), len(charts))
+        self.ranks = np.zeros(shape, dtype=np.int64)
+        self.values = np.zeros(shape, dtype=np.int64)
+        self.has_record = np.zeros(shape, dtype=bool)
+
+        self.decimal_weights = np.array(
+            [Decimal(chart['weight']) for chart in charts], dtype=object)
+        self.weights, self.weight_scale = _to_scaled_ints(
+            list(self.decimal_weights))
+        self.order_ascending = np.array(
+            [chart['order_ascending'] for chart in charts], dtype=bool)
+
+        # Tags, ordered by first appearance among the charts. Each tag has
+        # a row in the membership matrix, indicating which charts count
+        # toward the tag's total.
+        self.tag_ids = []
+        for chart in charts:
+            for tag_id in sorted(chart['tag_ids']):
+                if tag_id not in self.tag_ids:
+                    self.tag_ids.append(tag_id)
+        self.tag_membership = np.zeros(
+            (len(self.tag_ids), len(charts)), dtype=bool)
+        for chart_index, chart in enumerate(charts):
+            for tag_id in chart['tag_ids']:
+                tag_index = self.tag_ids.index(tag_id)
+                self.tag_membership[tag_index, chart_index] = True
+
+    def set_chart_records(self, chart_index: int, records: list[dict]):
+        """
+        Fill in a chart's column from its ranked records, which are dicts
+        with player_id, rank, and value keys.
+        """
+        rows = np.array(
+            [self.player_indices[r['player_id']] for r in records],
+            dtype=np.intp)
+        self.ranks[rows, chart_index] = [r['rank'] for r in records]
+        self.values[rows, chart_index] = [r['value'] for r in records]
+        self.has_record[rows, chart_index] = True
+
+    @property
+    def record_counts(self) -> np.ndarray:
+        """Number of ranked players on each chart."""
+        return self.has_record.sum(axis=0)
+
+    @property
+    def sr_values(self) -> np.ndarray:
+        """
+        Site record (best value) of each chart. Charts without records get
+        a placeholder of 1, which is never used in a score.
+        """
+        int_info = np.iinfo(np.int64)
+        lowest = np.where(self.has_record, self.values, int_info.max) \
+            .min(axis=0, initial=int_info.max)
+        highest = np.where(self.has_record, self.values, int_info.min) \
+            .max(axis=0, initial=int_info.min)
+        sr_values = np.where(self.order_ascending, lowest, highest)
+        return np.where(self.record_counts > 0, sr_values, 1)
+
+    def compute_af(self) -> list[Decimal]:
+        """
+        Average finish: each player's weighted average rank. A chart where
+        the player has no record counts as last rank + 1. With no chart
+        weight at all, there's no average, so everyone gets 0.
+        """
+        weight_total = Decimal(int(self.weights.sum()))
+        if weight_total == 0:
+            return [Decimal(0)] * len(self.player_ids)
+
+        effective_ranks = np.where(
+            self.has_record, self.ranks, self.record_counts + 1)
+        # Weights are scaled integers, so this sum is exact.
+        weighted_rank_sums = effective_ranks @ self.weights
+        return [
+            Decimal(int(weighted_rank_sum)) / weight_total
+            for weighted_rank_sum in weighted_rank_sums]
+
+    def compute_srpr(self) -> list[Decimal]:
+        """
+        Site record percentage ratio: each player's weighted average of
+        (SR / record value) for ascending charts, or (record value / SR)
+        for descending charts, as a percentage. A chart where the player
+        has no record counts as 0. With no chart weight at all, there's no
+        average, so everyone gets 0.
+
+        Each ratio is a Decimal division, and the sums and final division
+        are in Decimal too, so the results are the same as computing each
+        player's SRPR record by record in Decimal.
+        """
+        weight_total = sum(self.decimal_weights, Decimal(0))
+        if weight_total == 0:
+            return [Decimal(0)] * len(self.player_ids)
+
+        rows, columns = np.nonzero(self.has_record)
+        values = self.values[rows, columns]
+        sr_values = self.sr_values[columns]
+        ascending = self.order_ascending[columns]
+        ratios = np.zeros(self.has_record.shape, dtype=object)
+        ratios[rows, columns] = _divide_decimals(
+            np.where(ascending, sr_values, values),
+            np.where(ascending, values, sr_values))
+
+        weighted_ratio_sums = ratios @ self.decimal_weights
+        return [
+            Decimal(100) * weighted_ratio_sum / weight_total
+            for weighted_ratio_sum in weighted_ratio_sums]
+
+    def compute_totals(self) -> list[list[int | None]]:
+        """
+        Each player's total value for each tag, in the order of
+        self.tag_ids. For ascending tags (e.g. times), a missing record
+        invalidates the total, giving None. For descending tags (e.g.
+        scores), missing records count as 0.
+        """
+        values = np.where(self.has_record, self.values, 0)
+        totals = values @ self.tag_membership.T.astype(np.int64)
+        missing_counts = (~self.has_record).astype(np.int64) \
+            @ self.tag_membership.T.astype(np.int64)
+
+        # A tag's order is that of its (last) chart.
+        tag_ascending = np.array([
+            self.order_ascending[np.flatnonzero(membership)[-1]]
+            for membership in self.tag_membership], dtype=bool)
+        invalid = (missing_counts > 0) & tag_ascending
+
+        return [
+            [None if is_invalid else int(total)
+             for total, is_invalid in zip(player_totals, player_invalid)]
+            for player_totals, player_invalid in zip(totals, invalid)]
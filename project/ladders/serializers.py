@@ -2,6 +2,7 @@ from rest_framework_json_api import serializers
 
 from chart_groups.serializers_nested import ChartGroupIncludeSerializer
 from chart_tags.serializers import ChartTagSerializer
+from core.serializers import OrderPositionField
 from games.serializers import GameSerializer
 from .models import Ladder, LadderChartTag
 
@@ -19,6 +20,9 @@ class LadderChartTagSerializer(serializers.ModelSerializer):
 
 
 class LadderSerializer(serializers.ModelSerializer):
+    order_in_game_and_kind = OrderPositionField(
+        group_field_names=['game', 'kind'])
+
     included_serializers = {
         'chart_group': ChartGroupIncludeSerializer,
         'game': GameSerializer,
@@ -1,3 +1,523 @@
-from django.test import TestCase
+import datetime
+import json
+from decimal import Decimal
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APITestCase
+
+from charts.models import Chart
+from chart_groups.models import ChartGroup
+from chart_tags.models import ChartTag
+from chart_types.models import ChartType
+from core.tests.utils import QueryCountMixin
+from core.utils import (
+    apply_ordering, get_order_key_for_position, ORDER_KEY_GAP)
+from games.models import Game
+from players.models import Player
+from records.models import Record
+from .models import Ladder, LadderChartTag
+from .scoring import LadderScoringEngine
+
+
+def make_date(day):
+    return datetime.datetime(2022, 1, day, tzinfo=datetime.timezone.utc)
+
+
+class ScoringEngineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.scoring = LadderScoringEngine(
+            [1, 2],
+            [
+                dict(weight=1, order_ascending=True, tag_ids={10}),
+                dict(weight=Decimal('0.5'), order_ascending=False,
+                     tag_ids={20}),
+            ])
+        self.scoring.set_chart_records(0, [
+            dict(player_id=2, rank=1, value=90),
+            dict(player_id=1, rank=2, value=100),
+        ])
+        self.scoring.set_chart_records(1, [
+            dict(player_id=1, rank=1, value=400),
+        ])
+
+    def test_af(self):
+        # Player 2 has no record on chart 2, so they get last rank + 1.
+        self.assertListEqual(
+            self.scoring.compute_af(),
+            [Decimal('2.5') / Decimal('1.5'), Decimal(2) / Decimal('1.5')])
+
+    def test_srpr(self):
+        # Player 1: 90/100 on chart 1, 400/400 on chart 2.
+        # Player 2: 90/90 on chart 1, no record on chart 2.
+        self.assertListEqual(
+            self.scoring.compute_srpr(),
+            [Decimal(100) * (Decimal('0.9') + Decimal('0.5'))
+             / Decimal('1.5'),
+             Decimal(100) / Decimal('1.5')])
+
+    def test_srpr_matches_per_record_decimal(self):
+        charts = [
+            dict(weight=Decimal('1.25'), order_ascending=True, tag_ids={}),
+            dict(weight=Decimal('0.3'), order_ascending=False, tag_ids={}),
+            dict(weight=2, order_ascending=True, tag_ids={}),
+        ]
+        chart_values = [
+            {1: 71234, 2: 70999, 3: 83001},
+            {1: 12345678, 3: 9876543},
+            {2: 7, 3: 3},
+        ]
+        scoring = LadderScoringEngine([1, 2, 3], charts)
+        for chart_index, values in enumerate(chart_values):
+            scoring.set_chart_records(chart_index, [
+                dict(player_id=player_id, rank=1, value=value)
+                for player_id, value in values.items()])
+
+        expected = []
+        for player_id in [1, 2, 3]:
+            weighted_srprs = []
+            for chart, values in zip(charts, chart_values):
+                if player_id not in values:
+                    chart_srpr = 0
+                elif chart['order_ascending']:
+                    chart_srpr = (
+                        Decimal(min(values.values()))
+                        / Decimal(values[player_id]))
+                else:
+                    chart_srpr = (
+                        Decimal(values[player_id])
+                        / Decimal(max(values.values())))
+                weighted_srprs.append(chart['weight'] * chart_srpr)
+            expected.append(
+                Decimal(100) * sum(weighted_srprs)
+                / Decimal(sum(chart['weight'] for chart in charts)))
+        self.assertListEqual(scoring.compute_srpr(), expected)
+
+    def test_zero_weight_total(self):
+        scoring = LadderScoringEngine(
+            [1], [dict(weight=0, order_ascending=True, tag_ids={})])
+        scoring.set_chart_records(0, [dict(player_id=1, rank=1, value=5)])
+        self.assertListEqual(scoring.compute_af(), [Decimal(0)])
+        self.assertListEqual(scoring.compute_srpr(), [Decimal(0)])
+
+    def test_totals(self):
+        self.assertListEqual(self.scoring.tag_ids, [10, 20])
+        # Missing record counts as 0 for a descending tag.
+        self.assertListEqual(
+            self.scoring.compute_totals(), [[100, 400], [90, 0]])
+
+    def test_chart_without_records(self):
+        scoring = LadderScoringEngine(
+            [1], [dict(weight=1, order_ascending=True, tag_ids={10})])
+        self.assertListEqual(scoring.compute_af(), [Decimal(1)])
+        self.assertListEqual(scoring.compute_srpr(), [Decimal(0)])
+        # Missing record invalidates an ascending tag's total.
+        self.assertListEqual(scoring.compute_totals(), [[None]])
+
+
+class IndexTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero", short_code='snes')
+        game.save()
+        ct = ChartType(
+            name="Time", game=game, order_ascending=True, format_spec=[])
+        ct.save()
+        cg_root = ChartGroup(name="Root", order_in_parent=1, game=game)
+        cg_root.save()
+        cg_kl = ChartGroup(
+            name="Knight League", order_in_parent=1, game=game,
+            parent_group=cg_root)
+        cg_kl.save()
+        cg_mc1 = ChartGroup(
+            name="Mute City I", order_in_parent=1, game=game,
+            parent_group=cg_kl)
+        cg_mc1.save()
+        cg_ql = ChartGroup(
+            name="Queen League", order_in_parent=2, game=game,
+            parent_group=cg_root)
+        cg_ql.save()
+        cls.chart = Chart(
+            name="Course", order_in_group=1, chart_group=cg_mc1,
+            chart_type=ct)
+        cls.chart.save()
+
+        cls.ladders = []
+        for order, chart_group in enumerate(
+                [cg_root, cg_kl, cg_ql, cg_mc1], 1):
+            ladder = Ladder(
+                name=chart_group.name, game=game, chart_group=chart_group,
+                order_in_game_and_kind=order)
+            ladder.save()
+            cls.ladders.append(ladder)
+
+    def test_filter_by_chart(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(
+                reverse('ladders:index'), dict(chart_id=self.chart.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            [int(ladder['id']) for ladder in response.json()['data']],
+            [self.ladders[0].id, self.ladders[1].id, self.ladders[3].id])
+        # The chart's ancestors are found within the ladder query, rather
+        # than by walking up the chart groups.
+        self.assertFalse([
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT "chart_groups_chartgroup"')
+            or q['sql'].startswith('SELECT "charts_chart"')])
+
+
+class ReorderTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="F-Zero", short_code='snes')
+        cls.game.save()
+        cg = ChartGroup(name="Root", order_in_parent=1, game=cls.game)
+        cg.save()
+        cls.ladders = []
+        for order in [1, 2, 3, 4]:
+            ladder = Ladder(
+                name=f"L{order}", game=cls.game, chart_group=cg,
+                order_in_game_and_kind=order * ORDER_KEY_GAP)
+            ladder.save()
+            cls.ladders.append(ladder)
+
+    def reorder(self, ladders):
+        apply_ordering(
+            'order_in_game_and_kind', Ladder.objects.filter(game=self.game),
+            [ladder.id for ladder in ladders])
+
+    def get_names(self):
+        return list(
+            Ladder.objects.order_by('order_in_game_and_kind')
+            .values_list('name', flat=True))
+
+    def test_reorder(self):
+        l1, l2, l3, l4 = self.ladders
+        with CaptureQueriesContext(connection) as context:
+            self.reorder([l4, l2, l1, l3])
+        self.assertListEqual(self.get_names(), ["L4", "L2", "L1", "L3"])
+        # One statement updates the ladders whose order changed. The
+        # deferred uniqueness constraint allows swapping orders within it.
+        updates = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+
+    def get_authenticated_client(self):
+        client = APIClient()
+        # There's no user model yet; any authenticated user may write.
+        client.force_authenticate(user=SimpleNamespace(is_authenticated=True))
+        return client
+
+    def test_move(self):
+        l1, l2, l3, l4 = self.ladders
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_authenticated_client().patch(
+                reverse('ladders:detail', args=[l4.id]),
+                json.dumps(dict(data=dict(
+                    type='ladders', id=str(l4.id),
+                    attributes={'order-in-game-and-kind': 2}))),
+                content_type='application/vnd.api+json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order_in_game_and_kind'], 2)
+        self.assertListEqual(self.get_names(), ["L1", "L4", "L2", "L3"])
+        # Only the moved ladder is written.
+        ladder_updates = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('UPDATE "ladders_ladder"')]
+        self.assertEqual(len(ladder_updates), 1)
+
+    def test_positions(self):
+        l1, l2, l3, l4 = self.ladders
+        self.reorder([l3, l1, l4, l2])
+        response = APIClient().get(
+            reverse('ladders:index'), dict(game_id=self.game.id))
+        self.assertListEqual(
+            [(ladder['name'], ladder['order_in_game_and_kind'])
+             for ladder in response.data['results']],
+            [("L3", 1), ("L1", 2), ("L4", 3), ("L2", 4)])
+
+    def test_key_between_neighbors(self):
+        all_ladders = Ladder.objects.filter(game=self.game)
+        for position, key in [
+                (0, ORDER_KEY_GAP // 2), (1, ORDER_KEY_GAP // 2),
+                (2, ORDER_KEY_GAP * 3 // 2), (5, ORDER_KEY_GAP * 5),
+                (None, ORDER_KEY_GAP * 5), (9, ORDER_KEY_GAP * 5)]:
+            self.assertEqual(
+                get_order_key_for_position(
+                    'order_in_game_and_kind', all_ladders, position),
+                key)
+
+    def test_renumber_when_no_key_left(self):
+        l1, l2, l3, l4 = self.ladders
+        Ladder.objects.filter(id=l2.id).update(
+            order_in_game_and_kind=ORDER_KEY_GAP + 1)
+        key = get_order_key_for_position(
+            'order_in_game_and_kind',
+            Ladder.objects.filter(game=self.game).exclude(id=l4.id), 2)
+        self.assertEqual(key, ORDER_KEY_GAP * 3 // 2)
+        self.assertListEqual(
+            list(Ladder.objects.exclude(id=l4.id)
+                 .order_by('order_in_game_and_kind')
+                 .values_list('order_in_game_and_kind', flat=True)),
+            [ORDER_KEY_GAP, ORDER_KEY_GAP * 2, ORDER_KEY_GAP * 3])
+
+    def test_incomplete_ordering(self):
+        l1, l2, l3, l4 = self.ladders
+        with self.assertRaises(ValidationError):
+            self.reorder([l2, l1, l3])
+        with self.assertRaises(ValidationError):
+            self.reorder([l2, l1, l3, l4, l1])
+        self.assertListEqual(self.get_names(), ["L1", "L2", "L3", "L4"])
+
+    def post_reorder(self, ladder_ids):
+        return self.get_authenticated_client().post(
+            reverse('ladders:reorder'),
+            json.dumps(dict(data=[
+                dict(type='ladders', id=str(ladder_id))
+                for ladder_id in ladder_ids])),
+            content_type='application/vnd.api+json')
+
+    def test_endpoint(self):
+        l1, l2, l3, l4 = self.ladders
+        response = self.post_reorder([l3.id, l1.id, l4.id, l2.id])
+        self.assertEqual(response.status_code, 204)
+        self.assertListEqual(self.get_names(), ["L3", "L1", "L4", "L2"])
+
+    def test_endpoint_unknown_id(self):
+        l1, l2, l3, l4 = self.ladders
+        missing_id = max(ladder.id for ladder in self.ladders) + 1
+        response = self.post_reorder([missing_id, l1.id, l2.id, l3.id])
+        self.assertEqual(response.status_code, 400)
+        self.assertListEqual(self.get_names(), ["L1", "L2", "L3", "L4"])
+
+    def test_endpoint_requires_authentication(self):
+        response = APIClient().post(
+            reverse('ladders:reorder'),
+            dict(data=[
+                dict(type='ladders', id=str(ladder.id))
+                for ladder in self.ladders]))
+        self.assertEqual(response.status_code, 403)
+
+
+class RankingTest(QueryCountMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero", short_code='snes')
+        game.save()
+        ct_time = ChartType(
+            name="Time", game=game, order_ascending=True,
+            format_spec=[dict(multiplier=100, suffix="."), dict(digits=2)])
+        ct_time.save()
+        ct_speed = ChartType(
+            name="Speed", game=game, order_ascending=False,
+            format_spec=[dict(suffix=" km/h")])
+        ct_speed.save()
+        cg_root = ChartGroup(name="Root", order_in_parent=1, game=game)
+        cg_root.save()
+        cg_mc1 = ChartGroup(
+            name="Mute City I", order_in_parent=1, game=game,
+            parent_group=cg_root)
+        cg_mc1.save()
+        cg_bb = ChartGroup(
+            name="Big Blue", order_in_parent=2, game=game,
+            parent_group=cg_root)
+        cg_bb.save()
+        c1 = Chart(
+            name="Course", order_in_group=1, chart_group=cg_mc1,
+            chart_type=ct_time)
+        c1.save()
+        c3 = Chart(
+            name="Speed", order_in_group=2, chart_group=cg_mc1,
+            chart_type=ct_speed)
+        c3.save()
+        c2 = Chart(
+            name="Course", order_in_group=1, chart_group=cg_bb,
+            chart_type=ct_time)
+        c2.save()
+
+        tag_course = ChartTag(
+            name="Course", game=game, primary_chart_type=ct_time)
+        tag_course.save()
+        tag_course.charts.add(c1, c2)
+        tag_speed = ChartTag(
+            name="Speed", game=game, primary_chart_type=ct_speed)
+        tag_speed.save()
+        tag_speed.charts.add(c3)
+
+        cls.c1 = c1
+        cls.cg_bb = cg_bb
+        cls.tag_course = tag_course
+        cls.ct_time = ct_time
+
+        cls.ladder = Ladder(
+            name="Main", game=game, chart_group=cg_root,
+            order_in_game_and_kind=1)
+        cls.ladder.save()
+        LadderChartTag(ladder=cls.ladder, chart_tag=tag_course).save()
+        LadderChartTag(
+            ladder=cls.ladder, chart_tag=tag_speed,
+            weight=Decimal('0.5')).save()
+
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+        cls.p3 = Player(username="P3")
+        cls.p3.save()
+
+        for chart, player, value, day in [
+                (c1, cls.p1, 100, 1), (c1, cls.p2, 110, 2),
+                (c1, cls.p3, 100, 3), (c1, cls.p2, 120, 1),
+                (c2, cls.p1, 50, 4), (c2, cls.p2, 40, 5),
+                (c3, cls.p1, 300, 6), (c3, cls.p3, 350, 7)]:
+            Record(
+                chart=chart, player=player, value=value,
+                date_achieved=make_date(day)).save()
+
+    def setUp(self):
+        # Test data is rolled back between tests, and records versions
+        # along with it, so cached rankings can't be trusted.
+        cache.clear()
+
+    def test(self):
+        client = APIClient()
+        response = client.get(
+            reverse('ladders:ranking', args=[self.ladder.id]))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertListEqual(
+            [(e['player_username'], e['rank'], e['af_display'],
+              e['srpr_display'], e['last_active_display'])
+             for e in response.data],
+            [("P1", 1, "1.600", "89.143%", "2022-01-06"),
+             ("P3", 2, "1.800", "60.000%", "2022-01-07"),
+             ("P2", 3, "2.200", "76.364%", "2022-01-05")])
+
+        self.assertListEqual(
+            [e['totals'] for e in response.data],
+            [[dict(name="Course total", value="1.50"),
+              dict(name="Speed total", value="300 km/h")],
+             [dict(name="Course total", value=None),
+              dict(name="Speed total", value="350 km/h")],
+             [dict(name="Course total", value="1.50"),
+              dict(name="Speed total", value="0 km/h")]])
+
+    def test_query_count_independent_of_chart_count(self):
+        client = APIClient()
+        url = reverse('ladders:ranking', args=[self.ladder.id])
+
+        def add_chart():
+            chart = Chart(
+                name="Lap", order_in_group=2, chart_group=self.cg_bb,
+                chart_type=self.ct_time)
+            chart.save()
+            Record(
+                chart=chart, player=self.p1, value=20,
+                date_achieved=make_date(8)).save()
+
+        response = self.assertQueryCountIndependentOfChartCount(
+            lambda: client.get(url), add_chart)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_invalidated_by_record_change(self):
+        client = APIClient()
+        url = reverse('ladders:ranking', args=[self.ladder.id])
+        response = client.get(url)
+        self.assertListEqual(
+            [e['player_username'] for e in response.data], ["P1", "P3", "P2"])
+
+        # Served from the cache.
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        # Just the HTTP validators lookup and the ladder lookup.
+        self.assertEqual(len(selects), 2)
+
+        # P2 takes first place on chart 1.
+        Record(
+            chart=self.c1, player=self.p2, value=90,
+            date_achieved=make_date(9)).save()
+        response = client.get(url)
+        self.assertListEqual(
+            [e['player_username'] for e in response.data], ["P2", "P1", "P3"])
+
+    def test_cache_invalidated_by_chart_tag_change(self):
+        client = APIClient()
+        url = reverse('ladders:ranking', args=[self.ladder.id])
+        client.get(url)
+
+        self.tag_course.total_name = "Course sum"
+        self.tag_course.save()
+        response = client.get(url)
+        self.assertEqual(response.data[0]['totals'][0]['name'], "Course sum")
+
+    def test_ladder_change_invalidates_chart_ranking(self):
+        client = APIClient()
+        url = reverse('charts:ranking', args=[self.c1.id])
+        params = dict(ladder_id=self.ladder.id)
+        etag = client.get(url, params).headers['ETag']
+        response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.ladder.name = "Main 2"
+        self.ladder.save()
+        response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        client = APIClient()
+        url = reverse('ladders:ranking', args=[self.ladder.id])
+        response = client.get(url)
+        etag = response.headers['ETag']
+        self.assertIn('Last-Modified', response.headers)
+
+        # Not modified: the ranking isn't computed or even read from the
+        # cache.
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        selects = [
+            q for q in context.captured_queries
+            if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+
+        Record(
+            chart=self.c1, player=self.p2, value=90,
+            date_achieved=make_date(9)).save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        # A ladder edit also changes the ETag.
+        etag = response.headers['ETag']
+        self.ladder.name = "Main ladder"
+        self.ladder.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_stream(self):
+        client = APIClient()
+        url = reverse('ladders:ranking', args=[self.ladder.id])
+        response = client.get(url)
+        streamed_response = client.get(url, dict(stream='true'))
+        self.assertTrue(streamed_response.streaming)
+        self.assertEqual(
+            json.loads(b''.join(streamed_response.streaming_content)),
+            json.loads(response.content))
@@ -6,6 +6,7 @@ app_name = 'ladders'
 
 urlpatterns = [
     path('', views.LadderIndex.as_view(), name="index"),
+    path('reorder/', views.LadderReorder.as_view(), name="reorder"),
     path('<int:ladder_id>/', views.LadderDetail.as_view(), name="detail"),
 
     path(
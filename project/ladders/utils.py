@@ -0,0 +1,170 @@
+from collections import defaultdict
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models import F, Max, Q, QuerySet
+
+from chart_groups.utils import get_charts_in_hierarchy
+from chart_types.utils import get_format_spec_renderer
+from charts.models import Chart
+from core.utils import add_ranks
+from filters.utils import FilterSpec, project_filter_spec
+from records.models import Record
+from records.utils import rank_best_records_per_chart
+from .models import Ladder, LadderChartTag
+from .scoring import LadderScoringEngine
+
+
+def get_ladder_records(
+        charts: list[Chart], filter_spec: FilterSpec) -> QuerySet:
+    """
+    All records of the given charts which match the ladder's filter spec.
+    """
+    if filter_spec.is_empty():
+        return Record.objects.filter(chart__in=charts)
+
+    # Apply the filter spec to the records. Also ensure we only apply
+    # the filters that each chart type recognizes. The projected
+    # predicates are cached, so this is one lookup per chart type.
+    chart_types = set([chart.chart_type for chart in charts])
+    predicate = Q()
+    for chart_type in chart_types:
+        _, ct_predicate = project_filter_spec(filter_spec, chart_type)
+        predicate |= Q(chart__chart_type=chart_type) & ct_predicate
+
+    return Record.objects.filter(predicate, chart__in=charts)
+
+
+def get_chart_weight(
+        chart_tag_ids: set[int],
+        ladder_chart_tags: list[LadderChartTag]) -> int:
+    if not ladder_chart_tags:
+        # No ladder formula; all charts are weighted 1.
+        return 1
+    if not chart_tag_ids:
+        # Chart is not counted in the ladder formula.
+        return 0
+    # Chart is counted in the ladder formula. Check all the
+    # applicable chart tags; lowest weight wins.
+    return min([
+        lc_tag.weight for lc_tag in ladder_chart_tags
+        if lc_tag.chart_tag_id in chart_tag_ids])
+
+
+def get_ladder_ranking(ladder: Ladder) -> list[dict]:
+    """
+    Compute the ladder's player ranking. The number of queries doesn't
+    depend on the number of charts or players in the ladder.
+    """
+    charts = list(
+        get_charts_in_hierarchy(ladder.chart_group)
+        .select_related('chart_type')
+        .prefetch_related('chart_tags'))
+    ladder_chart_tags = list(
+        LadderChartTag.objects.filter(ladder=ladder)
+        .select_related('chart_tag__primary_chart_type'))
+    ladder_tag_ids = set([lc_tag.chart_tag_id for lc_tag in ladder_chart_tags])
+    filter_spec = FilterSpec(ladder.filter_spec)
+
+    all_records = get_ladder_records(charts, filter_spec)
+
+    # All the players in the ladder, with their info.
+
+    players = all_records \
+        .values('player_id') \
+        .annotate(
+            username=F('player__username'),
+            last_active=Max('date_achieved')) \
+        .order_by('player_id')
+    players_data = {p['player_id']: p for p in players}
+
+    # Best record per player per chart, ranked, in one query.
+
+    charts_records = defaultdict(list)
+    for r in rank_best_records_per_chart(all_records).values(
+            'chart_id', 'player_id', 'value', 'rank'):
+        charts_records[r['chart_id']].append(r)
+
+    charts_data = []
+    for chart in charts:
+        # Tags applying to this chart for this ladder.
+        applicable_tag_ids = (
+            set([tag.id for tag in chart.chart_tags.all()]) & ladder_tag_ids)
+        charts_data.append(dict(
+            tag_ids=applicable_tag_ids,
+            weight=get_chart_weight(applicable_tag_ids, ladder_chart_tags),
+            order_ascending=chart.chart_type.order_ascending,
+        ))
+
+    scoring = LadderScoringEngine(players_data.keys(), charts_data)
+    for chart_index, chart in enumerate(charts):
+        scoring.set_chart_records(chart_index, charts_records[chart.id])
+
+    afs = scoring.compute_af()
+    srprs = scoring.compute_srpr()
+    players_totals = scoring.compute_totals()
+
+    chart_tags_lookup = {
+        lc_tag.chart_tag_id: lc_tag.chart_tag
+        for lc_tag in ladder_chart_tags}
+    tags = [chart_tags_lookup[tag_id] for tag_id in scoring.tag_ids]
+    tag_renderers = [
+        get_format_spec_renderer(tag.primary_chart_type) for tag in tags]
+
+    entries = []
+
+    for player_id, af, srpr, totals in zip(
+            scoring.player_ids, afs, srprs, players_totals):
+
+        last_active = players_data[player_id]['last_active']
+
+        entry = dict(
+            player_id=player_id,
+            player_username=players_data[player_id]['username'],
+            af=af,
+            # To 3 decimal places, like 4.560
+            af_display=format(af, '.3f'),
+            srpr=srpr,
+            # To 3 decimal places, like 93.450%
+            srpr_display=f"{srpr:.3f}%",
+            last_active=last_active,
+            last_active_display=last_active.date().isoformat(),
+            totals=[],
+        )
+
+        # Format the totals.
+        for tag, renderer, total in zip(tags, tag_renderers, totals):
+            if total is None:
+                total_value = None
+            else:
+                total_value = renderer.render(total)
+            entry['totals'].append(dict(
+                name=tag.total_name, value=total_value))
+
+        entries.append(entry)
+
+    entries.sort(key=itemgetter('af'))
+    add_ranks(entries, 'af')
+
+    return entries
+
+
+def get_cached_ladder_ranking(ladder: Ladder) -> list[dict]:
+    """
+    Get the ladder's ranking from the cache, computing it if needed.
+    The cache key includes the game's records version, which is bumped
+    whenever records (or other ranking inputs) change, so an outdated
+    ranking is never served. It's just recomputed on the next request.
+    """
+    cache_key = ':'.join([
+        'ladder_ranking',
+        str(ladder.id),
+        str(ladder.game.records_version),
+        # Ladder edits, such as changing the filter spec.
+        str(ladder.date_modified.timestamp()),
+    ])
+    ranking = cache.get(cache_key)
+    if ranking is None:
+        ranking = get_ladder_ranking(ladder)
+        cache.set(cache_key, ranking, timeout=None)
+    return ranking
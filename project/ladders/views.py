@@ -1,29 +1,29 @@
-from __future__ import annotations  # Latest type hint features
-from collections import defaultdict
-from decimal import Decimal
-from operator import itemgetter
-
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from chart_groups.utils import get_charts_in_hierarchy
-from chart_types.utils import apply_format_spec
-from charts.models import Chart
+from chart_groups.utils import get_chart_group_ids_containing_chart
+from core.parsers import ResourceIdentifiersParser
 from core.utils import (
-    add_ranks,
-    delete_ordered_obj_prep,
+    apply_ordering,
+    conditional_get,
     filter_queryset_by_param,
+    get_ordered_resource_ids,
     insert_ordered_obj_prep,
+    make_list_response,
     reorder_obj_prep,
 )
-from filters.utils import apply_filter_spec, FilterSpec
-from players.models import Player
-from records.models import Record
-from records.utils import make_record_ranking, sort_records_by_value
-from .models import Ladder, LadderChartTag
+from games.utils import get_object_validators_func
+from records.improvements import sync_game_improvement_contexts
+from records.standings import sync_game_standing_contexts
+from .models import Ladder
 from .serializers import LadderSerializer
+from .utils import get_cached_ladder_ranking
 
 
 class LadderIndex(ListCreateAPIView):
@@ -42,15 +42,11 @@ class LadderIndex(ListCreateAPIView):
 
         chart_id = self.request.query_params.get('chart_id')
         if chart_id is not None:
-            chart = Chart.objects.get(id=chart_id)
-            # Get the chart groups that contain this chart.
-            groups = []
-            group = chart.chart_group
-            while group:
-                groups.append(group)
-                group = group.parent_group
-            # Ensure the ladder's chart group is one of these groups.
-            queryset = queryset.filter(chart_group__in=groups)
+            # Ensure the ladder's chart group is one of the groups that
+            # contain this chart.
+            queryset = queryset.filter(
+                chart_group__in=get_chart_group_ids_containing_chart(
+                    chart_id))
 
         return queryset
 
@@ -64,7 +60,38 @@ class LadderIndex(ListCreateAPIView):
         # Insert the new ladder.
         return super().create(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        ladder = serializer.save()
+        # Chart standings and improvements are maintained for each ladder's
+        # filter spec.
+        sync_game_standing_contexts(ladder.game_id)
+        sync_game_improvement_contexts(ladder.game_id)
+
+
+class LadderReorder(APIView):
+    """
+    Apply a full new ordering to a game's ladders of one kind. The request
+    body lists all of those ladders in the desired order, as resource
+    identifiers: {"data": [{"type": "ladders", "id": "3"}, ...]}
+    """
+    parser_classes = [ResourceIdentifiersParser]
+
+    def post(self, request):
+        ladder_ids = get_ordered_resource_ids(request, 'ladders')
+        first_ladder = Ladder.objects.filter(id=ladder_ids[0]).first()
+        if first_ladder is None:
+            raise ValidationError(f"No ladder has ID {ladder_ids[0]}.")
+        gk_ladders = Ladder.objects.filter(
+            game=first_ladder.game_id, kind=first_ladder.kind)
+        apply_ordering('order_in_game_and_kind', gk_ladders, ladder_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+get_ladder_validators = get_object_validators_func(
+    Ladder, 'ladder_id', 'game')
+
 
+@conditional_get(get_ladder_validators)
 class LadderDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = LadderSerializer
     lookup_url_kwarg = 'ladder_id'
@@ -81,228 +108,28 @@ class LadderDetail(RetrieveUpdateDestroyAPIView):
         # Edit ladder.
         return super().patch(request, *args, **kwargs)
 
-    def delete(self, request, *args, **kwargs):
-        ladder = self.get_object()
-        gk_ladders = Ladder.objects.filter(game=ladder.game, kind=ladder.kind)
-        # Prep before delete.
-        delete_ordered_obj_prep('order_in_game_and_kind', ladder, gk_ladders)
-        # Delete ladder.
-        return super().delete(request, *args, **kwargs)
-
-
+    def perform_update(self, serializer):
+        old_game_id = serializer.instance.game_id
+        ladder = serializer.save()
+        # Chart standings and improvements are maintained for each ladder's
+        # filter spec.
+        sync_game_standing_contexts(ladder.game_id)
+        sync_game_improvement_contexts(ladder.game_id)
+        if ladder.game_id != old_game_id:
+            sync_game_standing_contexts(old_game_id)
+            sync_game_improvement_contexts(old_game_id)
+
+    def perform_destroy(self, instance):
+        game_id = instance.game_id
+        instance.delete()
+        sync_game_standing_contexts(game_id)
+        sync_game_improvement_contexts(game_id)
+
+
+@method_decorator(transaction.non_atomic_requests, name='dispatch')
+@conditional_get(get_ladder_validators)
 class LadderRanking(APIView):
 
     def get(self, request, ladder_id):
-        ladder = Ladder.objects.get(id=ladder_id)
-        charts = get_charts_in_hierarchy(ladder.chart_group)
-        chart_types = set([chart.chart_type for chart in charts])
-        ladder_chart_tags = list(LadderChartTag.objects.filter(ladder=ladder))
-        filter_spec = FilterSpec(ladder.filter_spec)
-
-        if filter_spec.is_empty():
-            all_records = Record.objects.filter(chart__in=charts)
-        else:
-            all_records = Record.objects.none()
-
-            # Apply the filter spec to the records. Also ensure we only apply
-            # the filters that each chart type recognizes.
-            for chart_type in chart_types:
-                ct_records = Record.objects.filter(
-                    chart__in=charts, chart__chart_type=chart_type)
-                ct_records = apply_filter_spec(
-                    ct_records, filter_spec, chart_type=chart_type)
-                all_records |= ct_records
-
-        # All the players in the ladder
-
-        player_ids = all_records.values_list('player_id', flat=True).distinct()
-
-        # Add more player info
-
-        players = Player.objects.filter(id__in=player_ids).values(
-            'id', 'username')
-        players_data = {p['id']: dict(username=p['username']) for p in players}
-
-        for r in all_records.order_by('player_id', '-date_achieved') \
-                .distinct('player_id') \
-                .values('player_id', 'date_achieved'):
-            players_data[r['player_id']]['last_active'] = r['date_achieved']
-
-        def chart_count_list():
-            return [None] * len(charts)
-        charts_data = []
-        players_record_data: dict[list[dict | None]] = \
-            defaultdict(chart_count_list)
-
-        for chart_index, chart in enumerate(charts):
-
-            records = Record.objects.filter(chart=chart)
-            chart_tags = list(chart.chart_tags.all())
-
-            # Tags applying to this chart for this ladder.
-            applicable_tag_ids = (
-                set([tag.id for tag in chart_tags])
-                & set([lc_tag.chart_tag_id for lc_tag in ladder_chart_tags])
-            )
-
-            if not ladder_chart_tags:
-                # No ladder formula; all charts are weighted 1.
-                chart_weight = 1
-            elif not applicable_tag_ids:
-                # Chart is not counted in the ladder formula.
-                chart_weight = 0
-            else:
-                # Chart is counted in the ladder formula. Check all the
-                # applicable chart tags; lowest weight wins.
-                chart_weight = min([
-                    lc_tag.weight for lc_tag in ladder_chart_tags
-                    if lc_tag.chart_tag_id in applicable_tag_ids])
-
-            if not filter_spec.is_empty():
-                records = apply_filter_spec(
-                    records, filter_spec, chart_type=chart.chart_type)
-
-            # Sort records best-first.
-            records = sort_records_by_value(records, chart.id)
-
-            records = records.values(
-                'id', 'value', 'date_achieved', 'player_id')
-
-            records = make_record_ranking(records)
-            record_count = len(records)
-            sr_value = records[0]['value']
-
-            charts_data.append(dict(
-                tag_ids=applicable_tag_ids,
-                weight=chart_weight,
-                record_count=record_count,
-                sr_value=sr_value,
-                order_ascending=chart.chart_type.order_ascending,
-            ))
-
-            for r in records:
-                players_record_data[r['player_id']][chart_index] = dict(
-                    rank=r['rank'],
-                    value=r['value'],
-                )
-
-        chart_weight_total = sum([cd['weight'] for cd in charts_data])
-
-        chart_tags_lookup = dict()
-        for lc_tag in ladder_chart_tags:
-            tag_id = lc_tag.chart_tag_id
-            tag = lc_tag.chart_tag
-            chart_tags_lookup[tag_id] = tag
-
-        entries = []
-
-        for player_id in player_ids:
-
-            charts_record_data = players_record_data[player_id]
-
-            # AF
-
-            weighted_ranks = []
-            for ci in range(len(charts)):
-                if charts_record_data[ci] is None:
-                    # No record for this chart: Use last rank + 1
-                    rank = charts_data[ci]['record_count'] + 1
-                else:
-                    rank = charts_record_data[ci]['rank']
-                weighted_ranks.append(charts_data[ci]['weight'] * rank)
-
-            # To 3 decimal places, like 4.560
-            af = sum(weighted_ranks) / chart_weight_total
-            af_display = format(af, '.3f')
-
-            # SRPR
-
-            weighted_srprs = []
-            for ci in range(len(charts)):
-                if charts_record_data[ci] is None:
-                    # No record for this chart: Use 0
-                    chart_srpr = 0
-                else:
-                    sr_value = charts_data[ci]['sr_value']
-                    if charts_data[ci]['order_ascending']:
-                        chart_srpr = (
-                            Decimal(sr_value)
-                            / Decimal(charts_record_data[ci]['value']))
-                    else:
-                        chart_srpr = (
-                            Decimal(charts_record_data[ci]['value'])
-                            / Decimal(sr_value))
-                weighted_srprs.append(charts_data[ci]['weight'] * chart_srpr)
-
-            # Multiplying by 100 makes it a percentage:
-            # 0.934497 -> 93.4497%
-            srpr = (
-                Decimal(100)
-                * sum(weighted_srprs)
-                / Decimal(chart_weight_total)
-            )
-            # To 3 decimal places, like 93.450%
-            srpr_display = f"{srpr:.3f}%"
-
-            last_active = players_data[player_id]['last_active']
-            last_active_display = last_active.date().isoformat()
-
-            entry = dict(
-                player_id=player_id,
-                player_username=players_data[player_id]['username'],
-                af=af,
-                af_display=af_display,
-                srpr=srpr,
-                srpr_display=srpr_display,
-                last_active=last_active,
-                last_active_display=last_active_display,
-                totals=[],
-            )
-
-            # Totals
-
-            record_values_by_tag = defaultdict(list)
-            order_ascending_by_tag = dict()
-            for ci in range(len(charts)):
-                for tag_id in charts_data[ci]['tag_ids']:
-                    if charts_record_data[ci] is None:
-                        value = None
-                    else:
-                        value = charts_record_data[ci]['value']
-                    record_values_by_tag[tag_id].append(value)
-                    order_ascending_by_tag[tag_id] = \
-                        charts_data[ci]['order_ascending']
-
-            for tag_id, record_values in record_values_by_tag.items():
-
-                if None in record_values:
-                    if order_ascending_by_tag[tag_id]:
-                        # Blank record invalidates the total.
-                        total = None
-                    else:
-                        # Filter out the blank records and sum up the rest.
-                        def not_none(r):
-                            return r is not None
-                        total = sum(filter(not_none, record_values))
-                else:
-                    # Sum up.
-                    total = sum(record_values)
-
-                # Format the total.
-                tag = chart_tags_lookup[tag_id]
-                format_spec = tag.primary_chart_type.format_spec
-                if total is None:
-                    total_value = None
-                else:
-                    total_value = apply_format_spec(format_spec, total)
-                total_name = tag.total_name
-
-                entry['totals'].append(dict(
-                    name=total_name, value=total_value))
-
-            entries.append(entry)
-
-        entries.sort(key=itemgetter('af'))
-        add_ranks(entries, 'af')
-
-        return Response(entries)
+        ladder = Ladder.objects.select_related('game').get(id=ladder_id)
+        return make_list_response(request, get_cached_ladder_ranking(ladder))
@@ -1,3 +1,151 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from charts.models import Chart
+from chart_groups.models import ChartGroup
+from chart_types.models import ChartType
+from core.tests.utils import QueryCountMixin
+from games.models import Game
+from ladders.models import Ladder
+from records.models import Record
+from records.standings import rebuild_game_standings
+from .models import Player
+
+
+class SummaryTest(QueryCountMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="F-Zero", short_code='snes')
+        cls.game.save()
+        cls.ct_time = ChartType(
+            name="Time", game=cls.game, order_ascending=True,
+            format_spec=[dict(multiplier=100, suffix="."), dict(digits=2)])
+        cls.ct_time.save()
+        ct_speed = ChartType(
+            name="Speed", game=cls.game, order_ascending=False,
+            format_spec=[dict(suffix=" km/h")])
+        ct_speed.save()
+        cls.cg = ChartGroup(
+            name="Mute City I", order_in_parent=1, game=cls.game)
+        cls.cg.save()
+        cls.course = Chart(
+            name="Course Time", order_in_group=1, chart_group=cls.cg,
+            chart_type=cls.ct_time)
+        cls.course.save()
+        cls.speed = Chart(
+            name="Max Speed", order_in_group=2, chart_group=cls.cg,
+            chart_type=ct_speed)
+        cls.speed.save()
+        cls.ladder = Ladder(
+            name="Mute City I", game=cls.game, chart_group=cls.cg,
+            order_in_game_and_kind=1)
+        cls.ladder.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+
+        for chart, player, value, day in [
+                (cls.course, cls.p1, 120, 1), (cls.course, cls.p1, 100, 2),
+                (cls.course, cls.p2, 110, 3), (cls.speed, cls.p1, 400, 4),
+                (cls.speed, cls.p2, 500, 5)]:
+            Record(
+                chart=chart, player=player, value=value,
+                date_achieved=datetime.datetime(
+                    2022, 1, day, tzinfo=datetime.timezone.utc)).save()
+        rebuild_game_standings(cls.game.id)
+
+    def setUp(self):
+        # Test data is rolled back between tests, and records versions
+        # along with it, so cached rankings can't be trusted.
+        cache.clear()
+
+    def get_summary(self, player):
+        client = APIClient()
+        response = client.get(
+            reverse('players:summary', args=[player.id]),
+            dict(game_id=self.game.id))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test(self):
+        response = self.get_summary(self.p1)
+        self.assertEqual(response.data['username'], "P1")
+        self.assertListEqual(
+            [(c['chart_name'], c['value_display'], c['rank'],
+              c['record_count'])
+             for c in response.data['charts']],
+            [("Course Time", "1.00", 1, 2), ("Max Speed", "400 km/h", 2, 1)])
+
+        ladders = response.data['ladders']
+        self.assertEqual(len(ladders), 1)
+        self.assertEqual(ladders[0]['ladder_id'], self.ladder.id)
+        self.assertEqual(ladders[0]['rank'], 1)
+        self.assertEqual(ladders[0]['player_count'], 2)
+
+    def test_player_without_records(self):
+        player = Player(username="P3")
+        player.save()
+        response = self.get_summary(player)
+        self.assertListEqual(response.data['charts'], [])
+        self.assertListEqual(response.data['ladders'], [])
+
+    def test_query_count_independent_of_chart_count(self):
+        def add_chart():
+            chart = Chart(
+                name="Lap Time", order_in_group=3, chart_group=self.cg,
+                chart_type=self.ct_time)
+            chart.save()
+            Record(
+                chart=chart, player=self.p1, value=30,
+                date_achieved=datetime.datetime(
+                    2022, 1, 6, tzinfo=datetime.timezone.utc)).save()
+            rebuild_game_standings(self.game.id)
+
+        # Ladder rankings are counted as cached.
+        response = self.assertQueryCountIndependentOfChartCount(
+            lambda: self.get_summary(self.p1), add_chart, warm_cache=True)
+        self.assertEqual(len(response.data['charts']), 3)
+
+    def test_query_count_independent_of_ladder_count(self):
+        def get_cold_summary():
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.get_summary(self.p1)
+            return len(context.captured_queries), response
+
+        query_count, _ = get_cold_summary()
+
+        # Ladders of a course which P1 has no records on.
+        cg = ChartGroup(name="Big Blue", order_in_parent=2, game=self.game)
+        cg.save()
+        chart = Chart(
+            name="Course Time", order_in_group=1, chart_group=cg,
+            chart_type=self.ct_time)
+        chart.save()
+        Record(
+            chart=chart, player=self.p2, value=90,
+            date_achieved=datetime.datetime(
+                2022, 1, 6, tzinfo=datetime.timezone.utc)).save()
+        for order in [2, 3, 4]:
+            Ladder(
+                name=f"Big Blue {order}", game=self.game, chart_group=cg,
+                order_in_game_and_kind=order).save()
+        rebuild_game_standings(self.game.id)
+
+        new_query_count, response = get_cold_summary()
+        self.assertEqual(
+            [ladder['ladder_id'] for ladder in response.data['ladders']],
+            [self.ladder.id])
+        self.assertEqual(new_query_count, query_count)
+
+        # P2 is ranked on those ladders.
+        response = self.get_summary(self.p2)
+        self.assertEqual(len(response.data['ladders']), 4)
@@ -7,4 +7,7 @@ app_name = 'players'
 urlpatterns = [
     path('', views.PlayerIndex.as_view(), name="index"),
     path('<int:player_id>/', views.PlayerDetail.as_view(), name="detail"),
+    path(
+        '<int:player_id>/summary/',
+        views.PlayerSummary.as_view(), name="summary"),
 ]
@@ -0,0 +1,96 @@
+from collections import defaultdict
+
+from django.db.models import Count, Exists, F, OuterRef
+
+from chart_types.models import ChartType
+from ladders.models import Ladder
+from ladders.utils import get_cached_ladder_ranking
+from records.models import ChartStanding, Record
+from records.utils import add_record_displays
+from .models import Player
+
+
+def get_player_chart_summaries(
+        player: Player, game_id: int = None) -> list[dict]:
+    """
+    The player's current best record, rank, and record count on each chart
+    they have records on, in hierarchy order within each game. This reads
+    the player's unfiltered chart standings, so the number of queries
+    doesn't depend on the number of charts.
+    """
+    standings = ChartStanding.objects.filter(player=player, filter_spec='')
+    records = Record.objects.filter(player=player)
+    if game_id is not None:
+        standings = standings.filter(chart__chart_group__game=game_id)
+        records = records.filter(chart__chart_group__game=game_id)
+
+    record_counts = {
+        row['chart_id']: row['record_count']
+        for row in records.values('chart_id')
+        .annotate(record_count=Count('id')).order_by()}
+
+    summaries = list(
+        standings
+        .order_by('chart__chart_group__game_id', 'chart__position_in_game')
+        .values(
+            'chart_id', 'record_id', 'value', 'date_achieved', 'rank',
+            chart_name=F('chart__name'),
+            chart_type_id=F('chart__chart_type_id'),
+            game_id=F('chart__chart_group__game_id')))
+
+    # Displays are rendered per chart type.
+    chart_types_summaries = defaultdict(list)
+    for summary in summaries:
+        summary['record_count'] = record_counts.get(summary['chart_id'], 0)
+        chart_types_summaries[summary.pop('chart_type_id')].append(summary)
+    chart_types = ChartType.objects.in_bulk(chart_types_summaries.keys())
+    for chart_type_id, chart_type_summaries in chart_types_summaries.items():
+        add_record_displays(chart_type_summaries, chart_types[chart_type_id])
+
+    return summaries
+
+
+def get_player_ladder_summaries(
+        player: Player, game_id: int = None) -> list[dict]:
+    """
+    The player's position in each ladder they're ranked on. Ladder
+    rankings come from the ranking cache, so this only computes the
+    rankings which have changed since they were last requested. And only
+    the ladders which cover a chart the player has a standing on, under
+    the ladder's filter context, are looked at.
+
+    Each of those ladders' full rankings is still needed, since a
+    player's rank depends on every other player's AF. So on a cold cache,
+    this costs about as much as requesting each of the player's ladders'
+    rankings. Those rankings are cached for the ladder ranking endpoint
+    as well.
+    """
+    player_standings = ChartStanding.objects.filter(
+        player=player,
+        filter_spec=OuterRef('filter_spec'),
+        chart__game=OuterRef('game'),
+        chart__position_in_game__gt=OuterRef('chart_group__hierarchy_left'),
+        chart__position_in_game__lt=OuterRef('chart_group__hierarchy_right'))
+    ladders = Ladder.objects.filter(Exists(player_standings)) \
+        .select_related('game') \
+        .order_by('game_id', 'kind', 'order_in_game_and_kind')
+    if game_id is not None:
+        ladders = ladders.filter(game=game_id)
+
+    summaries = []
+    for ladder in ladders:
+        ranking = get_cached_ladder_ranking(ladder)
+        for entry in ranking:
+            if entry['player_id'] == player.id:
+                summaries.append(dict(
+                    ladder_id=ladder.id,
+                    name=ladder.name,
+                    kind=ladder.kind,
+                    game_id=ladder.game_id,
+                    rank=entry['rank'],
+                    player_count=len(ranking),
+                    af_display=entry['af_display'],
+                    srpr_display=entry['srpr_display'],
+                ))
+                break
+    return summaries
@@ -1,8 +1,13 @@
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework_json_api.pagination import JsonApiPageNumberPagination
 
+from core.utils import conditional_get
+from games.utils import get_object_validators_func
 from .models import Player
 from .serializers import PlayerSerializer
+from .utils import get_player_chart_summaries, get_player_ladder_summaries
 
 
 class PlayerPagination(JsonApiPageNumberPagination):
@@ -20,9 +25,31 @@ class PlayerIndex(ListAPIView):
         return Player.objects.all().order_by('username')
 
 
+get_player_validators = get_object_validators_func(Player, 'player_id')
+
+
+@conditional_get(get_player_validators)
 class PlayerDetail(RetrieveAPIView):
     serializer_class = PlayerSerializer
     lookup_url_kwarg = 'player_id'
 
     def get_queryset(self):
         return Player.objects.all()
+
+
+class PlayerSummary(APIView):
+    """
+    A player's standing everywhere: their current best record, rank, and
+    record count on each chart, and their position in each ladder.
+    Can be limited to one game with the game_id param.
+    """
+    def get(self, request, player_id):
+        player = Player.objects.get(id=player_id)
+        game_id = self.request.query_params.get('game_id')
+
+        return Response(dict(
+            player_id=player.id,
+            username=player.username,
+            charts=get_player_chart_summaries(player, game_id),
+            ladders=get_player_ladder_summaries(player, game_id),
+        ))
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class RecordsConfig(AppConfig):
     name = 'records'
+
+    def ready(self):
+        # Register signal receivers.
+        from . import signals  # noqa: F401
@@ -0,0 +1,186 @@
+import datetime
+
+from django.db import connection
+
+from charts.models import Chart
+from .models import ChartImprovement, Record
+from .standings import get_context_records, get_standing_filter_specs
+from .utils import annotate_improvements
+
+
+# Improvements are maintained for the same filter contexts as chart
+# standings: unfiltered, plus the filter spec of each of the game's ladders.
+
+
+def _flag_player_improvements(chart: Chart, player_ids: list[int] = None):
+    """
+    Recompute the is_improvement flags of the given players' records on a
+    chart, or of all players' records by default. This looks at one
+    player's records at a time, and only writes the flags which changed.
+    """
+    if chart.chart_type.order_ascending:
+        best_function, comparison = 'MIN', '<'
+    else:
+        best_function, comparison = 'MAX', '>'
+
+    where_sql = "chart_id = %s"
+    params = [chart.id]
+    if player_ids is not None:
+        where_sql += " AND player_id = ANY(%s)"
+        params.append(list(player_ids))
+
+    table = Record._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS record
+            SET is_improvement = flagged.improved
+            FROM (
+                SELECT id,
+                    best_before IS NULL OR value {comparison} best_before
+                    AS improved
+                FROM (
+                    SELECT id, value, {best_function}(value) OVER (
+                        PARTITION BY player_id
+                        ORDER BY date_achieved, id
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                    ) AS best_before
+                    FROM {table}
+                    WHERE {where_sql}
+                ) AS windowed
+            ) AS flagged
+            WHERE record.id = flagged.id
+                AND record.is_improvement <> flagged.improved
+            """,
+            params)
+
+
+def _update_progression(
+        chart: Chart, filter_spec_str: str,
+        since: datetime.datetime = None):
+    """
+    Recompute a chart's WR progression under a filter context, from the
+    date `since` onward, or (by default) entirely. The progression before
+    that date is kept, and its last value is the best to beat, so only the
+    records from that date onward which beat it are looked at. Only the
+    progression's changes are written.
+    """
+    order_ascending = chart.chart_type.order_ascending
+    existing_improvements = ChartImprovement.objects.filter(
+        chart=chart, filter_spec=filter_spec_str)
+    records = get_context_records(chart, filter_spec_str)
+
+    if since is not None:
+        existing_improvements = existing_improvements.filter(
+            date_achieved__gte=since)
+        records = records.filter(date_achieved__gte=since)
+        # Read from the index, like the progression itself.
+        best_before = ChartImprovement.objects \
+            .filter(
+                chart=chart, filter_spec=filter_spec_str,
+                date_achieved__lt=since) \
+            .order_by('-date_achieved', '-record') \
+            .values_list('record__value', flat=True).first()
+        if best_before is not None:
+            if order_ascending:
+                records = records.filter(value__lt=best_before)
+            else:
+                records = records.filter(value__gt=best_before)
+
+    improvements = {
+        r['id']: r['date_achieved']
+        for r in annotate_improvements(records, order_ascending)
+        .values('id', 'date_achieved', 'improved')
+        if r['improved']
+    }
+
+    existing_improvements \
+        .exclude(record__in=list(improvements)) \
+        .delete()
+    existing_improvements = list(existing_improvements)
+    existing_record_ids = set(
+        improvement.record_id for improvement in existing_improvements)
+    ChartImprovement.objects.bulk_create([
+        ChartImprovement(
+            chart=chart,
+            filter_spec=filter_spec_str,
+            record_id=record_id,
+            date_achieved=date_achieved,
+        )
+        for record_id, date_achieved in improvements.items()
+        if record_id not in existing_record_ids
+    ])
+
+    # Keep the dates copied from records whose date was edited.
+    changed_improvements = []
+    for improvement in existing_improvements:
+        date_achieved = improvements[improvement.record_id]
+        if improvement.date_achieved != date_achieved:
+            improvement.date_achieved = date_achieved
+            changed_improvements.append(improvement)
+    ChartImprovement.objects.bulk_update(
+        changed_improvements, ['date_achieved'])
+
+
+def update_chart_improvements(
+        chart_id: int, player_ids: list[int],
+        since: datetime.datetime = None):
+    """
+    Update a chart's improvements after the given players' records on that
+    chart were created, edited, or deleted. `since` is the earliest date
+    achieved among the changed records, before or after the change; WR
+    progressions before that date can't have changed.
+    """
+    chart = Chart.objects.select_related('chart_type', 'chart_group') \
+        .get(id=chart_id)
+
+    _flag_player_improvements(chart, player_ids)
+    for filter_spec_str in get_standing_filter_specs(
+            chart.chart_group.game_id):
+        _update_progression(chart, filter_spec_str, since)
+
+
+def rebuild_game_improvements(game_id: int, filter_spec_str: str = None):
+    """
+    Recompute improvements of all the game's charts. Records' flags are
+    always recomputed. WR progressions are recomputed under one filter
+    context or (by default) all maintained filter contexts.
+    """
+    if filter_spec_str is None:
+        filter_spec_strs = get_standing_filter_specs(game_id)
+        # Clear out contexts which are no longer maintained.
+        ChartImprovement.objects \
+            .filter(chart__chart_group__game=game_id) \
+            .exclude(filter_spec__in=filter_spec_strs) \
+            .delete()
+    else:
+        filter_spec_strs = [filter_spec_str]
+
+    charts = Chart.objects.filter(chart_group__game=game_id) \
+        .select_related('chart_type')
+    for chart in charts:
+        _flag_player_improvements(chart)
+        for spec_str in filter_spec_strs:
+            _update_progression(chart, spec_str)
+
+
+def sync_game_improvement_contexts(game_id: int):
+    """
+    After the game's ladders have changed, build WR progressions for any
+    newly maintained filter contexts, and clear out contexts which are no
+    longer maintained.
+    """
+    filter_spec_strs = get_standing_filter_specs(game_id)
+    game_improvements = ChartImprovement.objects.filter(
+        chart__chart_group__game=game_id)
+
+    game_improvements.exclude(filter_spec__in=filter_spec_strs).delete()
+
+    existing_filter_spec_strs = set(
+        game_improvements.values_list('filter_spec', flat=True).distinct())
+    charts = Chart.objects.filter(chart_group__game=game_id) \
+        .select_related('chart_type')
+    for filter_spec_str in filter_spec_strs:
+        if filter_spec_str not in existing_filter_spec_strs:
+            for chart in charts:
+                _update_progression(chart, filter_spec_str)
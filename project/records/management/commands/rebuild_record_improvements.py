@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from games.models import Game
+from games.utils import bump_records_version
+from records.improvements import rebuild_game_improvements
+
+
+class Command(BaseCommand):
+    help = """
+    Recompute record improvements (records' PB flags, and charts' WR
+    progressions) from scratch. Improvements are normally kept up to date
+    as records are written through the API, but this is needed after
+    bulk-importing records.
+    
+    Example usage:
+    python manage.py rebuild_record_improvements
+    python manage.py rebuild_record_improvements --game gx
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--game',
+            type=str,
+            help="Short code of the game to rebuild improvements for."
+                 " Default is all games.")
+
+    def handle(self, *args, **options):
+        games = Game.objects.order_by('id')
+        if options['game']:
+            games = games.filter(short_code=options['game'])
+
+        for game in games:
+            self.stdout.write(
+                f"Rebuilding record improvements for {game.name}")
+            rebuild_game_improvements(game.id)
+
+        # Records may have been written without going through the API,
+        # so invalidate cached rankings as well.
+        bump_records_version(games)
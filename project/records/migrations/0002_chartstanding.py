@@ -0,0 +1,37 @@
+# Generated by Django 4.0.10 on 2026-10-18 13:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0002_chart_chart_type'),
+        ('players', '0002_alter_player_username'),
+        ('records', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filter_spec', models.CharField(blank=True, max_length=200)),
+                ('value', models.IntegerField()),
+                ('date_achieved', models.DateTimeField()),
+                ('rank', models.IntegerField()),
+                ('chart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='charts.chart')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='players.player')),
+                ('record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='records.record')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='chartstanding',
+            index=models.Index(fields=['chart', 'filter_spec', 'rank', 'date_achieved', 'record'], name='chart_standing_ranking_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='chartstanding',
+            constraint=models.UniqueConstraint(fields=('chart', 'filter_spec', 'player'), name='unique_chart_filter_spec_player'),
+        ),
+    ]
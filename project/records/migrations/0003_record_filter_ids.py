@@ -0,0 +1,33 @@
+# Generated by Django 4.0.10 on 2026-10-18 13:53
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_chartstanding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='record',
+            name='filter_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        # Fill in existing records' filter IDs.
+        migrations.RunSQL(
+            """
+            UPDATE records_record SET filter_ids = ARRAY(
+                SELECT filter_id FROM records_record_filters
+                WHERE record_id = records_record.id
+                ORDER BY filter_id)
+            """,
+            migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='record',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['filter_ids'], name='record_filter_ids_gin'),
+        ),
+    ]
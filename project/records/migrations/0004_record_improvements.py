@@ -0,0 +1,82 @@
+# Generated by Django 4.0.10 on 2026-10-18 14:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chart_types', '0001_initial'),
+        ('charts', '0003_hierarchy_positions'),
+        ('records', '0003_record_filter_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartImprovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filter_spec', models.CharField(blank=True, max_length=200)),
+                ('date_achieved', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='is_improvement',
+            field=models.BooleanField(default=False),
+        ),
+        # Flag existing records which beat the player's earlier best on
+        # the chart. Charts' WR progressions are filled in by the
+        # rebuild_record_improvements command.
+        migrations.RunSQL(
+            """
+            UPDATE records_record SET is_improvement = flagged.improved
+            FROM (
+                SELECT id,
+                    best_before IS NULL OR sort_value < best_before
+                    AS improved
+                FROM (
+                    SELECT record.id, sort_value, MIN(sort_value) OVER (
+                        PARTITION BY record.chart_id, record.player_id
+                        ORDER BY record.date_achieved, record.id
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                    ) AS best_before
+                    FROM records_record AS record
+                    JOIN charts_chart AS chart
+                        ON chart.id = record.chart_id
+                    JOIN chart_types_charttype AS chart_type
+                        ON chart_type.id = chart.chart_type_id
+                    CROSS JOIN LATERAL (
+                        SELECT CASE WHEN chart_type.order_ascending
+                            THEN record.value ELSE -record.value END
+                            AS sort_value
+                    ) AS sort
+                ) AS windowed
+            ) AS flagged
+            WHERE records_record.id = flagged.id
+            """,
+            migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(condition=models.Q(('is_improvement', True)), fields=['chart', 'player', 'date_achieved'], name='record_improvement_idx'),
+        ),
+        migrations.AddField(
+            model_name='chartimprovement',
+            name='chart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='improvements', to='charts.chart'),
+        ),
+        migrations.AddField(
+            model_name='chartimprovement',
+            name='record',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='improvements', to='records.record'),
+        ),
+        migrations.AddIndex(
+            model_name='chartimprovement',
+            index=models.Index(fields=['chart', 'filter_spec', 'date_achieved', 'record'], name='chart_improvement_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='chartimprovement',
+            constraint=models.UniqueConstraint(fields=('record', 'filter_spec'), name='unique_record_filter_spec'),
+        ),
+    ]
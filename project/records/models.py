@@ -1,3 +1,5 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
 from charts.models import Chart
@@ -12,6 +14,96 @@ class Record(models.Model):
     chart = models.ForeignKey(Chart, on_delete=models.CASCADE)
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     filters = models.ManyToManyField(Filter)
+    # Sorted IDs of the record's filters. This is a copy of the `filters`
+    # relation, kept in sync by sync_record_filter_ids(), so that filter
+    # specs can be matched with array predicates instead of joins.
+    filter_ids = ArrayField(models.IntegerField(), default=list, blank=True)
+    # Whether the record beat the player's best value among their earlier
+    # records of the chart (unfiltered). Kept up to date by
+    # update_chart_improvements(), so that a player's PB history is an
+    # indexed read.
+    is_improvement = models.BooleanField(default=False)
 
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Filter spec matching.
+            GinIndex(fields=['filter_ids'], name='record_filter_ids_gin'),
+            # Players' PB histories.
+            models.Index(
+                fields=['chart', 'player', 'date_achieved'],
+                condition=models.Q(is_improvement=True),
+                name='record_improvement_idx')]
+
+
+class ChartStanding(models.Model):
+    """
+    A player's best record on a chart, under a particular filter context,
+    along with the rank of that record among all players' best records.
+    This is a materialized form of what rank_best_records() computes, and
+    is kept up to date whenever records are written. That way, reading
+    a chart ranking doesn't require sorting every record of the chart.
+    """
+    chart = models.ForeignKey(
+        Chart, on_delete=models.CASCADE, related_name='standings')
+    # Filter spec string defining the filter context, such as '' for
+    # unfiltered, or a ladder's filter spec.
+    filter_spec = models.CharField(max_length=200, blank=True)
+    player = models.ForeignKey(Player, on_delete=models.CASCADE)
+    record = models.ForeignKey(
+        Record, on_delete=models.CASCADE, related_name='standings')
+
+    # Copied from the record, so that a ranking can be read without
+    # joining the records table.
+    value = models.IntegerField()
+    date_achieved = models.DateTimeField()
+
+    rank = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            # One standing per player per chart and filter context.
+            models.UniqueConstraint(
+                fields=['chart', 'filter_spec', 'player'],
+                name='unique_chart_filter_spec_player')]
+        indexes = [
+            # Reading a ranking in order.
+            models.Index(
+                fields=[
+                    'chart', 'filter_spec', 'rank', 'date_achieved',
+                    'record'],
+                name='chart_standing_ranking_idx')]
+
+
+class ChartImprovement(models.Model):
+    """
+    A record which beat the best value among all earlier records of its
+    chart, under a particular filter context. In date order, a chart's
+    improvements make up its WR progression. Like ChartStanding, these are
+    kept up to date whenever records are written, so that reading a
+    progression doesn't require scanning the chart's whole history.
+    """
+    chart = models.ForeignKey(
+        Chart, on_delete=models.CASCADE, related_name='improvements')
+    # Filter spec string defining the filter context, such as '' for
+    # unfiltered, or a ladder's filter spec.
+    filter_spec = models.CharField(max_length=200, blank=True)
+    record = models.ForeignKey(
+        Record, on_delete=models.CASCADE, related_name='improvements')
+
+    # Copied from the record, so that a progression can be read in order
+    # from the index.
+    date_achieved = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['record', 'filter_spec'],
+                name='unique_record_filter_spec')]
+        indexes = [
+            # Reading a progression in order.
+            models.Index(
+                fields=['chart', 'filter_spec', 'date_achieved', 'record'],
+                name='chart_improvement_idx')]
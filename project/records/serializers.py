@@ -7,7 +7,7 @@ from .models import Record
 class RecordIndexSerializer(serializers.ModelSerializer):
     class Meta:
         model = Record
-        exclude = ['date_created', 'date_modified']
+        exclude = ['filter_ids', 'date_created', 'date_modified']
 
 
 class RecordSerializer(RecordIndexSerializer):
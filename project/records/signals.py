@@ -0,0 +1,245 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save)
+from django.dispatch import receiver
+
+from chart_groups.models import ChartGroup
+from chart_tags.models import ChartTag
+from chart_types.models import ChartType
+from charts.models import Chart
+from core.utils import on_commit_once
+from filter_groups.models import FilterGroup
+from filters.models import Filter
+from games.models import Game
+from games.utils import bump_records_version
+from ladders.models import Ladder, LadderChartTag
+from players.models import Player
+from .models import Record
+from .improvements import rebuild_game_improvements
+from .standings import rebuild_game_standings
+from .utils import sync_record_filter_ids
+
+
+# Keep games' records versions up to date, so that cached rankings are
+# invalidated when the underlying data changes. Besides records
+# themselves, this covers other data that rankings depend on. API views
+# also use the version as an HTTP validator (ETag), so it covers the
+# chart hierarchy and filters as well.
+
+
+@receiver(post_save, sender=Record)
+@receiver(post_delete, sender=Record)
+def record_changed(sender, instance, **kwargs):
+    bump_records_version(
+        Game.objects.filter(chartgroup__charts=instance.chart_id))
+
+
+@receiver(m2m_changed, sender=Record.filters.through)
+def record_filters_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        # instance is a record.
+        record_changed(sender, instance)
+    elif pk_set:
+        # instance is a filter, and pk_set has record IDs.
+        bump_records_version(
+            Game.objects.filter(chartgroup__charts__record__in=pk_set))
+    else:
+        bump_records_version(
+            Game.objects.filter(filtergroup__filter=instance.id))
+
+
+@receiver(m2m_changed, sender=Filter.outgoing_filter_implications.through)
+def filter_implications_changed(sender, instance, action, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    # Changes which records match implied filters.
+    games = Game.objects.filter(filtergroup__filter=instance.id)
+    bump_records_version(games)
+    rebuild_rankings_on_commit(games)
+
+
+@receiver(post_save, sender=Chart)
+@receiver(post_delete, sender=Chart)
+def chart_changed(sender, instance, **kwargs):
+    # May change which charts a ladder covers.
+    bump_records_version(
+        Game.objects.filter(chartgroup=instance.chart_group_id))
+
+
+@receiver(post_save, sender=ChartGroup)
+@receiver(post_delete, sender=ChartGroup)
+def chart_group_changed(sender, instance, **kwargs):
+    # May change the hierarchy, and which charts a ladder covers.
+    bump_records_version(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(post_save, sender=ChartType)
+@receiver(post_delete, sender=ChartType)
+def chart_type_changed(sender, instance, **kwargs):
+    # Changes record ordering or display.
+    games = Game.objects.filter(id=instance.game_id)
+    bump_records_version(games)
+    if not kwargs.get('created', True):
+        # Existing charts may now be ordered the other way.
+        rebuild_rankings_on_commit(games)
+
+
+@receiver(m2m_changed, sender=ChartType.filter_groups.through)
+def chart_type_filter_groups_changed(sender, instance, action, reverse,
+                                     **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    # Changes which filters apply to the chart type's records. Either
+    # way, the chart type and filter group are in the same game.
+    games = Game.objects.filter(id=instance.game_id)
+    bump_records_version(games)
+    rebuild_rankings_on_commit(games)
+
+
+# Fields which decide which records match a filter spec.
+FILTER_MATCHING_FIELDS = {
+    Filter: ['numeric_value', 'usage_type', 'filter_group_id'],
+    FilterGroup: ['kind'],
+}
+
+
+@receiver(pre_save, sender=Filter)
+@receiver(pre_save, sender=FilterGroup)
+def remember_filter_matching_values(sender, instance, **kwargs):
+    # Saved values of the matching fields, to tell after the save whether
+    # they changed. None if the object is new.
+    instance.saved_matching_values = sender.objects \
+        .filter(id=instance.id) \
+        .values(*FILTER_MATCHING_FIELDS[sender]).first()
+
+
+def filter_matching_values_changed(sender, instance):
+    saved_values = getattr(instance, 'saved_matching_values', None)
+    if saved_values is None:
+        # New filters and groups aren't used by any records yet.
+        return False
+    return any(
+        saved_values[field] != getattr(instance, field)
+        for field in FILTER_MATCHING_FIELDS[sender])
+
+
+@receiver(post_save, sender=Filter)
+def filter_changed(sender, instance, **kwargs):
+    filter_group_ids = [instance.filter_group_id]
+    if not filter_matching_values_changed(sender, instance):
+        # Filter names are shown with records.
+        bump_records_version(
+            Game.objects.filter(filtergroup__in=filter_group_ids))
+        return
+
+    # Changes which records match specs with this filter, or with numeric
+    # comparisons among the filter's group.
+    filter_group_ids.append(
+        instance.saved_matching_values['filter_group_id'])
+    games = Game.objects.filter(filtergroup__in=filter_group_ids)
+    bump_records_version(games)
+    rebuild_rankings_on_commit(games)
+
+
+@receiver(post_save, sender=FilterGroup)
+@receiver(post_delete, sender=FilterGroup)
+def filter_group_changed(sender, instance, **kwargs):
+    # Filter group settings affect how filter specs apply.
+    bump_records_version(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(post_save, sender=FilterGroup)
+def filter_group_saved(sender, instance, **kwargs):
+    if filter_matching_values_changed(sender, instance):
+        rebuild_rankings_on_commit(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(post_save, sender=ChartTag)
+@receiver(post_delete, sender=ChartTag)
+def chart_tag_changed(sender, instance, **kwargs):
+    # Changes ladder totals' names and formats.
+    bump_records_version(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(m2m_changed, sender=ChartTag.charts.through)
+def chart_tag_charts_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    # Changes which charts count toward ladder formulas and totals.
+    if reverse:
+        chart_changed(sender, instance)
+    else:
+        bump_records_version(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(post_save, sender=Ladder)
+@receiver(post_delete, sender=Ladder)
+def ladder_changed(sender, instance, **kwargs):
+    # Chart views filtered by a ladder (the ladder_id param) depend on its
+    # filter spec.
+    bump_records_version(Game.objects.filter(id=instance.game_id))
+
+
+@receiver(post_save, sender=LadderChartTag)
+@receiver(post_delete, sender=LadderChartTag)
+def ladder_chart_tag_changed(sender, instance, **kwargs):
+    # Changes the ladder's ranking formula.
+    bump_records_version(Game.objects.filter(ladder=instance.ladder_id))
+
+
+@receiver(post_save, sender=Player)
+def player_changed(sender, instance, created, **kwargs):
+    if not created:
+        # Username may have changed, and players aren't tied to a game.
+        bump_records_version(Game.objects.all())
+
+
+# Keep records' filter_ids columns in sync with their filters.
+
+
+@receiver(m2m_changed, sender=Record.filters.through)
+def sync_filter_ids(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        # instance is a record.
+        sync_record_filter_ids(Record.objects.filter(id=instance.id))
+    elif pk_set:
+        # instance is a filter, and pk_set has record IDs.
+        sync_record_filter_ids(Record.objects.filter(id__in=pk_set))
+    else:
+        sync_record_filter_ids(
+            Record.objects.filter(filter_ids__contains=[instance.id]))
+
+
+@receiver(post_delete, sender=Filter)
+def filter_deleted(sender, instance, **kwargs):
+    # The filter's record associations were deleted without m2m signals.
+    sync_record_filter_ids(
+        Record.objects.filter(filter_ids__contains=[instance.id]))
+    games = Game.objects.filter(filtergroup=instance.filter_group_id)
+    bump_records_version(games)
+    rebuild_rankings_on_commit(games)
+
+
+# Chart standings and improvements are updated incrementally as records are
+# written through the API. Other changes which affect every ranking of a
+# game, like a chart type's order or filter implications, rebuild the
+# game's standings and improvements once the change is committed.
+
+
+def rebuild_game_rankings(game_id):
+    with transaction.atomic():
+        rebuild_game_standings(game_id)
+        rebuild_game_improvements(game_id)
+    # Responses served between the change's commit and the rebuild were
+    # based on the old standings and improvements.
+    bump_records_version(Game.objects.filter(id=game_id))
+
+
+def rebuild_rankings_on_commit(games):
+    for game_id in games.values_list('id', flat=True):
+        on_commit_once(rebuild_game_rankings, game_id)
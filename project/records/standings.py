@@ -0,0 +1,190 @@
+from django.db import connection
+from django.db.models import F, QuerySet
+
+from charts.models import Chart
+from filters.utils import apply_filter_spec, FilterSpec
+from ladders.models import Ladder
+from .models import ChartStanding, Record
+from .utils import rank_best_records, sort_records_by_value
+
+
+def get_standing_filter_specs(game_id: int) -> list[str]:
+    """
+    Filter contexts which chart standings are maintained for: unfiltered,
+    plus the filter spec of each of the game's ladders.
+    """
+    ladder_filter_specs = Ladder.objects.filter(game=game_id) \
+        .exclude(filter_spec='') \
+        .values_list('filter_spec', flat=True).distinct()
+    return [''] + sorted(ladder_filter_specs)
+
+
+def get_standings_rankings(
+        chart_ids: list[int], filter_spec_str: str) -> QuerySet:
+    """
+    Ranking rows of the charts under a filter context, read from chart
+    standings: best first within each chart, with ties ordered the same way
+    as sort_records_by_value() orders them. The rows have the same fields
+    as ranked records, except that the record's ID is named `record_id`;
+    pass them through rename_standing_record_ids() before using them as
+    records.
+    """
+    return ChartStanding.objects \
+        .filter(chart__in=chart_ids, filter_spec=filter_spec_str) \
+        .order_by('chart_id', 'rank', 'date_achieved', 'record_id') \
+        .annotate(player_username=F('player__username')) \
+        .values(
+            'record_id', 'value', 'date_achieved', 'player_id',
+            'player_username', 'rank', 'chart_id',
+            filter_ids=F('record__filter_ids'))
+
+
+def rename_standing_record_ids(rows: list[dict]):
+    """
+    Rename the `record_id` of ranking rows from standings to `id`, as in
+    rows of records. Rows which already have an `id` are left as they are.
+    """
+    for row in rows:
+        if 'record_id' in row:
+            row['id'] = row.pop('record_id')
+
+
+def get_context_records(chart: Chart, filter_spec_str: str) -> QuerySet:
+    """
+    The chart's records under a filter context.
+    """
+    records = Record.objects.filter(chart=chart)
+    return apply_filter_spec(
+        records, FilterSpec(filter_spec_str), chart.chart_type)
+
+
+def _rerank(chart: Chart, filter_spec_str: str):
+    """
+    Recompute the ranks of a chart's standings under a filter context.
+    This only looks at one row per player, not at every record, and only
+    writes the rows whose rank changed.
+    """
+    value_order = 'ASC' if chart.chart_type.order_ascending else 'DESC'
+    table = ChartStanding._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS standing
+            SET rank = ranked.new_rank
+            FROM (
+                SELECT id, RANK() OVER (ORDER BY value {value_order})
+                    AS new_rank
+                FROM {table}
+                WHERE chart_id = %s AND filter_spec = %s
+            ) AS ranked
+            WHERE standing.id = ranked.id
+                AND standing.rank <> ranked.new_rank
+            """,
+            [chart.id, filter_spec_str])
+
+
+def rebuild_chart_standings(chart: Chart, filter_spec_str: str):
+    """
+    Recompute a chart's standings under a filter context from scratch.
+    """
+    ChartStanding.objects.filter(
+        chart=chart, filter_spec=filter_spec_str).delete()
+
+    ranking = rank_best_records(
+        get_context_records(chart, filter_spec_str),
+        chart.chart_type.order_ascending,
+    ).values('id', 'value', 'date_achieved', 'player_id', 'rank')
+
+    ChartStanding.objects.bulk_create([
+        ChartStanding(
+            chart=chart,
+            filter_spec=filter_spec_str,
+            player_id=r['player_id'],
+            record_id=r['id'],
+            value=r['value'],
+            date_achieved=r['date_achieved'],
+            rank=r['rank'],
+        )
+        for r in ranking
+    ])
+
+
+def rebuild_game_standings(game_id: int, filter_spec_str: str = None):
+    """
+    Recompute standings of all the game's charts, under one filter context
+    or (by default) all maintained filter contexts.
+    """
+    if filter_spec_str is None:
+        filter_spec_strs = get_standing_filter_specs(game_id)
+        # Clear out contexts which are no longer maintained.
+        ChartStanding.objects \
+            .filter(chart__chart_group__game=game_id) \
+            .exclude(filter_spec__in=filter_spec_strs) \
+            .delete()
+    else:
+        filter_spec_strs = [filter_spec_str]
+
+    charts = Chart.objects.filter(chart_group__game=game_id) \
+        .select_related('chart_type')
+    for chart in charts:
+        for spec_str in filter_spec_strs:
+            rebuild_chart_standings(chart, spec_str)
+
+
+def sync_game_standing_contexts(game_id: int):
+    """
+    After the game's ladders have changed, build standings for any newly
+    maintained filter contexts, and clear out contexts which are no longer
+    maintained.
+    """
+    filter_spec_strs = get_standing_filter_specs(game_id)
+    game_standings = ChartStanding.objects.filter(
+        chart__chart_group__game=game_id)
+
+    game_standings.exclude(filter_spec__in=filter_spec_strs).delete()
+
+    existing_filter_spec_strs = set(
+        game_standings.values_list('filter_spec', flat=True).distinct())
+    for filter_spec_str in filter_spec_strs:
+        if filter_spec_str not in existing_filter_spec_strs:
+            rebuild_game_standings(game_id, filter_spec_str)
+
+
+def update_chart_standings(chart_id: int, player_ids: list[int]):
+    """
+    Update a chart's standings after the given players' records on that
+    chart were created, edited, or deleted. Only those players' best
+    records are looked up again; other players' standings just get
+    re-ranked.
+    """
+    chart = Chart.objects.select_related('chart_type', 'chart_group') \
+        .get(id=chart_id)
+
+    for filter_spec_str in get_standing_filter_specs(
+            chart.chart_group.game_id):
+
+        context_records = sort_records_by_value(
+            get_context_records(chart, filter_spec_str), chart.id)
+
+        for player_id in set(player_ids):
+            best_record = context_records.filter(player=player_id) \
+                .values('id', 'value', 'date_achieved').first()
+
+            if best_record is None:
+                # Player has no more records in this context.
+                ChartStanding.objects.filter(
+                    chart=chart, filter_spec=filter_spec_str,
+                    player=player_id).delete()
+                continue
+
+            ChartStanding.objects.update_or_create(
+                chart=chart, filter_spec=filter_spec_str, player_id=player_id,
+                defaults=dict(
+                    record_id=best_record['id'],
+                    value=best_record['value'],
+                    date_achieved=best_record['date_achieved'],
+                    # Placeholder until re-ranking.
+                    rank=0,
+                ))
+
+        _rerank(chart, filter_spec_str)
@@ -1,3 +1,560 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from charts.models import Chart
+from filter_groups.models import FilterGroup
+from filters.models import Filter
+from chart_groups.models import ChartGroup
+from chart_types.models import ChartType
+from games.models import Game
+from ladders.models import Ladder
+from players.models import Player
+from .improvements import (
+    rebuild_game_improvements, update_chart_improvements)
+from .models import ChartImprovement, ChartStanding, Record
+from .standings import rebuild_chart_standings, update_chart_standings
+from .utils import annotate_improvements, rank_best_records
+
+
+def make_date(day):
+    return datetime.datetime(2022, 1, day, tzinfo=datetime.timezone.utc)
+
+
+class ChartStandingsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="F-Zero", short_code='snes')
+        cls.game.save()
+        cls.ct = ChartType(
+            name="CT1", game=cls.game, format_spec=[], order_ascending=True)
+        cls.ct.save()
+        cg = ChartGroup(name="Mute City I", order_in_parent=1, game=cls.game)
+        cg.save()
+        cls.chart = Chart(
+            name="Course Time", order_in_group=1, chart_group=cg,
+            chart_type=cls.ct)
+        cls.chart.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+        cls.p3 = Player(username="P3")
+        cls.p3.save()
+
+    def add_record(self, player, value, day):
+        record = Record(
+            chart=self.chart, player=player, value=value,
+            date_achieved=make_date(day))
+        record.save()
+        update_chart_standings(self.chart.id, [player.id])
+        return record
+
+    def get_ranking(self):
+        client = APIClient()
+        response = client.get(
+            reverse('charts:ranking', args=[self.chart.id]))
+        self.assertEqual(response.status_code, 200)
+        return [
+            (r['player_id'], r['value'], r['rank']) for r in response.data]
+
+    def test_incremental_updates(self):
+        self.add_record(self.p1, 100, 1)
+        self.add_record(self.p2, 90, 2)
+        self.add_record(self.p3, 100, 3)
+        self.assertListEqual(
+            self.get_ranking(),
+            [(self.p2.id, 90, 1), (self.p1.id, 100, 2), (self.p3.id, 100, 2)])
+
+        # Improvement moves P3 up, and the others down.
+        self.add_record(self.p3, 80, 4)
+        self.assertListEqual(
+            self.get_ranking(),
+            [(self.p3.id, 80, 1), (self.p2.id, 90, 2), (self.p1.id, 100, 3)])
+
+        # Non-improvement changes nothing.
+        self.add_record(self.p2, 95, 5)
+        self.assertListEqual(
+            self.get_ranking(),
+            [(self.p3.id, 80, 1), (self.p2.id, 90, 2), (self.p1.id, 100, 3)])
+
+    def test_delete_record(self):
+        self.add_record(self.p1, 100, 1)
+        p2_record_1 = self.add_record(self.p2, 90, 2)
+        p2_record_2 = self.add_record(self.p2, 85, 3)
+
+        # Falls back to the player's next-best record.
+        p2_record_2.delete()
+        update_chart_standings(self.chart.id, [self.p2.id])
+        self.assertListEqual(
+            self.get_ranking(), [(self.p2.id, 90, 1), (self.p1.id, 100, 2)])
+
+        # Player no longer has any records.
+        p2_record_1.delete()
+        update_chart_standings(self.chart.id, [self.p2.id])
+        self.assertListEqual(self.get_ranking(), [(self.p1.id, 100, 1)])
+
+    def test_rebuild_matches_incremental(self):
+        self.add_record(self.p1, 100, 1)
+        self.add_record(self.p2, 90, 2)
+        self.add_record(self.p3, 90, 3)
+        self.add_record(self.p1, 80, 4)
+        incremental_ranking = self.get_ranking()
+
+        ChartStanding.objects.all().delete()
+        rebuild_chart_standings(self.chart, '')
+        self.assertListEqual(self.get_ranking(), incremental_ranking)
+
+    def test_chart_type_order_change(self):
+        self.add_record(self.p1, 10, 1)
+        self.add_record(self.p2, 20, 2)
+        self.add_record(self.p1, 30, 3)
+
+        # Standings are rebuilt once the change is committed, and only
+        # once per game.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.ct.order_ascending = False
+            self.ct.save()
+            self.ct.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertListEqual(
+            self.get_ranking(), [(self.p1.id, 30, 1), (self.p2.id, 20, 2)])
+
+
+class FilterChangeStandingsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Run the rebuilds queued by the setup now, so that they don't
+        # absorb the tests' rebuilds.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.game = Game(name="F-Zero", short_code='snes')
+            cls.game.save()
+            settings = FilterGroup(
+                name="Setting", game=cls.game, order_in_game=1,
+                kind=FilterGroup.Kinds.NUMERIC)
+            settings.save()
+            ct = ChartType(
+                name="CT1", game=cls.game, format_spec=[],
+                order_ascending=True)
+            ct.save()
+            ct.filter_groups.add(settings)
+            cg = ChartGroup(
+                name="Mute City I", order_in_parent=1, game=cls.game)
+            cg.save()
+            cls.chart = Chart(
+                name="Course Time", order_in_group=1, chart_group=cg,
+                chart_type=ct)
+            cls.chart.save()
+            cls.setting_50 = Filter(
+                name="50", numeric_value=50, filter_group=settings)
+            cls.setting_50.save()
+            setting_80 = Filter(
+                name="80", numeric_value=80, filter_group=settings)
+            setting_80.save()
+            cls.ladder = Ladder(
+                name="Setting 80 or lower", game=cls.game, chart_group=cg,
+                order_in_game_and_kind=1, filter_spec=f"{setting_80.id}le")
+            cls.ladder.save()
+            player = Player(username="P1")
+            player.save()
+            record = Record(
+                chart=cls.chart, player=player, value=100,
+                date_achieved=make_date(1))
+            record.save()
+            record.filters.add(cls.setting_50)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_rankings(self):
+        client = APIClient()
+        chart_response = client.get(
+            reverse('charts:ranking', args=[self.chart.id]),
+            dict(ladder_id=self.ladder.id))
+        ladder_response = client.get(
+            reverse('ladders:ranking', args=[self.ladder.id]))
+        return (
+            [r['player_username'] for r in chart_response.data],
+            [e['player_username'] for e in ladder_response.data])
+
+    def test_numeric_value_change(self):
+        self.assertTupleEqual(self.get_rankings(), (["P1"], ["P1"]))
+
+        # The record's setting is no longer 80 or lower.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.setting_50.numeric_value = 90
+            self.setting_50.save()
+        self.assertTupleEqual(self.get_rankings(), ([], []))
+
+    def test_name_change(self):
+        # Doesn't change which records match, so no rebuild.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.setting_50.name = "Fifty"
+            self.setting_50.save()
+        # Just the filter metadata version bump.
+        self.assertEqual(len(callbacks), 1)
+        self.assertTupleEqual(self.get_rankings(), (["P1"], ["P1"]))
+
+
+class RecordImprovementsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.game = Game(name="F-Zero", short_code='snes')
+        cls.game.save()
+        cls.ct = ChartType(
+            name="CT1", game=cls.game, format_spec=[], order_ascending=True)
+        cls.ct.save()
+        cg = ChartGroup(name="Mute City I", order_in_parent=1, game=cls.game)
+        cg.save()
+        cls.chart = Chart(
+            name="Course Time", order_in_group=1, chart_group=cg,
+            chart_type=cls.ct)
+        cls.chart.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+
+    def add_record(self, player, value, day):
+        record = Record(
+            chart=self.chart, player=player, value=value,
+            date_achieved=make_date(day))
+        record.save()
+        update_chart_improvements(
+            self.chart.id, [player.id], since=record.date_achieved)
+        return record
+
+    def edit_date(self, record, day):
+        old_date = record.date_achieved
+        record.date_achieved = make_date(day)
+        record.save()
+        update_chart_improvements(
+            self.chart.id, [record.player_id],
+            since=min(old_date, record.date_achieved))
+
+    def get_flags(self):
+        return list(
+            Record.objects.order_by('date_achieved', 'id')
+            .values_list('value', 'is_improvement'))
+
+    def get_progression(self):
+        return list(
+            ChartImprovement.objects
+            .filter(chart=self.chart, filter_spec='')
+            .order_by('date_achieved', 'record_id')
+            .values_list('record__value', flat=True))
+
+    def test_incremental_updates(self):
+        self.add_record(self.p1, 120, 1)
+        self.add_record(self.p2, 110, 2)
+        self.add_record(self.p1, 115, 3)
+        self.add_record(self.p2, 110, 4)
+        self.assertListEqual(
+            self.get_flags(),
+            [(120, True), (110, True), (115, True), (110, False)])
+        self.assertListEqual(self.get_progression(), [120, 110])
+
+        # Backdated record, which changes later records' improvement
+        # status.
+        self.add_record(self.p2, 100, 1)
+        self.assertListEqual(
+            self.get_flags(),
+            [(120, True), (100, True), (110, False), (115, True),
+             (110, False)])
+        self.assertListEqual(self.get_progression(), [120, 100])
+
+    def test_delete_record(self):
+        self.add_record(self.p1, 120, 1)
+        p2_record = self.add_record(self.p2, 110, 2)
+        self.add_record(self.p1, 115, 3)
+        self.assertListEqual(self.get_progression(), [120, 110])
+
+        p2_record.delete()
+        update_chart_improvements(
+            self.chart.id, [self.p2.id], since=p2_record.date_achieved)
+        self.assertListEqual(self.get_progression(), [120, 115])
+
+    def test_edit_date(self):
+        self.add_record(self.p1, 120, 1)
+        p2_record = self.add_record(self.p2, 110, 2)
+        self.add_record(self.p1, 115, 4)
+
+        # Still an improvement, and its copied date follows the record.
+        self.edit_date(p2_record, 3)
+        self.assertListEqual(self.get_progression(), [120, 110])
+        self.assertListEqual(
+            list(ChartImprovement.objects.order_by('date_achieved')
+                 .values_list('date_achieved', 'record__date_achieved')),
+            [(make_date(1), make_date(1)), (make_date(3), make_date(3))])
+
+        # Now later than 115, which becomes an improvement.
+        self.edit_date(p2_record, 5)
+        self.assertListEqual(self.get_progression(), [120, 115, 110])
+
+        # Back to before 115, which is no longer an improvement.
+        self.edit_date(p2_record, 2)
+        self.assertListEqual(self.get_progression(), [120, 110])
+
+        response = APIClient().get(
+            reverse('charts:record_history', args=[self.chart.id]),
+            dict(improvements='filter'))
+        self.assertListEqual(
+            [(r['value'], r['date_achieved']) for r in response.data],
+            [(110, make_date(2)), (120, make_date(1))])
+
+    def test_rebuild_matches_incremental(self):
+        self.add_record(self.p1, 120, 1)
+        self.add_record(self.p2, 110, 2)
+        self.add_record(self.p1, 115, 3)
+        self.add_record(self.p1, 100, 4)
+        incremental_flags = self.get_flags()
+        incremental_progression = self.get_progression()
+
+        Record.objects.update(is_improvement=False)
+        ChartImprovement.objects.all().delete()
+        rebuild_game_improvements(self.game.id)
+        self.assertListEqual(self.get_flags(), incremental_flags)
+        self.assertListEqual(self.get_progression(), incremental_progression)
+
+    def test_chart_type_order_change(self):
+        self.add_record(self.p1, 10, 1)
+        self.add_record(self.p1, 20, 2)
+        self.add_record(self.p1, 30, 3)
+        self.assertListEqual(
+            self.get_flags(), [(10, True), (20, False), (30, False)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ct.order_ascending = False
+            self.ct.save()
+        # Higher values are now better.
+        self.assertListEqual(
+            self.get_flags(), [(10, True), (20, True), (30, True)])
+        self.assertListEqual(self.get_progression(), [10, 20, 30])
+
+        response = APIClient().get(
+            reverse('charts:record_history', args=[self.chart.id]),
+            dict(improvements='filter'))
+        # Latest first.
+        self.assertListEqual(
+            [r['value'] for r in response.data], [30, 20, 10])
+
+    def test_annotate_improvements(self):
+        self.add_record(self.p1, 120, 1)
+        self.add_record(self.p2, 110, 2)
+        self.add_record(self.p1, 115, 3)
+        self.add_record(self.p2, 110, 4)
+        records = Record.objects.order_by('date_achieved', 'id')
+
+        self.assertListEqual(
+            list(annotate_improvements(records, True).values_list(
+                'value', 'improved')),
+            [(120, True), (110, True), (115, False), (110, False)])
+        # Same as the maintained flags.
+        self.assertListEqual(
+            list(annotate_improvements(records, True, per_player=True)
+                 .values_list('value', 'improved')),
+            self.get_flags())
+        # Descending order: higher values are better.
+        self.assertListEqual(
+            list(annotate_improvements(records, False).values_list(
+                'value', 'improved')),
+            [(120, True), (110, False), (115, False), (110, False)])
+
+
+class RankBestRecordsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero", short_code='snes')
+        game.save()
+        cg = ChartGroup(name="Mute City I", order_in_parent=1, game=game)
+        cg.save()
+        ct = ChartType(
+            name="Speed", game=game, format_spec=[], order_ascending=False)
+        ct.save()
+        cls.chart = Chart(
+            name="Max Speed", order_in_group=1, chart_group=cg,
+            chart_type=ct)
+        cls.chart.save()
+        cls.p1 = Player(username="P1")
+        cls.p1.save()
+        cls.p2 = Player(username="P2")
+        cls.p2.save()
+        cls.p3 = Player(username="P3")
+        cls.p3.save()
+
+        for player, value, day in [
+                (cls.p1, 400, 1), (cls.p1, 420, 2), (cls.p2, 420, 3),
+                (cls.p3, 410, 4), (cls.p2, 390, 5)]:
+            Record(
+                chart=cls.chart, player=player, value=value,
+                date_achieved=make_date(day)).save()
+
+    def test_descending(self):
+        records = rank_best_records(
+            Record.objects.filter(chart=self.chart), order_ascending=False)
+        self.assertListEqual(
+            list(records.values_list('player_id', 'value', 'rank')),
+            [(self.p1.id, 420, 1), (self.p2.id, 420, 1),
+             (self.p3.id, 410, 3)])
+
+    def test_rank_only_counts_filtered_records(self):
+        records = rank_best_records(
+            Record.objects.filter(chart=self.chart, value__lt=415),
+            order_ascending=False)
+        self.assertListEqual(
+            list(records.values_list('player_id', 'value', 'rank')),
+            [(self.p3.id, 410, 1), (self.p1.id, 400, 2),
+             (self.p2.id, 390, 3)])
+
+
+class RecordFilterIdsTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero GX", short_code='gx')
+        game.save()
+        cg = ChartGroup(name="Mute City", order_in_parent=1, game=game)
+        cg.save()
+        ct = ChartType(
+            name="Time", game=game, format_spec=[], order_ascending=True)
+        ct.save()
+        chart = Chart(
+            name="Course", order_in_group=1, chart_group=cg, chart_type=ct)
+        chart.save()
+        player = Player(username="P1")
+        player.save()
+        fg = FilterGroup(name="Machine", game=game, order_in_game=1)
+        fg.save()
+        cls.f1 = Filter(name="Blue Falcon", filter_group=fg)
+        cls.f1.save()
+        cls.f2 = Filter(name="Golden Fox", filter_group=fg)
+        cls.f2.save()
+        cls.record = Record(
+            chart=chart, player=player, value=100,
+            date_achieved=make_date(1))
+        cls.record.save()
+        cls.chart = chart
+
+    def assertFilterIds(self, filter_ids):
+        self.record.refresh_from_db()
+        self.assertListEqual(self.record.filter_ids, filter_ids)
+
+    def test_sync(self):
+        self.record.filters.add(self.f2, self.f1)
+        self.assertFilterIds([self.f1.id, self.f2.id])
+
+        self.record.filters.remove(self.f2)
+        self.assertFilterIds([self.f1.id])
+
+        # From the filter's side.
+        self.f2.record_set.add(self.record)
+        self.assertFilterIds([self.f1.id, self.f2.id])
+        self.f2.record_set.clear()
+        self.assertFilterIds([self.f1.id])
+
+    def test_filter_deleted(self):
+        self.record.filters.add(self.f1, self.f2)
+        self.f1.delete()
+        self.assertFilterIds([self.f2.id])
+
+    def test_ranking_filters(self):
+        self.record.filters.add(self.f1)
+        rebuild_chart_standings(self.chart, '')
+        expected_filters = [dict(
+            id=self.f1.id, name="Blue Falcon",
+            filter_group_id=self.f1.filter_group_id)]
+
+        client = APIClient()
+        url = reverse('charts:ranking', args=[self.chart.id])
+        # From standings, and from records.
+        for params in [dict(), dict(filters=str(self.f1.id))]:
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertListEqual(
+                response.data[0]['filters'], expected_filters)
+
+
+class RecordCursorPaginationTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        game = Game(name="F-Zero", short_code='snes')
+        game.save()
+        cg = ChartGroup(name="Mute City I", order_in_parent=1, game=game)
+        cg.save()
+        ct = ChartType(
+            name="Time", game=game, format_spec=[], order_ascending=True)
+        ct.save()
+        chart = Chart(
+            name="Course Time", order_in_group=1, chart_group=cg,
+            chart_type=ct)
+        chart.save()
+        player = Player(username="P1")
+        player.save()
+        # Some ties on date, which are broken by ID.
+        for value, day in [
+                (100, 1), (99, 2), (98, 2), (97, 3), (96, 3), (95, 3),
+                (94, 4)]:
+            Record(
+                chart=chart, player=player, value=value,
+                date_achieved=make_date(day)).save()
+
+    def get_page(self, url, params=None):
+        client = APIClient()
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assertCursorPagesMatch(self, sort):
+        expected_ids = [
+            r['id'] for r in self.get_page(
+                reverse('records:index'),
+                {'sort': sort, 'page[size]': 100})['data']]
+
+        # Forward through all the pages.
+        page = self.get_page(
+            reverse('records:index'),
+            {'sort': sort, 'page[size]': 3, 'page[cursor]': ''})
+        self.assertEqual(page['meta']['pagination']['count'], 7)
+        self.assertIsNone(page['links']['prev'])
+        pages = [page]
+        while page['links']['next']:
+            page = self.get_page(page['links']['next'])
+            pages.append(page)
+        self.assertListEqual(
+            [r['id'] for page in pages for r in page['data']],
+            expected_ids)
+        self.assertListEqual(
+            [len(page['data']) for page in pages], [3, 3, 1])
+
+        # Back from the last page.
+        page = self.get_page(pages[-1]['links']['prev'])
+        self.assertListEqual(page['data'], pages[1]['data'])
+        page = self.get_page(page['links']['prev'])
+        self.assertListEqual(page['data'], pages[0]['data'])
+        self.assertIsNone(page['links']['prev'])
+
+    def test_pages(self):
+        self.assertCursorPagesMatch('date_achieved')
+
+    def test_pages_sorted_by_value(self):
+        self.assertCursorPagesMatch('value')
+
+    def test_skip_count(self):
+        page = self.get_page(
+            reverse('records:index'),
+            {'page[size]': 3, 'page[cursor]': '', 'page[count]': 'false'})
+        self.assertNotIn('count', page['meta']['pagination'])
+        self.assertEqual(len(page['data']), 3)
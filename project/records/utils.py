@@ -1,76 +1,154 @@
-from collections import defaultdict
-
-from django.db.models import QuerySet
-
-from chart_types.utils import apply_format_spec
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import (
+    Case, F, Max, Min, OuterRef, QuerySet, Value, When, Window)
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce, Rank
+from django.db.models.lookups import GreaterThan, LessThan
+
+from chart_types.models import ChartType
+from chart_types.utils import get_format_spec_renderer
 from charts.models import Chart
-from core.utils import add_ranks
-from filters.models import Filter
+from filters.utils import get_filters_metadata
 from .models import Record
 
 
-def add_record_filters(records: list[dict]):
+class PrecedingRowsFrame(RowRange):
     """
-    Add the filters of each record.
-    Doing this efficiently is a bit involved, since values()
-    doesn't work well with multivalued relations.
-    https://docs.djangoproject.com/en/dev/ref/models/querysets/#values-list
+    Window frame of all rows before the current one. Django's RowRange
+    can't express an end before the current row.
     """
-    record_ids = [r['id'] for r in records]
-    RecordFiltersModel = Record.filters.through
-    record_filters = RecordFiltersModel.objects.filter(
-        record__in=record_ids)
-    record_filters_lookup = defaultdict(list)
-    for rf in record_filters:
-        record_filters_lookup[rf.record_id].append(rf.filter_id)
 
-    filters = Filter.objects.filter(record__in=record_ids) \
-        .values('id', 'name', 'filter_group_id')
-    filters_lookup = {f['id']: f for f in filters}
+    def window_frame_start_end(self, connection, start, end):
+        return connection.ops.UNBOUNDED_PRECEDING, '1 PRECEDING'
+
+
+def add_record_filters(records: list[dict]):
+    """
+    Add the filters of each record. Each record dict must have a
+    `filter_ids` key (from the record's filter_ids column), which is
+    replaced by the filters' details. Those come from the in-process
+    filter metadata cache, so this only queries filters not seen before.
+    """
+    all_filter_ids = set()
+    for record in records:
+        all_filter_ids.update(record['filter_ids'])
+    filters_lookup = get_filters_metadata(list(all_filter_ids))
 
     for record in records:
-        filter_ids = record_filters_lookup[record['id']]
-        record['filters'] = [filters_lookup[f_id] for f_id in filter_ids]
+        record['filters'] = [
+            dict(
+                id=filter_id,
+                name=filters_lookup[filter_id]['name'],
+                filter_group_id=filters_lookup[filter_id]['filter_group_id'],
+            )
+            for filter_id in record.pop('filter_ids')]
 
 
-def add_record_displays(records: list[dict], format_spec: list[dict]):
+def sync_record_filter_ids(records: QuerySet):
+    """
+    Copy the `filters` relation of each of `records` into its filter_ids
+    column. Call this after changing record filters in bulk, since bulk
+    operations don't send the signals which normally do this.
+    """
+    records.update(filter_ids=ArraySubquery(
+        Record.filters.through.objects
+        .filter(record=OuterRef('pk'))
+        .order_by('filter_id')
+        .values('filter_id')))
+
+
+def add_record_displays(records: list[dict], chart_type: ChartType):
     """
     Add value_display attribute to each record in `records`.
     This attribute is the human-readable string of the record value,
     such as 1'23"456 instead of 123456.
     """
-    for record in records:
-        record['value_display'] = apply_format_spec(
-            format_spec, record['value'])
+    value_displays = get_format_spec_renderer(chart_type).render_many(
+        [record['value'] for record in records])
+    for record, value_display in zip(records, value_displays):
+        record['value_display'] = value_display
 
 
-def make_record_ranking(records: list[dict]) -> list[dict]:
+def annotate_improvements(
+        records: QuerySet, order_ascending: bool,
+        per_player: bool = False) -> QuerySet:
+    """
+    Annotate whether each of `records` is an improvement, as `improved`.
+    That is, whether it beats the best value among the earlier records (by
+    date achieved, then ID) of the same queryset, or with `per_player`,
+    among the same player's earlier records. Ties aren't improvements.
+    This is computed in the database, as a running min/max window.
+    """
+    best_function = Min if order_ascending else Max
+    best_before = Window(
+        best_function('value'),
+        partition_by=[F('player_id')] if per_player else None,
+        order_by=[F('date_achieved').asc(), F('id').asc()],
+        frame=PrecedingRowsFrame())
+    beats_best = LessThan if order_ascending else GreaterThan
+    # The earliest record has no best value to compare with, making the
+    # comparison null. It's always an improvement.
+    return records.annotate(improved=Coalesce(
+        beats_best(F('value'), best_before), Value(True)))
+
+
+def rank_best_records(records: QuerySet, order_ascending: bool) -> QuerySet:
     """
-    Include only the first record for each player (given that they've
-    already been sorted best-first), and add rank numbers, accounting
-    for tied values.
+    Include only the best record for each player, and annotate rank
+    numbers, accounting for tied values. Both of these are done in the
+    database, so only the ranked records are fetched.
+    The result is sorted best-first.
     """
-    seen_players = set()
-    record_ranking = []
+    value_order_str = 'value' if order_ascending else '-value'
+
+    # Best record for each player. For DISTINCT ON, "the fields in
+    # order_by() must start with the fields in distinct(), in the same
+    # order."
+    # https://docs.djangoproject.com/en/dev/ref/models/querysets/#distinct
+    best_records = records \
+        .order_by('player_id', value_order_str, 'date_achieved', 'id') \
+        .distinct('player_id')
+
+    # Window functions are evaluated after the WHERE clause, so the ranks
+    # only count the players' best records.
+    if order_ascending:
+        rank_order = F('value').asc()
+    else:
+        rank_order = F('value').desc()
+    return Record.objects \
+        .filter(id__in=best_records.values('id')) \
+        .annotate(rank=Window(expression=Rank(), order_by=rank_order)) \
+        .order_by(value_order_str, 'date_achieved', 'id')
 
-    for record in records:
-        # Get only the first record for each player.
-        # We iterate manually through the records to do this. distinct()
-        # doesn't seem to get the job done, since "the fields in order_by()
-        # must start with the fields in distinct(), in the same order."
-        # https://docs.djangoproject.com/en/dev/ref/models/querysets/#distinct
-        # TODO: Re-evaluate this. Not the end of the world if we have to sort
-        #  players manually.
-        if record['player_id'] in seen_players:
-            # Not the first record from this player. Ignore.
-            continue
-
-        record_ranking.append(record)
-        seen_players.add(record['player_id'])
-
-    add_ranks(record_ranking, 'value')
-
-    return record_ranking
+
+def rank_best_records_per_chart(records: QuerySet) -> QuerySet:
+    """
+    Like rank_best_records(), but for records spanning any number of charts,
+    which may have different order directions. Each chart's best records
+    are ranked separately (a window partitioned by chart), all in a single
+    query. The result is sorted by chart ID, then best-first.
+    """
+    # Value which sorts best-first regardless of the chart's order
+    # direction.
+    sort_value = Case(
+        When(chart__chart_type__order_ascending=True, then=F('value')),
+        default=-F('value'),
+    )
+
+    best_records = records \
+        .annotate(sort_value=sort_value) \
+        .order_by(
+            'chart_id', 'player_id', 'sort_value', 'date_achieved', 'id') \
+        .distinct('chart_id', 'player_id')
+
+    return Record.objects \
+        .filter(id__in=best_records.values('id')) \
+        .annotate(sort_value=sort_value) \
+        .annotate(rank=Window(
+            expression=Rank(),
+            partition_by=F('chart_id'),
+            order_by=F('sort_value').asc())) \
+        .order_by('chart_id', 'sort_value', 'date_achieved', 'id')
 
 
 def sort_records_by_value(records: QuerySet, chart_id: int) -> QuerySet:
@@ -1,14 +1,22 @@
 from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView)
 
+from core.utils import conditional_get
+from core.pagination import KeysetPagination
 from filters.utils import apply_filter_spec, FilterSpec
+from games.utils import get_object_validators_func
+from .improvements import update_chart_improvements
 from .models import Record
 from .serializers import RecordSerializer
+from .standings import update_chart_standings
 from .utils import sort_records_by_value
 
 
 class RecordIndex(ListCreateAPIView):
     serializer_class = RecordSerializer
+    # Cursor pagination works with all the sorts, since they all order by
+    # field names.
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         queryset = Record.objects.all()
@@ -47,10 +55,53 @@ class RecordIndex(ListCreateAPIView):
 
         return queryset
 
+    def perform_create(self, serializer):
+        record = serializer.save()
+        update_chart_standings(record.chart_id, [record.player_id])
+        update_chart_improvements(
+            record.chart_id, [record.player_id], since=record.date_achieved)
 
+
+get_record_validators = get_object_validators_func(
+    Record, 'record_id', 'chart__chart_group__game')
+
+
+@conditional_get(get_record_validators)
 class RecordDetail(RetrieveUpdateDestroyAPIView):
     serializer_class = RecordSerializer
     lookup_url_kwarg = 'record_id'
 
     def get_queryset(self):
         return Record.objects.all()
+
+    def perform_update(self, serializer):
+        old_chart_id = serializer.instance.chart_id
+        old_player_id = serializer.instance.player_id
+        old_date_achieved = serializer.instance.date_achieved
+
+        record = serializer.save()
+
+        if old_chart_id != record.chart_id:
+            # Record moved to another chart; it no longer counts for the
+            # old chart.
+            update_chart_standings(old_chart_id, [old_player_id])
+            update_chart_standings(record.chart_id, [record.player_id])
+            update_chart_improvements(
+                old_chart_id, [old_player_id], since=old_date_achieved)
+            update_chart_improvements(
+                record.chart_id, [record.player_id],
+                since=record.date_achieved)
+        else:
+            update_chart_standings(
+                record.chart_id, [old_player_id, record.player_id])
+            update_chart_improvements(
+                record.chart_id, [old_player_id, record.player_id],
+                since=min(old_date_achieved, record.date_achieved))
+
+    def perform_destroy(self, instance):
+        chart_id = instance.chart_id
+        player_id = instance.player_id
+        date_achieved = instance.date_achieved
+        instance.delete()
+        update_chart_standings(chart_id, [player_id])
+        update_chart_improvements(chart_id, [player_id], since=date_achieved)